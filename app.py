@@ -1,10 +1,17 @@
 import pandas as pd
 import streamlit as st
-import plotly.express as px
-from clean_data import df_month, df_day
-import plotly.graph_objects as go
-import numpy as np
+from caching import format_stats
+from data_store import enable_copy_on_write
+from deltas import PeriodComparison
+from figures import (DEFAULT_TOP_N, TOP_N_OPTIONS, country_treemaps, daily_figure, figure_cache, overview_figures,
+                     timeline_figure)
 from PIL import Image
+from profiling import fragment_profiler, rerun_profiler
+from refresh import current_snapshot, start_watcher, status
+from tables import (COUNTRY_SUMMARY_FORMATS, DEFAULT_PAGE_SIZE, GRID_SORT, PAGE_SIZES, cached_table,
+                    country_summary, daily_pivot, daily_pivot_formats, grid_view, style_country_summary, table_cache,
+                    table_page)
+from timeline import AUTO_GRANULARITY, DEFAULT_GRANULARITY, GRANULARITY_LABELS, GRANULARITY_OPTIONS, default_range
 
 
 # --- Configuración de la página ---
@@ -14,6 +21,22 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# --- Perfil del rerun (DASHBOARD_PROFILE=1 o ?profile=1) ---
+profiler = rerun_profiler(st)
+
+# --- Datos compartidos por todas las sesiones (solo se cargan la primera vez) ---
+# El backend de consultas (pandas en memoria o duckdb sobre la caché) se elige con DASHBOARD_BACKEND.
+# Cada rerun usa la instantánea de datos publicada al empezar (y los fragmentos, la de su último rerun
+# completo); refresh.py publica otra en segundo plano cuando cambian los ficheros de dat/.
+enable_copy_on_write()
+start_watcher()
+snapshot = current_snapshot()
+backend = snapshot.backend
+apps = snapshot.apps
+with profiler.section('datos.catalogo') as span:
+    catalog = backend.catalog()
+    span['rows_out'] = len(catalog)
+
 # TÍTULO
 st.markdown("""
 <div style="text-align:center; color:#333; margin-bottom: 20px;">
@@ -30,8 +53,49 @@ st.sidebar.image(icon, width=250)
 
 st.sidebar.title("Filtros")
 
+# --- Apps (por defecto la de más revenue; solo se cargan las seleccionadas) ---
+if catalog.empty:
+    st.warning("⚠️ No hay datos de ninguna app.")
+    st.stop()
+app_labels = {row.App_ID: f"{row.App} · {row.Publisher}" for row in catalog.itertuples(index=False)}
+selected_apps = st.sidebar.multiselect(
+    "Selecciona app(s)",
+    list(app_labels),
+    default=list(app_labels)[:1],
+    format_func=app_labels.get
+)
+if not selected_apps:
+    st.warning("Selecciona al menos una app.")
+    st.stop()
+
+with profiler.section('datos') as span:
+    cube_month = backend.month_cube(selected_apps)
+    data_version = backend.version(selected_apps)
+    span['rows_out'] = len(cube_month)
+# Si alguna app se ha cargado en este rerun, desglosamos clean_data y los artefactos derivados
+for app_id, app_stats in apps.load_stats(selected_apps).items():
+    if app_stats.get('loaded_at', 0) >= profiler.started_at:
+        profiler.add(f'datos.clean_data[{app_labels[app_id]}]', app_stats['load_seconds'],
+                     rows_out=app_stats['rows'], rss_delta_bytes=app_stats['rss_delta_bytes'])
+        profiler.add(f'datos.derivados[{app_labels[app_id]}]', app_stats['derived_seconds'],
+                     rows_in=app_stats['rows'])
+
+load_stats = apps.memory_report()
+# Con duckdb los datos no se cargan en memoria: se consultan directamente en la caché
+load_info = (f"{load_stats['apps_loaded']} app(s) en memoria ({load_stats['rows']:,} filas)"
+             if backend.name == 'pandas' else f"Consultas con {backend.name} sobre la caché")
+st.sidebar.caption(f"{load_info} · memoria del proceso {load_stats['rss_bytes'] / 1e6:,.0f} MB")
+refresh_status = status()
+published_at = pd.Timestamp.fromtimestamp(snapshot.refreshed_at)
+refresh_info = f"Datos v{snapshot.id} · publicados el {published_at:%d/%m/%Y %H:%M:%S}"
+if refresh_status['refreshing']:
+    refresh_info += " · 🔄 cargando datos nuevos"
+elif refresh_status['last_error']:
+    refresh_info += f" · ⚠️ la última actualización falló ({refresh_status['last_error']})"
+st.sidebar.caption(refresh_info)
+
 # Países
-all_countries = sorted(df_month['Country'].unique())
+all_countries = cube_month.rollup('Country')['Country'].tolist()
 select_all_countries = st.sidebar.checkbox("Seleccionar todos los países", value=True)
 
 if select_all_countries:
@@ -40,552 +104,398 @@ else:
     selected_country = st.sidebar.multiselect("Selecciona país(es)", all_countries)
     
 # --- Plataformas ---
-all_platforms = sorted(df_month['Platform'].unique())
+all_platforms = cube_month.rollup('Platform')['Platform'].tolist()
 select_all_platforms = st.sidebar.checkbox("Seleccionar todas las plataformas", value=True)
 
 if select_all_platforms:
     selected_platform = st.sidebar.multiselect("Selecciona plataforma(s)", all_platforms, default=all_platforms)
 else:
     selected_platform = st.sidebar.multiselect("Selecciona plataforma(s)", all_platforms)
-    
-
-
-# Pestañas principales
-# -----------------------------
-tab1, tab2 = st.tabs(["📊 VISTA GENERAL", "📈 VISTA DETALLADA"])
 
+# --- Meses (solo los usa la vista general) ---
+all_months = cube_month.rollup('Month_Name')['Month_Name'].tolist()
+select_all_months = st.sidebar.checkbox("Seleccionar todos los meses", value=True)
 
+if select_all_months:
+    selected_month = st.sidebar.multiselect("Selecciona mes(es)", all_months, default=all_months)
+else:
+    selected_month = st.sidebar.multiselect("Selecciona mes(es)", all_months)
 
-# === Pestaña VISTA GENERAL ===
 
-with tab1:
-    st.header("📊 Vista General")
-    
-    # Meses
-    all_months = df_month['Month_Name'].unique()
-    select_all_months = st.sidebar.checkbox("Seleccionar todos los meses", value=True)
+# --- Grids paginados en el servidor ---
+# Búsqueda, orden y página se resuelven aquí sobre los datos tipados (resultado guardado en
+# tables.table_cache) y al navegador solo llega la página visible. Devuelve el número de filas del grid.
+def paged_grid(key, version, build, column_config, style=None, **selection):
+    columns = list(cached_table(key, version, build, **selection).columns)
+    sort, descending = GRID_SORT[key]
 
-    if select_all_months:
-        selected_month = st.sidebar.multiselect("Selecciona mes(es)", all_months, default=all_months)
-    else:
-        selected_month = st.sidebar.multiselect("Selecciona mes(es)", all_months)
+    col_search, col_sort, col_order, col_size = st.columns([3, 2, 1, 1])
+    search = col_search.text_input("Buscar", key=f"{key}_search")
+    sort_by = col_sort.selectbox("Ordenar por", columns, index=columns.index(sort), key=f"{key}_sort")
+    descending = col_order.toggle("Descendente", value=descending, key=f"{key}_desc")
+    page_size = col_size.selectbox("Filas por página", PAGE_SIZES, index=PAGE_SIZES.index(DEFAULT_PAGE_SIZE),
+                                   key=f"{key}_size")
 
-    # --- Filtrar datos según selección ---
-    df_filtered = df_month[
-        (df_month['Country'].isin(selected_country)) &
-        (df_month['Month_Name'].isin(selected_month)) &
-        (df_month['Platform'].isin(selected_platform))
-    ]
+    df_full, df_view = grid_view(key, version, build, search=search, sort=sort_by, descending=descending,
+                                 **selection)
 
+    # Página pedida (se ajusta si la búsqueda o el tamaño de página dejan menos páginas)
+    page_key = f"{key}_page"
+    df_page, page, pages = table_page(df_view, st.session_state.get(page_key, 1), page_size)
+    st.session_state[page_key] = page
 
-    
-    #CREAMOS LOS PIE CHARTS
-
-    # Paleta personalizada: asignamos colores fijos por plataforma
-    color_map = {
-        "App Store": "#636EFA",   # azul (color por defecto de Plotly)
-        "Google Play": "#00CC96"  # verde
-    }
-
-    # Pie chart para Revenue
-    revenue_by_platform = df_filtered.groupby("Platform", as_index=False)["Revenue"].sum()
-    fig_pie_revenue = px.pie(
-        revenue_by_platform,
-        names="Platform",
-        values="Revenue",
-        title="Distribución de Revenue por Plataforma",
-        color="Platform",
-        color_discrete_map=color_map
-    )
-    fig_pie_revenue.update_layout(title_x=0.22)
-
-    # Pie chart para Downloads
-    installs_by_platform = df_filtered.groupby("Platform", as_index=False)["Downloads"].sum()
-    fig_pie_installs = px.pie(
-        installs_by_platform,
-        names="Platform",
-        values="Downloads",
-        title="Distribución de Installs por Plataforma",
-        color="Platform",
-        color_discrete_map=color_map
-    )
-    fig_pie_installs.update_layout(title_x=0.22)
-
-
-    col1, col2 = st.columns(2)
-
-    with col1:
-            total_revenue = df_filtered['Revenue'].sum()
-    #         st.metric("💰 Revenue Total", f"${total_revenue:,.2f}")
-            fig_revenue = go.Figure(go.Indicator(
-                mode="gauge+number",
-                value=total_revenue,
-                title={'text': "💰 Revenue Total", 'font': {'size': 20}},
-                gauge={
-                    'axis': {'range': [0, max(total_revenue*1.2, 1)]},  # rango dinámico
-                    'bar': {'color': "green"},
-                    'steps': [
-                        {'range': [0, total_revenue*0.5], 'color': "lightgray"},
-                        {'range': [total_revenue*0.5, total_revenue], 'color': "gray"}
-                    ],
-                }
-            ))
-    
-            st.plotly_chart(fig_revenue, use_container_width=True)
-    
-            revenue_by_platform = df_filtered.groupby('Platform', as_index=False)['Revenue'].sum()
-            st.plotly_chart(fig_pie_revenue, use_container_width=True)
-
-    with col2:
-        total_installs = df_filtered['Downloads'].sum()
-#         st.metric("📥 Installs Totales", f"{total_installs:,}")
-        fig_installs = go.Figure(go.Indicator(
-            mode="gauge+number",
-            value=total_installs,
-            title={'text': "📥 Installs Totales", 'font': {'size': 20}},
-            gauge={
-                'axis': {'range': [0, max(total_installs*1.2, 1)]},  # rango dinámico
-                'bar': {'color': "blue"},
-                'steps': [
-                    {'range': [0, total_installs*0.5], 'color': "lightgray"},
-                    {'range': [total_installs*0.5, total_installs], 'color': "gray"}
-                ],
-            }
-        ))
-
-        st.plotly_chart(fig_installs, use_container_width=True)
-        
-        
-        installs_by_platform = df_filtered.groupby('Platform', as_index=False)['Downloads'].sum()
-        st.plotly_chart(fig_pie_installs, use_container_width=True)
-        
-
-    #VAMOS CON EL GRÁFICO DE BARRAS Y LÍNEA
-
-    import plotly.graph_objects as go
-
-    # Agrupar por mes y plataforma para el gráfico combinado
-    df_monthly_summary = df_filtered.groupby('Month_Name', as_index=False).agg({
-        'Revenue': 'sum',
-        'Downloads': 'sum'
-    })
-
-    # Ordenar los meses cronológicamente
-    months_order = ['January', 'February', 'March', 'April', 'May', 'June',
-                    'July', 'August', 'September', 'October', 'November', 'December']
-    df_monthly_summary['Month_Name'] = pd.Categorical(df_monthly_summary['Month_Name'], categories=months_order, ordered=True)
-    df_monthly_summary = df_monthly_summary.sort_values('Month_Name')
-
-    # Crear gráfico combinado: barras para Revenue, línea para Installs
-    fig_combined = go.Figure()
-
-    # Barras: Revenue
-    fig_combined.add_trace(
-        go.Bar(
-            x=df_monthly_summary['Month_Name'],
-            y=df_monthly_summary['Revenue'],
-            name='Revenue',
-            marker_color='indianred',
-            yaxis='y1'
-        )
-    )
-
-    # Línea: Installs
-    fig_combined.add_trace(
-        go.Scatter(
-            x=df_monthly_summary['Month_Name'],
-            y=df_monthly_summary['Downloads'],
-            name='Installs',
-            mode='lines+markers',
-            line=dict(color='royalblue', width=3),
-            yaxis='y2'
-        )
-    )
-
-    # Configurar ejes y layout
-    fig_combined.update_layout(
-        title='Revenue y Installs Mensuales',
-        xaxis=dict(title='Mes'),
-        yaxis=dict(
-            title='Revenue ($)',
-            side='left'
-        ),
-        yaxis2=dict(
-            title='Installs',
-            overlaying='y',
-            side='right'
-        ),
-        legend=dict(x=0.1, y=1.1, orientation='h'),
-        margin=dict(l=40, r=40, t=80, b=40)
-    )
-
-    # Mostrar gráfico
-    st.plotly_chart(fig_combined, use_container_width=True)
-
-    #AÑADIMOS EL GRÁFICO DE TREEMAP
-
-    # Sección destacada "Datos por país"
-    st.markdown("""
-    <div style="
-        border: 2px solid #e0e0e0;
-        border-radius: 12px;
-        padding: 20px;
-        background-color: #f9f9f9;
-        margin-top: 25px;
-    ">
-        <h3 style="text-align:center; color:#333;">🌍 Datos por país</h3>
-    </div>
-    """, unsafe_allow_html=True)
-
-    # Mostrar los dos treemaps en columnas
-    if not df_filtered.empty:
-        col1, col2 = st.columns(2)
-
-        # --- Treemap Revenue ---
-        with col1:
-            revenue_by_country = df_filtered.groupby('Country', as_index=False)['Revenue'].sum()
-            fig_treemap_revenue = px.treemap(
-                revenue_by_country,
-                path=['Country'],
-                values='Revenue',
-                title='Revenue por País',
-                color='Revenue',
-                color_continuous_scale='Rainbow'
-            )
-            st.plotly_chart(fig_treemap_revenue, use_container_width=True)
-
-        # --- Treemap Downloads ---
-        with col2:
-            downloads_by_country = df_filtered.groupby('Country', as_index=False)['Downloads'].sum()
-            fig_treemap_downloads = px.treemap(
-                downloads_by_country,
-                path=['Country'],
-                values='Downloads',
-                title='Installs por País',
-                color='Downloads',
-                color_continuous_scale='Rainbow'
-            )
-            st.plotly_chart(fig_treemap_downloads, use_container_width=True)
-    else:
-        st.warning("No hay datos para los filtros seleccionados")
-    
-    
-#------------- FIN DE PESTAÑA VISTA GENERAL
-            
-# === Comienza Pestaña VISTA DETALLADA ===
-
-with tab2:
-    st.header("📈 VISTA DETALLADA")
-
-    # --- Selector de mes único ---
-    all_periods = df_month['Date'].dt.to_period('M').drop_duplicates().sort_values().astype(str).tolist()
-
-    # Índice de diciembre por defecto
-    december_index = 0
-    for i, period in enumerate(all_periods):
-        if period.endswith("-12"):
-            december_index = i
-            break
-
-    selected_period = st.selectbox(
-        "Selecciona un mes (solo uno)",
-        options=all_periods,
-        index=december_index
+    st.dataframe(
+        style(df_page) if style is not None else df_page,
+        use_container_width=True,
+        hide_index=True,
+        column_config=column_config,
+        placeholder="—"
     )
-    sel_period = pd.Period(selected_period, freq='M')
-
-    # --- Filtrado mensual ---
-    df_month_filtered = df_month[
-        (df_month['Country'].isin(selected_country)) &
-        (df_month['Platform'].isin(selected_platform)) &
-        (df_month['Date'].dt.to_period('M') == sel_period)
-    ]
-
-    df_month_prev = df_month[
-        (df_month['Country'].isin(selected_country)) &
-        (df_month['Platform'].isin(selected_platform)) &
-        (df_month['Date'].dt.to_period('M') == sel_period - 1)
-    ]
-
-    # --- Función delta ---
-    def pct_delta(curr, prev):
-        if prev == 0 or pd.isna(prev) or pd.isna(curr):
-            return None
-        return (curr - prev) / prev * 100
-
-    # --- KPIs totales ---
-    curr_revenue = df_month_filtered['Revenue'].sum()
-    prev_revenue = df_month_prev['Revenue'].sum() if not df_month_prev.empty else 0
-    curr_installs = df_month_filtered['Downloads'].sum()
-    prev_installs = df_month_prev['Downloads'].sum() if not df_month_prev.empty else 0
-
-    rev_delta = pct_delta(curr_revenue, prev_revenue)
-    inst_delta = pct_delta(curr_installs, prev_installs)
-
-    # --- Mostrar KPIs en dos columnas ---
-    col1, col2 = st.columns(2)
-
-    with col1:
-        rev_display = f"${curr_revenue:,.2f}" if curr_revenue else "—"
-        rev_delta_display = f"{rev_delta:+.2f}%" if rev_delta is not None else "—"
-        st.metric("💰 Revenue Total", rev_display, delta=rev_delta_display)
-
-        st.markdown("**Revenue por Plataforma**")
-        if not df_month_filtered.empty:
-            curr_by_plat = df_month_filtered.groupby('Platform')['Revenue'].sum()
-            prev_by_plat = df_month_prev.groupby('Platform')['Revenue'].sum() if not df_month_prev.empty else pd.Series(dtype=float)
-            for plat in curr_by_plat.index:
-                c = curr_by_plat.loc[plat]
-                p = prev_by_plat.loc[plat] if plat in prev_by_plat.index else 0
-                d = pct_delta(c, p)
-                delta_str = f"{d:+.2f}%" if d is not None else "—"
-                st.write(f"**{plat}**: ${c:,.2f}  ({delta_str})")
-        else:
-            st.write("No hay datos para el mes/plataforma/país seleccionados.")
-
-    with col2:
-        inst_display = f"{int(curr_installs):,}" if curr_installs else "—"
-        inst_delta_display = f"{inst_delta:+.2f}%" if inst_delta is not None else "—"
-        st.metric("📥 Installs Totales", inst_display, delta=inst_delta_display)
-
-        st.markdown("**Installs por Plataforma**")
-        if not df_month_filtered.empty:
-            curr_by_plat_d = df_month_filtered.groupby('Platform')['Downloads'].sum()
-            prev_by_plat_d = df_month_prev.groupby('Platform')['Downloads'].sum() if not df_month_prev.empty else pd.Series(dtype=float)
-            for plat in curr_by_plat_d.index:
-                c = curr_by_plat_d.loc[plat]
-                p = prev_by_plat_d.loc[plat] if plat in prev_by_plat_d.index else 0
-                d = pct_delta(c, p)
-                delta_str = f"{d:+.2f}%" if d is not None else "—"
-                st.write(f"**{plat}**: {int(c):,}  ({delta_str})")
-        else:
-            st.write("No hay datos para el mes/plataforma/país seleccionados.")
-
-
-
-    #AÑADIMOS GRÁFICO DIARIO
-    # Filtrar df_day para el mes seleccionado
-    df_day_filtered = df_day[
-        (df_day['Country'].isin(selected_country)) &
-        (df_day['Platform'].isin(selected_platform)) &
-        (df_day['Date'].dt.to_period('M') == sel_period)
-    ]
-
-    if not df_day_filtered.empty:
-        # Agregamos por día
-        daily_summary = df_day_filtered.groupby('Date', as_index=False).agg({
-            'Revenue': 'sum',
-            'Downloads': 'sum'
-        })
-
-        fig = go.Figure()
-        # Revenue en barras
-        fig.add_trace(go.Bar(
-            x=daily_summary['Date'],
-            y=daily_summary['Revenue'],
-            name='Revenue',
-            marker_color='green'
-        ))
-        # Installs en línea
-        fig.add_trace(go.Scatter(
-            x=daily_summary['Date'],
-            y=daily_summary['Downloads'],
-            mode='lines+markers',
-            name='Installs',
-            yaxis='y2',
-            line=dict(color='blue')
-        ))
-
-        # Configurar eje secundario
-        fig.update_layout(
-            title=dict(text="Revenue e Installs diarios", font=dict(size=25)),
-            yaxis=dict(title='Revenue ($)'),
-            yaxis2=dict(title='Installs', overlaying='y', side='right'),
-            legend=dict(x=0.1, y=1.1, orientation='h')
-        )
-
-        st.plotly_chart(fig, use_container_width=True)
-    else:
-        st.write("No hay datos diarios para el mes/plataforma/país seleccionados.")
-
-
-#GRID POR PAISES
 
-   # --- Preparar dataframe por país ---
-    df_country_summary = df_month_filtered.groupby('Country', as_index=False).agg({
-        'Revenue': 'sum',
-        'Downloads': 'sum'
-    })
+    first = (page - 1) * page_size
+    col_info, col_page = st.columns([3, 1])
+    col_info.caption(f"Filas {first + 1 if len(df_view) else 0:,}–{first + len(df_page):,} de {len(df_view):,}"
+                     + (f" (de {len(df_full):,} sin buscar)" if search else ""))
+    if pages > 1:
+        col_page.number_input(f"Página (de {pages})", min_value=1, max_value=pages, step=1, key=page_key)
+    return len(df_full)
 
-    df_country_prev = df_month_prev.groupby('Country', as_index=False).agg({
-        'Revenue': 'sum',
-        'Downloads': 'sum'
-    })
 
-    # Función delta %
-    def pct_delta(curr, prev):
-        if prev == 0:
-            return None
-        return (curr - prev) / prev * 100
+# Pestañas principales
+# -----------------------------
+# Cada pestaña es un fragmento: los filtros de la barra lateral son entradas compartidas (cambiarlos
+# vuelve a ejecutar todo el script), pero los widgets de una pestaña solo vuelven a ejecutar su pestaña.
+# Las entradas de cada pestaña se pasan como argumentos; en un rerun del fragmento se reutilizan las
+# del último rerun completo.
+tab1, tab2, tab3 = st.tabs(["📊 VISTA GENERAL", "📈 VISTA DETALLADA", "📆 EVOLUCIÓN"])
 
-    df_country_summary['Revenue Δ%'] = df_country_summary.apply(
-        lambda row: pct_delta(
-            row['Revenue'], 
-            df_country_prev.loc[df_country_prev['Country']==row['Country'], 'Revenue'].sum()
-            if row['Country'] in df_country_prev['Country'].values else 0
-        ), axis=1
-    )
 
-    df_country_summary['Installs Δ%'] = df_country_summary.apply(
-        lambda row: pct_delta(
-            row['Downloads'], 
-            df_country_prev.loc[df_country_prev['Country']==row['Country'], 'Downloads'].sum()
-            if row['Country'] in df_country_prev['Country'].values else 0
-        ), axis=1
-    )
 
-    # Renombrar columnas
-    df_country_summary.rename(columns={
-        'Revenue': 'Revenue ($)',
-        'Downloads': 'Installs'
-    }, inplace=True)
+# === Pestaña VISTA GENERAL ===
 
-    # Orden inicial por Revenue descendente
-    df_country_summary.sort_values(by='Revenue ($)', ascending=False, inplace=True)
+@st.fragment
+def overview_tab(cube_month, data_version, selected_apps, selected_country, selected_platform, selected_month):
+    with fragment_profiler(st, profiler, 'vista_general') as tab_profiler:
+        st.header("📊 Vista General")
+
+        # --- Figuras según selección (corte del cubo mensual, memorizadas por estado de filtros) ---
+        with tab_profiler.section('vista_general.figuras', rows_in=len(cube_month)):
+            overview = overview_figures(cube_month, data_version, selected_apps, selected_country,
+                                        selected_platform, selected_month)
+
+        with tab_profiler.section('vista_general.graficos'):
+            col1, col2 = st.columns(2)
+
+            with col1:
+                    st.plotly_chart(overview['gauge_revenue'], use_container_width=True)
+
+                    st.plotly_chart(overview['pie_revenue'], use_container_width=True)
+
+            with col2:
+                st.plotly_chart(overview['gauge_installs'], use_container_width=True)
+
+
+                st.plotly_chart(overview['pie_installs'], use_container_width=True)
+
+
+            #VAMOS CON EL GRÁFICO DE BARRAS Y LÍNEA
+            st.plotly_chart(overview['combined'], use_container_width=True)
+
+        #AÑADIMOS EL GRÁFICO DE TREEMAP
+
+        # Sección destacada "Datos por país"
+        st.markdown("""
+        <div style="
+            border: 2px solid #e0e0e0;
+            border-radius: 12px;
+            padding: 20px;
+            background-color: #f9f9f9;
+            margin-top: 25px;
+        ">
+            <h3 style="text-align:center; color:#333;">🌍 Datos por país</h3>
+        </div>
+        """, unsafe_allow_html=True)
+
+        with tab_profiler.section('vista_general.treemaps') as span:
+            # --- Países en los treemaps: los primeros de cada medida (por defecto los que cubren el 99%) y ---
+            # --- el resto sumado en "Otros". La pila treemap_drill guarda los países saltados de cada medida ---
+            top_n = TOP_N_OPTIONS[st.selectbox(
+                "Países en los treemaps",
+                list(TOP_N_OPTIONS),
+                index=list(TOP_N_OPTIONS.values()).index(DEFAULT_TOP_N),
+                key="treemap_top_n",
+                on_change=lambda: st.session_state.pop('treemap_drill', None)
+            )]
+            drill = st.session_state.setdefault('treemap_drill', [])
+            treemaps = country_treemaps(cube_month, data_version, selected_apps, selected_country, selected_platform,
+                                        selected_month, top_n, drill[-1] if drill else None)
+            if treemaps is not None and drill and not any(treemaps['shown'].values()):
+                # Con los filtros nuevos hay menos países de los ya desglosados: volvemos al principio
+                drill.clear()
+                treemaps = country_treemaps(cube_month, data_version, selected_apps, selected_country,
+                                            selected_platform, selected_month, top_n)
+
+            # Mostrar los dos treemaps en columnas, cada uno con lo que queda en su "Otros"
+            if treemaps is not None:
+                skip, shown, others = treemaps['skip'], treemaps['shown'], treemaps['others']
+                span['rows_out'] = sum(shown.values())
+                col1, col2 = st.columns(2)
+                for col, key, measure, measure_label in ((col1, 'treemap_revenue', 'Revenue', 'del revenue'),
+                                                         (col2, 'treemap_installs', 'Downloads', 'de los installs')):
+                    with col:
+                        st.plotly_chart(treemaps[key], use_container_width=True)
+                        other = others[measure]
+                        st.caption(
+                            f"Países {skip[measure] + 1}–{skip[measure] + shown[measure]} · " + (
+                                f"«Otros»: {other['countries']} {'país' if other['countries'] == 1 else 'países'} "
+                                f"({other['share']:.2%} {measure_label})"
+                                if other['countries'] else "sin «Otros»"
+                            )
+                        )
+
+                # --- Desglose de "Otros" bajo demanda (las medidas sin "Otros" se quedan como están) ---
+                next_skip = {measure: skip[measure] + (shown[measure] if others[measure]['countries'] else 0)
+                             for measure in skip}
+                col_down, col_up, _ = st.columns([1, 1, 4])
+                col_down.button("⬇️ Desglosar «Otros»", on_click=drill.append, args=(next_skip,),
+                                disabled=not any(other['countries'] for other in others.values()))
+                col_up.button("⬆️ Volver", on_click=drill.pop, disabled=not drill)
+            else:
+                st.warning("No hay datos para los filtros seleccionados")
 
-    # --- Formateamos los números ---
-    df_display = df_country_summary.copy()
 
-    df_display["Revenue ($)"] = df_display["Revenue ($)"].apply(lambda x: f"${x:,.0f}")
-    df_display["Installs"] = df_display["Installs"].apply(lambda x: f"{x:,.0f}")
+with tab1:
+    overview_tab(cube_month, data_version, selected_apps, selected_country, selected_platform, selected_month)
 
-    df_display["Revenue Δ%"] = df_display["Revenue Δ%"].apply(
-        lambda x: f"{x:+.1f}%" if pd.notnull(x) else "—"
-    )
-    df_display["Installs Δ%"] = df_display["Installs Δ%"].apply(
-        lambda x: f"{x:+.1f}%" if pd.notnull(x) else "—"
-    )
+#------------- FIN DE PESTAÑA VISTA GENERAL
+            
+# === Comienza Pestaña VISTA DETALLADA ===
 
-    # --- Añadimos estilo condicional ---
-    def color_percent(val):
-        color = 'green' if isinstance(val, str) and val.startswith('+') else \
-                'red' if isinstance(val, str) and val.startswith('-') else 'black'
-        return f'color: {color}'
+@st.fragment
+def detail_tab(cube_month, data_version, selected_apps, selected_country, selected_platform):
+    with fragment_profiler(st, profiler, 'detalle') as tab_profiler:
+        st.header("📈 VISTA DETALLADA")
+
+        # --- Selector de mes único ---
+        all_periods = [str(p) for p in cube_month.periods]
+
+        # Índice de diciembre por defecto
+        december_index = 0
+        for i, period in enumerate(all_periods):
+            if period.endswith("-12"):
+                december_index = i
+                break
+
+        selected_period = st.selectbox(
+            "Selecciona un mes (solo uno)",
+            options=all_periods,
+            index=december_index
+        )
+        sel_period = pd.Period(selected_period, freq='M')
+
+        with tab_profiler.section('detalle.kpis', rows_in=len(cube_month)) as span:
+            # --- Comparación con el mes anterior (un solo corte del cubo mensual) ---
+            comparison = PeriodComparison(
+                cube_month,
+                sel_period,
+                countries=selected_country,
+                platforms=selected_platform
+            )
+            by_platform_delta = comparison.by('Platform')
+            span['rows_out'] = len(comparison.base)
+
+            # --- KPIs totales ---
+            kpis = comparison.total()
+            curr_revenue = kpis['Revenue']
+            curr_installs = kpis['Downloads']
+            rev_delta = kpis['Revenue_delta']
+            inst_delta = kpis['Downloads_delta']
+
+            # --- Mostrar KPIs en dos columnas ---
+            col1, col2 = st.columns(2)
+
+            with col1:
+                rev_display = f"${curr_revenue:,.2f}" if curr_revenue else "—"
+                rev_delta_display = f"{rev_delta:+.2f}%" if pd.notna(rev_delta) else "—"
+                st.metric("💰 Revenue Total", rev_display, delta=rev_delta_display)
+
+                st.markdown("**Revenue por Plataforma**")
+                if not by_platform_delta.empty:
+                    for plat, c, d in by_platform_delta[['Platform', 'Revenue', 'Revenue_delta']].itertuples(index=False):
+                        delta_str = f"{d:+.2f}%" if pd.notna(d) else "—"
+                        st.write(f"**{plat}**: ${c:,.2f}  ({delta_str})")
+                else:
+                    st.write("No hay datos para el mes/plataforma/país seleccionados.")
+
+            with col2:
+                inst_display = f"{int(curr_installs):,}" if curr_installs else "—"
+                inst_delta_display = f"{inst_delta:+.2f}%" if pd.notna(inst_delta) else "—"
+                st.metric("📥 Installs Totales", inst_display, delta=inst_delta_display)
+
+                st.markdown("**Installs por Plataforma**")
+                if not by_platform_delta.empty:
+                    for plat, c, d in by_platform_delta[['Platform', 'Downloads', 'Downloads_delta']].itertuples(index=False):
+                        delta_str = f"{d:+.2f}%" if pd.notna(d) else "—"
+                        st.write(f"**{plat}**: {int(c):,}  ({delta_str})")
+                else:
+                    st.write("No hay datos para el mes/plataforma/país seleccionados.")
+
+
+
+        with tab_profiler.section('detalle.grafico_diario') as span:
+            #AÑADIMOS GRÁFICO DIARIO
+            # Cortamos el cubo diario del mes seleccionado (solo se lee esa partición)
+            df_day_filtered = backend.daily_cube(selected_apps, sel_period).slice(
+                countries=selected_country,
+                platforms=selected_platform
+            )
+            span['rows_out'] = len(df_day_filtered)
+
+            fig = daily_figure(df_day_filtered, data_version, selected_apps, selected_country, selected_platform,
+                               selected_period)
+            if fig is not None:
+                st.plotly_chart(fig, use_container_width=True)
+            else:
+                st.write("No hay datos diarios para el mes/plataforma/país seleccionados.")
+
+
+    #GRID POR PAISES
+
+        # Estado de filtros del que dependen los dos grids (clave de la caché de tablas)
+        grid_selection = dict(apps=selected_apps, countries=selected_country, platforms=selected_platform,
+                              period=selected_period)
+
+        with tab_profiler.section('detalle.grid_pais') as span:
+             # Mostramos título de la sección
+            st.markdown(f"""
+            <div style="
+                border: 2px solid #e0e0e0;
+                border-radius: 12px;
+                padding: 20px;
+                background-color: #f9f9f9;
+                margin-top: 25px;
+            ">
+                <h3 style="text-align:center; color:#333;">🌍 Datos por país — {selected_period}</h3>
+            </div>
+            """, unsafe_allow_html=True)
+
+            # --- Tabla por país (numérica), paginada; el color de los Δ% solo se calcula para la página ---
+            span['rows_out'] = paged_grid(
+                'grid_pais', data_version, lambda: country_summary(comparison),
+                column_config={col: st.column_config.NumberColumn(format=fmt)
+                               for col, fmt in COUNTRY_SUMMARY_FORMATS.items()},
+                style=style_country_summary, **grid_selection
+            )
 
-    styled_df = (
-        df_display.style
-        .applymap(color_percent, subset=["Revenue Δ%", "Installs Δ%"])
-    )
 
+        #GRID DIARIO
+
+
+        with tab_profiler.section('detalle.grid_diario', rows_in=len(df_day_filtered)) as span:
+            # --- Mostramos título de la sección ---
+            st.markdown(f"""
+            <div style="
+                border: 2px solid #e0e0e0;
+                border-radius: 12px;
+                padding: 20px;
+                background-color: #f9f9f9;
+                margin-top: 25px;
+            ">
+                <h3 style="text-align:center; color:#333;">📅 Datos diarios por plataforma — {selected_period}</h3>
+            </div>
+            """, unsafe_allow_html=True)
+
+            # --- Tabla pivote por día con columnas para App Store, Play Store y Totales ---
+            df_pivot = cached_table('grid_diario', data_version, lambda: daily_pivot(df_day_filtered), **grid_selection)
+            if not df_pivot.empty:
+                span['rows_out'] = paged_grid(
+                    'grid_diario', data_version, lambda: df_pivot,
+                    column_config={
+                        "Date": st.column_config.DateColumn(format="YYYY-MM-DD"),
+                        **{col: st.column_config.NumberColumn(format=fmt)
+                           for col, fmt in daily_pivot_formats(df_pivot).items()},
+                    },
+                    **grid_selection
+                )
+            else:
+                st.warning("⚠️ No hay datos diarios disponibles para los filtros seleccionados.")
 
-     # Mostramos título de la sección
-    st.markdown(f"""
-    <div style="
-        border: 2px solid #e0e0e0;
-        border-radius: 12px;
-        padding: 20px;
-        background-color: #f9f9f9;
-        margin-top: 25px;
-    ">
-        <h3 style="text-align:center; color:#333;">🌍 Datos por país — {selected_period}</h3>
-    </div>
-    """, unsafe_allow_html=True)
-
-    # --- Mostrar tabla ---
-    st.dataframe(
-        styled_df,
-        use_container_width=True,
-        hide_index=True
-    )
 
-    
-    #GRID DIARIO
-
-
-          # --- Filtramos el dataframe diario según el mes seleccionado ---
-    df_daily_filtered = df_day[
-        (df_day['Country'].isin(selected_country)) &
-        (df_day['Platform'].isin(selected_platform)) &
-        (df_day['Date'].dt.to_period('M') == sel_period)
-    ].copy()
-
-    # --- Agrupamos por día y plataforma ---
-    df_daily_summary = df_daily_filtered.groupby(['Date', 'Platform'], as_index=False).agg({
-        'Revenue': 'sum',
-        'Downloads': 'sum'
-    })
-
-    # --- Creamos tabla pivote con columnas para App Store, Play Store y Totales ---
-    df_pivot = df_daily_summary.pivot_table(
-        index='Date',
-        columns='Platform',
-        values=['Revenue', 'Downloads'],
-        aggfunc='sum'
-    ).fillna(0)
-
-    # --- Agregamos totales ---
-    if 'App Store' in df_pivot['Revenue'].columns and 'Google Play' in df_pivot['Revenue'].columns:
-        df_pivot[('Revenue', 'Total')] = (
-            df_pivot[('Revenue', 'App Store')] + df_pivot[('Revenue', 'Google Play')]
-        )
-        df_pivot[('Downloads', 'Total')] = (
-            df_pivot[('Downloads', 'App Store')] + df_pivot[('Downloads', 'Google Play')]
+with tab2:
+    detail_tab(cube_month, data_version, selected_apps, selected_country, selected_platform)
+
+#------------- FIN DE PESTAÑA VISTA DETALLADA
+
+# === Pestaña EVOLUCIÓN ===
+# Cualquier rango de fechas y granularidad (día, semana ISO, mes, trimestre, año) se responde con el
+# índice de sumas acumuladas del histórico diario: no se agrupan los datos diarios en cada rerun.
+# El gráfico tiene un máximo de puntos por traza (figures.CHART_MAX_POINTS), sea cual sea el rango.
+
+@st.fragment
+def timeline_tab(data_version, selected_apps, selected_country, selected_platform):
+    with fragment_profiler(st, profiler, 'evolucion') as tab_profiler:
+        st.header("📆 EVOLUCIÓN")
+
+        with tab_profiler.section('evolucion.indice') as span:
+            timeline = backend.timeline(selected_apps)
+            span['rows_out'] = len(timeline.keys)
+        if not timeline.n_days:
+            st.warning("⚠️ No hay datos diarios para las apps seleccionadas.")
+            return
+
+        # --- Rango de fechas (por defecto los últimos 90 días con datos) y granularidad (semana) ---
+        default_start, default_end = default_range(timeline)
+        col_range, col_freq = st.columns([2, 3])
+        date_range = col_range.date_input(
+            "Rango de fechas",
+            value=(default_start.date(), default_end.date()),
+            min_value=timeline.first_day.date(),
+            max_value=timeline.last_day.date(),
+            key="timeline_range"
         )
-    else:
-        # Si falta alguna plataforma (por ejemplo, solo hay una en los datos filtrados)
-        df_pivot[('Revenue', 'Total')] = df_pivot['Revenue'].sum(axis=1)
-        df_pivot[('Downloads', 'Total')] = df_pivot['Downloads'].sum(axis=1)
-
-    # --- Orden de columnas personalizado ---
-    df_pivot = df_pivot.reindex(columns=pd.MultiIndex.from_product([
-        ['Revenue', 'Downloads'],
-        ['App Store', 'Google Play', 'Total']
-    ]), fill_value=0)
-
-    # --- Aplanamos columnas para mostrar bien los encabezados ---
-    df_pivot.columns = [f"{col1} ({col2})" for col1, col2 in df_pivot.columns]
-    df_pivot.reset_index(inplace=True)
-
-    # --- Formatear columna de fecha ---
-    df_pivot["Date"] = pd.to_datetime(df_pivot["Date"]).dt.strftime("%Y-%m-%d")
-
-    # --- Formateamos valores numéricos ---
-    df_display = df_pivot.copy()
-    for col in df_display.columns:
-        if "Revenue" in col:
-            df_display[col] = df_display[col].apply(lambda x: f"${x:,.0f}")
-        elif "Downloads" in col:
-            df_display[col] = df_display[col].apply(lambda x: f"{x:,.0f}")
-
-    # --- Mostramos título de la sección ---
-    st.markdown(f"""
-    <div style="
-        border: 2px solid #e0e0e0;
-        border-radius: 12px;
-        padding: 20px;
-        background-color: #f9f9f9;
-        margin-top: 25px;
-    ">
-        <h3 style="text-align:center; color:#333;">📅 Datos diarios por plataforma — {selected_period}</h3>
-    </div>
-    """, unsafe_allow_html=True)
-
-    # --- Mostramos el dataframe con estilo ---
-    if not df_display.empty:
-        st.dataframe(
-            df_display.style.set_table_styles([
-                {'selector': 'th', 'props': [('font-weight', 'bold'), ('background-color', '#f1f1f1')]},
-                {'selector': 'td', 'props': [('text-align', 'right')]}
-            ]),
-            use_container_width=True,
-            hide_index=True
+        freq = col_freq.radio(
+            "Granularidad",
+            list(GRANULARITY_OPTIONS),
+            index=list(GRANULARITY_OPTIONS).index(DEFAULT_GRANULARITY),
+            format_func=GRANULARITY_OPTIONS.get,
+            horizontal=True,
+            key="timeline_freq"
         )
-    else:
-        st.warning("⚠️ No hay datos diarios disponibles para los filtros seleccionados.")
-
-
-
-
-
-
-
+        # Mientras se elige el rango el calendario devuelve solo la fecha de inicio
+        if len(date_range) != 2:
+            st.info("Selecciona la fecha final del rango.")
+            return
+        start, end = date_range
+
+        with tab_profiler.section('evolucion.grafico', rows_in=len(timeline.keys)):
+            chart = timeline_figure(timeline, data_version, selected_apps, selected_country, selected_platform,
+                                    start, end, freq)
+            if chart is not None:
+                st.plotly_chart(chart['figure'], use_container_width=True)
+                notes = [f"{(end - start).days + 1} días"]
+                if freq == AUTO_GRANULARITY:
+                    notes.append(f"granularidad automática: {GRANULARITY_LABELS[chart['line']].lower()}")
+                if chart['bars'] != chart['line']:
+                    notes.append(f"demasiados intervalos para las barras: revenue sumado por "
+                                 f"{GRANULARITY_LABELS[chart['bars']].lower()}")
+                if chart['line_points'] < chart['line_total']:
+                    notes.append(f"línea de installs reducida de {chart['line_total']:,} a "
+                                 f"{chart['line_points']:,} puntos (LTTB, conserva picos y valles)")
+                notes.append("los intervalos de los extremos solo suman los días que caen dentro del rango")
+                st.caption(" · ".join(notes))
+            else:
+                st.write("No hay datos para el rango/plataforma/país seleccionados.")
+
+
+with tab3:
+    timeline_tab(data_version, selected_apps, selected_country, selected_platform)
+
+
+# --- Panel de perfil y registro del rerun (solo si está activado) ---
+profiler.render(st.sidebar, extra={
+    'Caché de figuras': format_stats(figure_cache.stats()),
+    'Caché de tablas': format_stats(table_cache.stats()),
+    'Caché de cubos combinados': format_stats(apps.memory_report()['combined_cache']),
+    'Datos': f"{backend.name} · v{snapshot.id} · versión {data_version} · {len(cube_month):,} celdas del cubo mensual",
+})
+profiler.flush()
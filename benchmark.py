@@ -0,0 +1,271 @@
+import argparse
+import gc
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import clean_data
+from cube import Cube
+from deltas import PeriodComparison
+from figures import build_country_treemaps, build_daily, build_overview, build_timeline
+from tables import country_summary, daily_pivot, style_country_summary
+from timeline import TimeIndex, default_range
+
+#-------BENCHMARK DE LA LIMPIEZA Y DE LAS SECCIONES DEL DASHBOARD
+# Mide por separado cada paso de clean_data (lectura, drop/rename, merge de países, fechas, columnas
+# derivadas, esquema) y cada sección de app.py (agregados de la vista general, KPIs, gráfico diario,
+# grid por país, grid diario y evolución por rango de fechas) con los datos de dat/ y con copias
+# sintéticas 10× y 100× más grandes.
+# Para cada paso guarda tiempo (mediana y mínimo de varias repeticiones), pico de memoria y bloques
+# reservados, en JSON para poder comparar dos commits. Con --data se miden también directorios
+# generados con synthetic.py (más apps, países o años que los datos reales):
+#
+#   python benchmark.py --output antes.json
+#   python benchmark.py --output despues.json
+#   python benchmark.py --compare antes.json despues.json
+
+DEFAULT_SCALES = [1, 10, 100]
+DEFAULT_REPEAT = 3
+# Ratio de tiempo a partir del cual --compare lo marca como regresión
+DEFAULT_THRESHOLD = 1.2
+
+
+def measure(fn, repeat=DEFAULT_REPEAT):
+    # Tiempo sin trazar (tracemalloc ralentiza mucho) y una pasada más con tracemalloc para la memoria.
+    # peak_bytes: pico de memoria reservada durante el paso (incluye los arrays de numpy).
+    # alloc_blocks: bloques de memoria que siguen reservados al terminar (lo que deja vivo el resultado).
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+
+    gc.collect()
+    blocks_before = sys.getallocatedblocks()
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    traced_before = tracemalloc.get_traced_memory()[0]
+    result = fn()
+    peak = tracemalloc.get_traced_memory()[1] - traced_before
+    tracemalloc.stop()
+    blocks_after = sys.getallocatedblocks()
+    del result
+    return {
+        'wall_seconds': statistics.median(times),
+        'wall_seconds_min': min(times),
+        'peak_bytes': int(peak),
+        'alloc_blocks': blocks_after - blocks_before,
+    }
+
+
+#-------DATOS SINTÉTICOS
+
+def scaled_export(df_raw, factor):
+    # factor copias de la exportación, cada una desplazada un año más hacia atrás:
+    # mismo reparto por país/plataforma/dispositivo pero con un histórico factor veces más largo
+    if factor == 1:
+        return df_raw
+    dates = pd.to_datetime(df_raw['Date'])
+    copies = []
+    for years in range(factor):
+        copy = df_raw.copy()
+        copy['Date'] = (dates - pd.DateOffset(years=years)).dt.strftime('%Y-%m-%d')
+        copies.append(copy)
+    return pd.concat(copies[::-1], ignore_index=True)
+
+
+def write_export(df_raw, path):
+    # Mismo formato que los ficheros de dat/: TSV en UTF-16, dentro de un ZIP si la extensión es .zip
+    path = Path(path)
+    compression = {'method': 'zip', 'archive_name': path.with_suffix('.csv').name} if path.suffix == '.zip' else None
+    df_raw.to_csv(path, sep='\t', encoding='utf-16', index=False, compression=compression)
+    return path
+
+
+def prepare_sources(scale, workdir):
+    # Rutas de (mensual, diario) para la escala pedida; la escala 1 son los ficheros de dat/
+    if scale == 1:
+        return clean_data.MONTHLY_FILE, clean_data.DAILY_FILE
+    paths = []
+    for source in (clean_data.MONTHLY_FILE, clean_data.DAILY_FILE):
+        df_raw = scaled_export(clean_data.read_export(source), scale)
+        paths.append(write_export(df_raw, Path(workdir) / f'x{scale}_{source.name}'))
+        del df_raw
+    return tuple(paths)
+
+
+#-------PASOS
+
+def bench_cleaning(path, df_countries, repeat):
+    # Cada paso recibe la salida del anterior (copias superficiales: los pasos no modifican su entrada)
+    results = {}
+    results['read'] = measure(lambda: clean_data.read_export(path), repeat)
+    df_raw = clean_data.read_export(path)
+    results['drop_rename'] = measure(lambda: clean_data.drop_and_rename(df_raw), repeat)
+    df = clean_data.drop_and_rename(df_raw)
+    results['country_merge'] = measure(lambda: clean_data.add_country(df, df_countries), repeat)
+    df = clean_data.add_country(df, df_countries)
+    results['datetime_parse'] = measure(lambda: clean_data.parse_dates(df.copy(deep=False)), repeat)
+    df = clean_data.parse_dates(df.copy(deep=False))
+    results['derived_columns'] = measure(lambda: clean_data.add_date_parts(df.copy(deep=False)), repeat)
+    df = clean_data.add_date_parts(df.copy(deep=False))
+    results['apply_schema'] = measure(lambda: clean_data.apply_schema(df), repeat)
+    # Lo que se usa de verdad al construir la caché: lectura por trozos + limpieza en paralelo
+    results['load_export'] = measure(lambda: clean_data.load_export(path, df_countries), repeat)
+    return results, clean_data.load_export(path, df_countries)
+
+
+def default_period(cube):
+    # El mismo mes que selecciona app.py por defecto: el primer diciembre disponible
+    periods = cube.periods
+    return next((p for p in periods if p.month == 12), periods[0])
+
+
+def bench_sections(df_month, df_day, repeat):
+    # Secciones de app.py con todos los países y plataformas seleccionados (estado inicial del dashboard)
+    results = {}
+    results['cube_build'] = measure(lambda: Cube.from_frame(df_month, 'M'), repeat)
+    cube_month = Cube.from_frame(df_month, 'M')
+    period = default_period(cube_month)
+    df_day_period = df_day[df_day['Date'].dt.to_period('M') == period]
+    daily_cube = Cube.from_frame(df_day_period, 'D')
+    countries = sorted(df_month['Country'].dropna().unique())
+    platforms = sorted(df_month['Platform'].unique())
+    filters = {'countries': countries, 'platforms': platforms}
+
+    def overview_aggregations():
+        df_filtered = cube_month.slice(periods=cube_month.periods, **filters)
+        return (df_filtered.total(), df_filtered.rollup('Platform'),
+                df_filtered.rollup('Month_Name'), df_filtered.rollup('Country'))
+
+    def kpis():
+        comparison = PeriodComparison(cube_month, period, **filters)
+        return comparison.total(), comparison.by('Platform')
+
+    comparison = PeriodComparison(cube_month, period, **filters)
+    day_slice = daily_cube.slice(**filters)
+
+    results['overview_aggregations'] = measure(overview_aggregations, repeat)
+    def overview_figures():
+        df_filtered = cube_month.slice(periods=cube_month.periods, **filters)
+        return build_overview(df_filtered), build_country_treemaps(df_filtered)
+
+    results['overview_figures'] = measure(overview_figures, repeat)
+    results['kpis'] = measure(kpis, repeat)
+    results['daily_chart'] = measure(lambda: build_daily(daily_cube.slice(**filters)), repeat)
+    results['country_grid'] = measure(lambda: style_country_summary(country_summary(comparison)), repeat)
+    results['daily_grid'] = measure(lambda: daily_pivot(day_slice), repeat)
+
+    # Evolución "últimos 90 días por semana": con el índice de sumas acumuladas y agrupando los diarios
+    results['timeline_build'] = measure(lambda: TimeIndex.from_frame(df_day), repeat)
+    timeline = TimeIndex.from_frame(df_day)
+    start, end = default_range(timeline)
+    results['timeline_90d_week'] = measure(lambda: timeline.query(start, end, 'W', **filters), repeat)
+
+    def scan_90d_week():
+        df = df_day[df_day['Date'].between(start, end) & df_day['Country'].isin(countries)
+                    & df_day['Platform'].isin(platforms)]
+        return df.groupby(df['Date'].dt.to_period('W'))[['Revenue', 'Downloads']].sum()
+
+    results['scan_90d_week'] = measure(scan_90d_week, repeat)
+    # Todo el histórico día a día: barras y línea acotadas a CHART_MAX_POINTS sea cual sea el rango
+    results['timeline_chart_all_days'] = measure(
+        lambda: build_timeline(timeline, timeline.first_day, timeline.last_day, 'D', **filters), repeat)
+    return results
+
+
+def run(scales=DEFAULT_SCALES, repeat=DEFAULT_REPEAT, log=print, data_dirs=()):
+    # data_dirs: directorios con la estructura de dat/ (p. ej. generados con synthetic.py) que se miden
+    # además de las escalas; en los resultados aparecen con el nombre del directorio como escala
+    results = []
+    df_countries = clean_data.read_countries()
+    with tempfile.TemporaryDirectory(prefix='bench_') as workdir:
+        runs = [(scale, lambda scale=scale: prepare_sources(scale, workdir)) for scale in scales]
+        runs += [(Path(d).name, lambda d=d: (Path(d) / clean_data.MONTHLY_FILE.name,
+                                             Path(d) / clean_data.DAILY_FILE.name)) for d in data_dirs]
+        for scale, sources in runs:
+            log(f"[{scale}] preparando datos")
+            month_path, day_path = sources()
+            frames = {}
+            for dataset, path in (('month', month_path), ('day', day_path)):
+                log(f"[{scale}] limpieza de {dataset}")
+                steps, frames[dataset] = bench_cleaning(path, df_countries, repeat)
+                for stage, metrics in steps.items():
+                    results.append({'scale': scale, 'group': 'clean_data', 'dataset': dataset,
+                                    'stage': stage, 'rows': len(frames[dataset]), **metrics})
+            log(f"[{scale}] secciones del dashboard")
+            for stage, metrics in bench_sections(frames['month'], frames['day'], repeat).items():
+                results.append({'scale': scale, 'group': 'app', 'dataset': 'month+day',
+                                'stage': stage, 'rows': len(frames['month']), **metrics})
+            del frames
+            gc.collect()
+    return {'meta': environment(repeat), 'results': results}
+
+
+def environment(repeat):
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=Path(__file__).resolve().parent, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'repeat': repeat,
+    }
+
+
+#-------COMPARACIÓN ENTRE DOS EJECUCIONES
+
+def compare(before, after, threshold=DEFAULT_THRESHOLD):
+    # Tabla con el ratio de tiempo y de pico de memoria (después / antes) de cada paso
+    key = ['scale', 'group', 'dataset', 'stage']
+    old = pd.DataFrame(before['results']).set_index(key)
+    new = pd.DataFrame(after['results']).set_index(key)
+    table = old[['wall_seconds', 'peak_bytes']].join(
+        new[['wall_seconds', 'peak_bytes']], lsuffix='_before', rsuffix='_after', how='inner')
+    table['time_ratio'] = table['wall_seconds_after'] / table['wall_seconds_before']
+    table['memory_ratio'] = table['peak_bytes_after'] / table['peak_bytes_before'].replace(0, np.nan)
+    table['regression'] = table['time_ratio'] > threshold
+    return table.reset_index()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark de clean_data y de las secciones del dashboard")
+    parser.add_argument('--scales', type=int, nargs='*', default=DEFAULT_SCALES,
+                        help="tamaños de los datos (1 = dat/, 10 = diez veces más histórico...)")
+    parser.add_argument('--data', nargs='+', default=[], metavar='DIR',
+                        help="directorios con exportaciones generadas con synthetic.py que también se miden")
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT, help="repeticiones por paso")
+    parser.add_argument('--output', help="fichero JSON de resultados (por defecto se escribe en la salida)")
+    parser.add_argument('--compare', nargs=2, metavar=('ANTES', 'DESPUES'),
+                        help="compara dos ficheros de resultados en vez de medir")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help="ratio de tiempo que cuenta como regresión en --compare")
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0], encoding='utf-8') as f_before, open(args.compare[1], encoding='utf-8') as f_after:
+            table = compare(json.load(f_before), json.load(f_after), args.threshold)
+        print(table.to_string(index=False, float_format='{:.3f}'.format))
+        sys.exit(1 if table['regression'].any() else 0)
+
+    report = run(args.scales, args.repeat, log=lambda msg: print(msg, file=sys.stderr), data_dirs=args.data)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text, encoding='utf-8')
+    else:
+        print(text)
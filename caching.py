@@ -0,0 +1,181 @@
+import hashlib
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+#-------CACHÉ LRU COMPARTIDA
+# Caché en memoria del proceso (compartida por todas las sesiones) con límite de entradas y,
+# opcionalmente, de memoria: se mide el tamaño real de cada resultado al guardarlo y se expulsan
+# entradas (la usada hace más tiempo, o la menos usada con policy='lfu') hasta volver al presupuesto.
+# El LFU envejece los contadores (LFU-DA): una entrada nueva empieza con los usos de la última expulsada
+# más uno, así compite con las antiguas en vez de ser siempre la siguiente en salir.
+# Los contadores de aciertos, fallos, expulsiones y bytes residentes se ven en stats().
+
+
+def env_megabytes(name, default):
+    # Presupuesto en bytes a partir de una variable de entorno en MB (p. ej. DASHBOARD_FIGURE_CACHE_MB=256)
+    return _env_number(name, default, 1024 * 1024)
+
+
+def env_kilobytes(name, default):
+    # Lo mismo en KB, para límites pequeños (p. ej. DASHBOARD_FIGURE_PAYLOAD_KB=32)
+    return _env_number(name, default, 1024)
+
+
+def env_count(name, default):
+    # Un número entero sin unidades (p. ej. DASHBOARD_CHART_POINTS=500)
+    return _env_number(name, default, 1)
+
+
+def _env_number(name, default, unit):
+    # Número de una variable de entorno multiplicado por unit, como entero; si no es un número, el valor por defecto
+    try:
+        return int(float(os.environ.get(name, default)) * unit)
+    except ValueError:
+        return int(default * unit)
+
+
+def estimate_bytes(value, _seen=None):
+    # Tamaño aproximado en memoria de un resultado: dataframes (deep), arrays y objetos con nbytes
+    # (cubos, índices), figuras de Plotly y contenedores. Lo compartido dentro del mismo valor cuenta una vez.
+    seen = set() if _seen is None else _seen
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, (pd.Series, pd.Index)):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, np.ndarray) or hasattr(value, 'nbytes'):
+        return int(value.nbytes)
+    if hasattr(value, 'to_plotly_json'):
+        return estimate_bytes(value.to_plotly_json(), seen)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_bytes(k, seen) + estimate_bytes(v, seen) for k, v in value.items())
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return sys.getsizeof(value) + sum(estimate_bytes(v, seen) for v in value)
+    return sys.getsizeof(value)
+
+
+def selection_key(*parts, **selection):
+    # Clave canónica para un estado de filtros: el orden en que se eligieron los valores no importa.
+    # Las listas se ordenan y todo se resume en un hash corto.
+    canonical = [repr(part) for part in parts]
+    for name in sorted(selection):
+        value = selection[name]
+        if isinstance(value, (list, tuple, set, frozenset)):
+            value = sorted(str(v) for v in value)
+        canonical.append(f'{name}={value!r}')
+    return hashlib.sha1('|'.join(canonical).encode('utf-8')).hexdigest()
+
+
+class LRUCache:
+
+    def __init__(self, max_entries=64, max_bytes=None, policy='lru', sizeof=estimate_bytes):
+        if policy not in ('lru', 'lfu'):
+            raise ValueError(f"política desconocida: {policy!r} (opciones: lru, lfu)")
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self._sizeof = sizeof
+        # Orden de uso (el primero es el usado hace más tiempo), tamaño y número de usos de cada entrada
+        self._entries = OrderedDict()
+        self._sizes = {}
+        self._uses = {}
+        # Usos de la última entrada expulsada (edad de la caché para el LFU)
+        self._age = 0
+        self._lock = threading.Lock()
+        self.resident_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.rejected = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self._uses[key] += 1
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        # El tamaño se mide fuera del lock. Un resultado que no cabe en el presupuesto no se guarda,
+        # pero sí deja de servirse el valor anterior de esa clave: quien lo sustituye es porque ya no vale.
+        size = self._sizeof(value)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            if self.max_bytes is not None and size > self.max_bytes:
+                self.rejected += 1
+                return
+            self._entries[key] = value
+            self._sizes[key] = size
+            self._uses[key] = self._age + 1
+            self.resident_bytes += size
+            while len(self._entries) > self.max_entries or (
+                    self.max_bytes is not None and self.resident_bytes > self.max_bytes):
+                victim = self._victim(protect=key)
+                self._age = self._uses[victim]
+                self._remove(victim)
+                self.evictions += 1
+
+    def _victim(self, protect=None):
+        # protect: la entrada que se acaba de guardar, que aún no ha tenido ocasión de usarse
+        candidates = (key for key in self._entries if key != protect)
+        if self.policy == 'lfu':
+            # La menos usada; a igualdad de usos, la usada hace más tiempo (min se queda con la primera)
+            return min(candidates, key=self._uses.__getitem__, default=protect)
+        return next(candidates, protect)
+
+    def _remove(self, key):
+        del self._entries[key]
+        del self._uses[key]
+        self.resident_bytes -= self._sizes.pop(key)
+
+    def get_or_build(self, key, build):
+        # build() se ejecuta fuera del lock: dos sesiones con el mismo estado pueden construirlo a la vez,
+        # pero ninguna bloquea a las demás mientras tanto
+        sentinel = object()
+        value = self.get(key, sentinel)
+        if value is sentinel:
+            value = build()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+            self._uses.clear()
+            self._age = 0
+            self.resident_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'resident_bytes': self.resident_bytes,
+                'max_bytes': self.max_bytes,
+                'policy': self.policy,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'rejected': self.rejected,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+            }
+
+
+def format_stats(stats):
+    # Resumen de una línea de stats() para el panel de perfil (en MB de 1024², como los presupuestos)
+    budget = f"/{stats['max_bytes'] / 2**20:,.0f}" if stats['max_bytes'] is not None else ''
+    return (f"{stats['entries']} entradas · {stats['resident_bytes'] / 2**20:,.1f}{budget} MB · "
+            f"{stats['hit_ratio']:.0%} aciertos · {stats['evictions']} expulsiones")
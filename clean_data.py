@@ -1,79 +1,756 @@
-import pandas as pd
-
-#-------LIMPIEZA DE DATOS
-
-
-#Importamos los archivos
-df_monthly = pd.read_csv('./dat/monthly_stats.csv', delimiter="\t", encoding = 'UTF-16')
-df_countries = pd.read_csv('./dat/country_iso.csv', encoding = 'UTF-8')
-df_daily = pd.read_csv(
-    "./dat/daily_stats.zip",              # archivo ZIP
-    compression='zip',        # indica que es un ZIP
-    delimiter="\t",           # separador del CSV
-    encoding="utf-16"         # codificación del archivo CSV
-)
-
-#Empezados con monthly quitando las columnas que no necesitamos
-df_month = df_monthly.drop(columns=['Unified Name', 'Unified ID', 'Unified Publisher Name', 'Unified Publisher ID', 'Publisher Name', 'Publisher ID', 'App Name', 'App ID'])
-df_month = df_month.rename(columns={'Country / Region': 'Country_ISO', 'Revenue ($)' : 'Revenue', 'RPD ($)' : 'RPD'})
-
-#Seguimos haciendo un merge con el df de países para añadir una columna con el nombre del pais según el codigo ISO
-#Renombramos columnas y quitamos las que han mergeado que no necesitamos
-
-# Aseguramos de que las columnas tengan el mismo formato
-df_countries.columns = df_countries.columns.str.strip()
-df_month.columns = df_month.columns.str.strip()
-
-# Hacemos el merge entre ambos dataframes
-df_month = df_month.merge(
-    df_countries,
-    how='left',  # left para conservar todos los datos de df_month
-    left_on='Country_ISO',
-    right_on='Code'
-)
-
-df_month = df_month.drop(columns=['Code'])
-df_month = df_month.rename(columns={'Name': 'Country'})
-# print(df_month)
-
-#Hacemos lo mismo pero con daily stats
-
-df_day = df_daily.drop(columns=['Unified Name', 'Unified ID', 'Unified Publisher Name', 'Unified Publisher ID', 'Publisher Name', 'Publisher ID', 'App Name', 'App ID'])
-df_day = df_day.rename(columns={'Country / Region': 'Country_ISO', 'Revenue ($)' : 'Revenue', 'RPD ($)' : 'RPD', 'ARPDAU ($)' : 'ARPDAU'})
-
-# Aseguramos de que las columnas tengan el mismo formato 
-df_countries.columns = df_countries.columns.str.strip()
-df_day.columns = df_day.columns.str.strip()
-
-# Hacemos el merge entre ambos dataframes
-df_day = df_day.merge(
-    df_countries,
-    how='left',  # left para conservar todos los datos de df_month
-    left_on='Country_ISO',
-    right_on='Code'
-)
-
-df_day = df_day.drop(columns=['Code'])
-df_day = df_day.rename(columns={'Name': 'Country'})
-print(df_day)
-
-#Nos aseguramos que las fechas están en el formato correcto
-df_month['Date'] = pd.to_datetime(df_month['Date'])
-df_day['Date'] = pd.to_datetime(df_day['Date'])
-
-#Generamos columnas adicionales Year, Month y Month name para facilitar la futura filtracion:
-# Crear columnas adicionales para facilitar filtros
-df_month['Year'] = df_month['Date'].dt.year
-df_month['Month'] = df_month['Date'].dt.month
-df_month['Month_Name'] = df_month['Date'].dt.strftime('%B')
-
-df_day['Year'] = df_day['Date'].dt.year
-df_day['Month'] = df_day['Date'].dt.month
-df_day['Month_Name'] = df_day['Date'].dt.strftime('%B')
-
-
-#DATOS LIMPIADOS; TENEMOS DOS DF DF_MONTH Y DF_DAY
-df_month = df_month
-df_day = df_day
-
-
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+import uuid
+import weakref
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import count
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+from pandas.api.types import CategoricalDtype
+
+try:
+    import fcntl
+except ImportError:  # Windows: las versiones de la caché solo se protegen de este mismo proceso
+    fcntl = None
+
+#-------LIMPIEZA DE DATOS
+
+# Rutas de los ficheros de origen (relativas al propio módulo, no al directorio de trabajo).
+# DASHBOARD_DATA_DIR permite apuntar a otro directorio con la misma estructura (p. ej. datos de synthetic.py)
+DATA_DIR = Path(os.environ.get('DASHBOARD_DATA_DIR') or Path(__file__).resolve().parent / 'dat').resolve()
+MONTHLY_FILE = DATA_DIR / 'monthly_stats.csv'
+DAILY_FILE = DATA_DIR / 'daily_stats.zip'
+COUNTRIES_FILE = DATA_DIR / 'country_iso.csv'
+SOURCE_FILES = (MONTHLY_FILE, DAILY_FILE, COUNTRIES_FILE)
+# Exportaciones nuevas ya incorporadas con ingest.py (forman parte de los datos de origen)
+DROPS_DIR = DATA_DIR / 'drops'
+
+# Caché columnar con los dataframes ya limpios. Cada reconstrucción (o ingesta) escribe una versión
+# completa en un directorio nuevo, particionada por app:
+#   apps.<n>/<App_ID>/df_month.parquet      datos mensuales de la app
+#   apps.<n>/<App_ID>/daily/AAAA-MM.parquet datos diarios de la app, un fichero por mes
+#   apps.<n>/apps.json                      catálogo de apps de esa versión
+# Así solo se leen las apps y los meses que se piden. manifest.json dice cuál es la versión actual y con
+# qué ficheros de origen se construyó. Una versión publicada no se modifica nunca (ver CacheVersion).
+CACHE_DIR = DATA_DIR / 'cache'
+CACHE_MANIFEST = CACHE_DIR / 'manifest.json'
+CATALOG_FILE = 'apps.json'
+LOCK_FILE = '.lock'
+VERSION_DIR = re.compile(r'apps\.(\d+)')
+
+# Si cambia la forma de limpiar los datos hay que subir la versión para invalidar la caché
+CACHE_VERSION = 5
+
+# Identidad de la app y del publisher: se guardan como categóricas (claves compactas)
+APP_COLUMNS = {'Unified ID': 'App_ID', 'Unified Name': 'App', 'Unified Publisher Name': 'Publisher'}
+# Columnas de identificación que no necesitamos (los IDs por tienda quedan cubiertos por Unified ID)
+DROP_COLUMNS = ['Unified Publisher ID', 'Publisher Name', 'Publisher ID', 'App Name', 'App ID']
+RENAME_COLUMNS = {**APP_COLUMNS, 'Country / Region': 'Country_ISO', 'Revenue ($)': 'Revenue',
+                  'RPD ($)': 'RPD', 'ARPDAU ($)': 'ARPDAU'}
+# Una fila por (app, fecha, país, plataforma, dispositivo)
+KEY_COLUMNS = ['App_ID', 'Date', 'Country_ISO', 'Platform', 'Device']
+
+MONTHS_ORDER = ['January', 'February', 'March', 'April', 'May', 'June',
+                'July', 'August', 'September', 'October', 'November', 'December']
+
+# Esquema compacto de los dataframes limpios:
+# - textos repetidos como categóricas (filtros y groupby trabajan sobre códigos enteros)
+# - Month_Name como categórica ordenada en orden de calendario
+# - enteros y ratios reducidos. Revenue se queda en float64 para no perder los céntimos en las sumas
+SCHEMA = {
+    'App_ID': 'category',
+    'App': 'category',
+    'Publisher': 'category',
+    'Country_ISO': 'category',
+    'Country': 'category',
+    'Platform': 'category',
+    'Device': 'category',
+    'Month_Name': CategoricalDtype(MONTHS_ORDER, ordered=True),
+    'Downloads': 'int32',
+    'Revenue': 'float64',
+    'RPD': 'float32',
+    'ARPDAU': 'float32',
+    'Year': 'int16',
+    'Month': 'int8',
+}
+
+
+# Lectura por trozos: filas por trozo y hilos que limpian los trozos mientras el parser sigue leyendo
+CHUNK_ROWS = 200_000
+PARSE_WORKERS = min(4, os.cpu_count() or 1)
+
+# Tipos que ya se asignan al leer (el resto se ajusta con SCHEMA al limpiar)
+READ_DTYPES = {
+    'Unified ID': 'category',
+    'Unified Name': 'category',
+    'Unified Publisher Name': 'category',
+    'Country / Region': 'category',
+    'Platform': 'category',
+    'Device': 'category',
+    'RPD ($)': 'float32',
+    'ARPDAU ($)': 'float32',
+}
+
+
+def _keep_column(col):
+    return col.strip() not in DROP_COLUMNS
+
+
+#Importamos los archivos
+def read_export(path, usecols=None, dtype=None, chunksize=None):
+    # Exportación en TSV UTF-16, suelta o dentro de un ZIP
+    path = Path(path)
+    return pd.read_csv(
+        path,
+        compression='zip' if path.suffix.lower() == '.zip' else None,
+        delimiter="\t",           # separador del CSV
+        encoding="utf-16",        # codificación del archivo CSV
+        usecols=usecols,
+        dtype=dtype,
+        chunksize=chunksize
+    )
+
+
+def read_countries():
+    return pd.read_csv(COUNTRIES_FILE, encoding='UTF-8')
+
+
+def load_export(path, df_countries, executor=None, chunksize=CHUNK_ROWS):
+    # Lee y limpia una exportación por trozos, solo con las columnas que usamos y con los tipos ya asignados.
+    # Nunca está entera en memoria la tabla original: cada trozo se limpia en el pool de hilos
+    # mientras el parser lee el siguiente. df_countries puede ser un future (se espera al usarlo).
+    def clean_chunk(chunk):
+        countries = df_countries.result() if hasattr(df_countries, 'result') else df_countries
+        return clean_stats(chunk, countries)
+
+    own_executor = executor is None
+    if own_executor:
+        executor = ThreadPoolExecutor(max_workers=PARSE_WORKERS)
+    try:
+        pending, parts = deque(), []
+        with read_export(path, usecols=_keep_column, dtype=READ_DTYPES, chunksize=chunksize) as reader:
+            for chunk in reader:
+                pending.append(executor.submit(clean_chunk, chunk))
+                # Limitamos los trozos en vuelo para que la memoria no crezca si el parser va más rápido
+                while len(pending) > 2 * PARSE_WORKERS:
+                    parts.append(pending.popleft().result())
+        parts.extend(future.result() for future in pending)
+    finally:
+        if own_executor:
+            executor.shutdown()
+    if len(parts) == 1:
+        return parts[0]
+    # Los trozos pueden traer categorías distintas: reaplicamos el esquema tras concatenar
+    return apply_schema(pd.concat(parts, ignore_index=True))
+
+
+def is_daily_export(df):
+    # Las exportaciones diarias traen ARPDAU; las mensuales no (sirve con el df original o el limpio)
+    return 'ARPDAU ($)' in df.columns or 'ARPDAU' in df.columns
+
+
+def read_sources():
+    df_monthly = read_export(MONTHLY_FILE)
+    df_countries = read_countries()
+    df_daily = read_export(DAILY_FILE)
+    return df_monthly, df_daily, df_countries
+
+
+def drop_files():
+    # Ordenadas por nombre = orden de ingesta (el nombre empieza por la fecha)
+    return sorted(DROPS_DIR.glob('*')) if DROPS_DIR.is_dir() else []
+
+
+def unseen_rows(df_new, df_existing):
+    # Filas de df_new cuya clave no está en df_existing (ni repetida dentro de df_new)
+    df_new = df_new.drop_duplicates(subset=KEY_COLUMNS, keep='first')
+    if df_existing is None or df_existing.empty:
+        return df_new
+    new_keys = pd.MultiIndex.from_frame(df_new[KEY_COLUMNS].astype(object))
+    old_keys = pd.MultiIndex.from_frame(df_existing[KEY_COLUMNS].astype(object))
+    return df_new[~new_keys.isin(old_keys)]
+
+
+def drop_and_rename(df_raw):
+    # Quitamos las columnas que no necesitamos (si no se quitaron ya al leer) y renombramos
+    df = df_raw.drop(columns=DROP_COLUMNS, errors='ignore')
+    df = df.rename(columns=RENAME_COLUMNS)
+    # Aseguramos de que las columnas tengan el mismo formato
+    df.columns = df.columns.str.strip()
+    return df
+
+
+def add_country(df, df_countries):
+    #Hacemos un merge con el df de países para añadir una columna con el nombre del pais según el codigo ISO
+    df_countries = df_countries.rename(columns=str.strip)
+    df = df.merge(
+        df_countries,
+        how='left',  # left para conservar todos los datos
+        left_on='Country_ISO',
+        right_on='Code'
+    )
+    df = df.drop(columns=['Code'])
+    return df.rename(columns={'Name': 'Country'})
+
+
+def parse_dates(df):
+    #Nos aseguramos que las fechas están en el formato correcto
+    df['Date'] = pd.to_datetime(df['Date'])
+    return df
+
+
+def add_date_parts(df):
+    #Generamos columnas adicionales Year, Month y Month name para facilitar la futura filtracion
+    df['Year'] = df['Date'].dt.year
+    df['Month'] = df['Date'].dt.month
+    # Month_Name directamente como categórica a partir del número de mes (strftime es muy lento)
+    df['Month_Name'] = pd.Categorical.from_codes(df['Month'] - 1, dtype=SCHEMA['Month_Name'])
+    return df
+
+
+def clean_stats(df_raw, df_countries):
+    # Limpieza completa; cada paso es una función aparte para poder medirlos por separado (benchmark.py)
+    df = drop_and_rename(df_raw)
+    df = add_country(df, df_countries)
+    df = parse_dates(df)
+    df = add_date_parts(df)
+    return apply_schema(df)
+
+
+def _fits(values, dtype):
+    # Solo reducimos un entero si todos los valores caben en el tipo destino
+    info = np.iinfo(dtype)
+    return values.empty or (values.min() >= info.min and values.max() <= info.max)
+
+
+def apply_schema(df):
+    df = df.copy()
+    for col, dtype in SCHEMA.items():
+        if col not in df.columns:
+            continue
+        if isinstance(dtype, str) and dtype.startswith('int') and not _fits(df[col], dtype):
+            continue
+        df[col] = df[col].astype(dtype)
+    return df
+
+
+def memory_report(before, after):
+    # Memoria por columna (bytes) antes y después de aplicar el esquema
+    report = pd.DataFrame({
+        'before': before.memory_usage(deep=True, index=False),
+        'after': after.memory_usage(deep=True, index=False),
+    })
+    report.loc['TOTAL'] = report.sum()
+    report['ratio'] = report['before'] / report['after']
+    return report
+
+
+def build_frames():
+    # Los tres ficheros se leen a la vez; los trozos de cada uno se limpian en un pool compartido
+    with ThreadPoolExecutor(max_workers=3) as files, ThreadPoolExecutor(max_workers=PARSE_WORKERS) as chunks:
+        df_countries = files.submit(read_countries)
+        month = files.submit(load_export, MONTHLY_FILE, df_countries, chunks)
+        day = files.submit(load_export, DAILY_FILE, df_countries, chunks)
+        drops = [files.submit(load_export, path, df_countries, chunks) for path in drop_files()]
+        df_month, df_day = month.result(), day.result()
+
+        # Añadimos las exportaciones ingeridas, en el mismo orden en que se ingirieron
+        for drop in drops:
+            df_new = drop.result()
+            if is_daily_export(df_new):
+                df_day = append_rows(df_day, unseen_rows(df_new, df_day))
+            else:
+                df_month = append_rows(df_month, unseen_rows(df_new, df_month))
+    return df_month, df_day
+
+
+def append_rows(df, df_new):
+    if df_new.empty:
+        return df
+    df = pd.concat([df, df_new], ignore_index=True) if not df.empty else df_new
+    return apply_schema(df.sort_values('Date', kind='stable', ignore_index=True))
+
+
+def schema_report():
+    # Limpia los datos de origen con y sin esquema y compara la memoria de cada dataframe
+    df_monthly, df_daily, df_countries = read_sources()
+    reports = {}
+    for name, df_raw in (('df_month', df_monthly), ('df_day', df_daily)):
+        after = clean_stats(df_raw, df_countries)
+        before = after.astype({col: dtype for col, dtype in _untyped_dtypes(after).items()})
+        reports[name] = memory_report(before, after)
+    return reports
+
+
+def _untyped_dtypes(df):
+    # Tipos que tendría el dataframe sin esquema: textos como object y números en 64 bits
+    dtypes = {}
+    for col in df.columns:
+        if isinstance(df[col].dtype, CategoricalDtype):
+            dtypes[col] = object
+        elif pd.api.types.is_integer_dtype(df[col]):
+            dtypes[col] = 'int64'
+        elif pd.api.types.is_float_dtype(df[col]):
+            dtypes[col] = 'float64'
+    return dtypes
+
+
+#-------CACHÉ EN PARQUET
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def source_fingerprint(previous=None):
+    # Huella de los ficheros de origen: tamaño, mtime y hash.
+    # Si tamaño y mtime coinciden con la huella anterior reutilizamos su hash para no releer el fichero.
+    previous = previous or {}
+    fingerprint = {}
+    for path in (*SOURCE_FILES, *drop_files()):
+        name = path.relative_to(DATA_DIR).as_posix()
+        stat = path.stat()
+        old = previous.get(name, {})
+        if old.get('size') == stat.st_size and old.get('mtime_ns') == stat.st_mtime_ns:
+            sha = old['sha256']
+        else:
+            sha = file_sha256(path)
+        fingerprint[name] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': sha}
+    return fingerprint
+
+
+def _read_manifest():
+    try:
+        with open(CACHE_MANIFEST, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_atomic(path, write):
+    # Escribimos en un temporal y lo movemos para no dejar nunca un fichero a medias
+    tmp = path.with_name(path.name + '.tmp')
+    write(tmp)
+    os.replace(tmp, path)
+
+
+def month_file(root, app_id):
+    return Path(root) / str(app_id) / 'df_month.parquet'
+
+
+def partition_file(root, app_id, period):
+    return Path(root) / str(app_id) / 'daily' / f'{period}.parquet'
+
+
+def save_month(root, app_id, df_month):
+    # root: directorio de una versión que aún no se ha publicado (fork_cache)
+    path = month_file(root, app_id)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    _write_atomic(path, lambda tmp: df_month.to_parquet(tmp, index=False))
+
+
+def save_day_partition(root, app_id, period, df):
+    path = partition_file(root, app_id, period)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    _write_atomic(path, lambda tmp: df.to_parquet(tmp, index=False))
+
+
+def _write_apps(root, df_month, df_day):
+    for app_id, part in df_month.groupby('App_ID', observed=True):
+        month_file(root, app_id).parent.mkdir(parents=True, exist_ok=True)
+        part.to_parquet(month_file(root, app_id), index=False)
+    for (app_id, period), part in df_day.groupby(['App_ID', df_day['Date'].dt.to_period('M')], observed=True):
+        partition_file(root, app_id, period).parent.mkdir(parents=True, exist_ok=True)
+        part.to_parquet(partition_file(root, app_id, period), index=False)
+
+
+def _write_cache(df_month, df_day, fingerprint):
+    # Versión nueva completa; las anteriores no se tocan (las borra prune_cache cuando nadie las lee)
+    root = _new_version_dir()
+    try:
+        _write_apps(root, df_month, df_day)
+        _write_catalog(root, build_catalog(df_month, df_day))
+    except BaseException:
+        shutil.rmtree(root, ignore_errors=True)
+        raise
+    publish_cache(root, fingerprint)
+    # Restos de cachés con el formato anterior (sin versiones)
+    (CACHE_DIR / 'df_month.parquet').unlink(missing_ok=True)
+    (CACHE_DIR / CATALOG_FILE).unlink(missing_ok=True)
+    shutil.rmtree(CACHE_DIR / 'daily', ignore_errors=True)
+    shutil.rmtree(CACHE_DIR / 'apps', ignore_errors=True)
+
+
+#-------VERSIONES DE LA CACHÉ
+# Quien lee la caché lo hace siempre a través de una CacheVersion: un directorio apps.<n> ya publicado,
+# que nadie modifica. Las reconstrucciones y las ingestas escriben una versión nueva en un directorio
+# temporal (una ingesta parte de una copia con hard links de la actual) y la publican con un rename y
+# el manifiesto. Así una instantánea del dashboard (refresh.py) ligada a su versión sigue leyendo los
+# mismos datos aunque entretanto se publique otra.
+# Mientras existe el objeto mantiene un lock compartido (flock) sobre el .lock del directorio;
+# prune_cache borra las versiones anteriores a la actual cuyo lock nadie tiene, en este proceso o en otro.
+
+def _version_number(path):
+    match = VERSION_DIR.fullmatch(path.name)
+    return int(match.group(1)) if match else None
+
+
+def _new_version_dir():
+    # Directorio temporal donde se escribe una versión antes de publicarla
+    root = CACHE_DIR / f'.apps-{uuid.uuid4().hex}'
+    root.mkdir(parents=True)
+    return root
+
+
+def _link_or_copy(src, dst):
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def fork_cache(version):
+    # Copia escribible de una versión (para la ingesta). Los ficheros se enlazan en vez de copiarse; como
+    # se reescriben con _write_atomic (fichero nuevo + rename) los de la versión original no cambian.
+    if version.path is None:
+        raise OSError("no hay caché en disco que modificar")
+    root = _new_version_dir()
+    shutil.copytree(version.path, root, dirs_exist_ok=True, copy_function=_link_or_copy,
+                    ignore=shutil.ignore_patterns(LOCK_FILE))
+    return root
+
+
+def publish_cache(root, fingerprint):
+    # Da a la versión escrita en root el siguiente nombre libre (apps.<n>) y la marca como la actual
+    (Path(root) / LOCK_FILE).touch()
+    numbers = [_version_number(path) for path in CACHE_DIR.iterdir()]
+    number = max((n for n in numbers if n is not None), default=0)
+    while True:
+        number += 1
+        path = CACHE_DIR / f'apps.{number}'
+        try:
+            # No sustituye un directorio con contenido: si otro proceso acaba de publicar ese número, el siguiente
+            os.rename(root, path)
+            break
+        except OSError:
+            if not path.exists():
+                raise
+    _write_manifest(fingerprint, path.name)
+    return path
+
+
+def _remove_version(path):
+    # Borra una versión si nadie la está leyendo. Primero se aparta con un rename bajo el lock exclusivo:
+    # quien intente abrirla después ya no la encuentra (y vuelve a leer el manifiesto)
+    trash = path.with_name(path.name + '.borrar')
+    try:
+        with open(path / LOCK_FILE, 'rb') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                os.rename(path, trash)
+        if fcntl is None:
+            os.rename(path, trash)
+    except OSError:
+        return False
+    shutil.rmtree(trash, ignore_errors=True)
+    return True
+
+
+def prune_cache():
+    # Borra las versiones anteriores a la actual que ya no lee nadie. Devuelve los directorios borrados
+    manifest = _read_manifest()
+    current = _version_number(CACHE_DIR / manifest['apps_dir']) if manifest and manifest.get('apps_dir') else None
+    if current is None:
+        return []
+    removed = []
+    for path in CACHE_DIR.iterdir():
+        if path.name.startswith('apps.') and path.name.endswith('.borrar'):
+            shutil.rmtree(path, ignore_errors=True)
+            continue
+        number = _version_number(path)
+        # Las posteriores a la actual pueden estar publicándose ahora mismo
+        if number is None or number >= current or path.name in _live:
+            continue
+        if _remove_version(path):
+            removed.append(path.name)
+    return removed
+
+
+_memory_ids = count(1)
+
+
+class CacheVersion:
+    # Una versión de la caché, de solo lectura: su directorio apps.<n> (o los dataframes limpios en memoria
+    # si la caché no se pudo escribir) y la huella de los ficheros de origen con la que se construyó
+
+    def __init__(self, path=None, sources=None, frames=None):
+        self.path = path
+        self.sources = sources or {}
+        # (df_month, df_day) cuando la caché no se pudo escribir
+        self.frames = frames
+        if path is not None:
+            self.id = path.name
+            self._hold()
+        else:
+            self.id = f'memoria.{next(_memory_ids)}'
+
+    def _hold(self):
+        lock = open(self.path / LOCK_FILE, 'rb')  # FileNotFoundError si ya se ha borrado
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_SH)
+        if not self.path.is_dir():
+            # Se ha apartado para borrarla mientras esperábamos el lock
+            lock.close()
+            raise FileNotFoundError(self.path)
+        weakref.finalize(self, lock.close)
+
+    def __repr__(self):
+        return f'CacheVersion({self.id})'
+
+    def month_path(self, app_id):
+        return month_file(self.path, app_id)
+
+    def partition_path(self, app_id, period):
+        return partition_file(self.path, app_id, period)
+
+    def list_apps(self):
+        # Catálogo de apps de la versión (App_ID, App, Publisher, Revenue, Downloads)
+        if self.frames is not None:
+            return build_catalog(*self.frames)
+        if self.path is None:
+            return pd.DataFrame(columns=CATALOG_COLUMNS)
+        try:
+            with open(self.path / CATALOG_FILE, encoding='utf-8') as f:
+                return pd.DataFrame(json.load(f), columns=CATALOG_COLUMNS)
+        except (OSError, ValueError):
+            return pd.DataFrame(columns=CATALOG_COLUMNS)
+
+    def _app_ids(self, app_ids):
+        return list(self.list_apps()['App_ID']) if app_ids is None else list(app_ids)
+
+    def _read_parts(self, paths, template_glob):
+        # Concatena los Parquet indicados; si no hay ninguno, dataframe vacío con el esquema de la caché
+        parts = [pd.read_parquet(path) for path in paths if path.exists()]
+        if not parts:
+            template = next(self.path.glob(template_glob), None) if self.path is not None else None
+            return pq.read_schema(template).empty_table().to_pandas() if template else pd.DataFrame()
+        if len(parts) == 1:
+            return parts[0]
+        # Cada app trae sus propias categorías: reaplicamos el esquema tras concatenar
+        return apply_schema(pd.concat(parts, ignore_index=True))
+
+    def read_month(self, app_ids=None):
+        # df_month de las apps indicadas (None = todas)
+        if self.frames is not None:
+            return _select_apps(self.frames[0], app_ids)
+        return self._read_parts([self.month_path(app_id) for app_id in self._app_ids(app_ids)],
+                                '*/df_month.parquet')
+
+    def day_partitions(self, app_ids=None):
+        # Meses disponibles en los datos diarios de las apps indicadas, ordenados
+        if self.frames is not None:
+            return sorted(_select_apps(self.frames[1], app_ids)['Date'].dt.to_period('M').unique())
+        if self.path is None:
+            return []
+        return sorted({pd.Period(path.stem, freq='M') for app_id in self._app_ids(app_ids)
+                       for path in (self.path / str(app_id) / 'daily').glob('*.parquet')})
+
+    def load_day_partition(self, period, app_ids=None):
+        # Datos diarios de un solo mes; si el mes no existe devuelve un dataframe vacío con el mismo esquema
+        if self.frames is not None:
+            df_day = _select_apps(self.frames[1], app_ids)
+            return df_day[df_day['Date'].dt.to_period('M') == period].reset_index(drop=True)
+        return self._read_parts([self.partition_path(app_id, period) for app_id in self._app_ids(app_ids)],
+                                '*/daily/*.parquet')
+
+    def read_day(self, app_ids=None):
+        # df_day completo (todas las particiones) de las apps indicadas
+        if self.frames is not None:
+            return _select_apps(self.frames[1], app_ids)
+        parts = [self.load_day_partition(period, app_ids) for period in self.day_partitions(app_ids)]
+        if not parts:
+            return self._read_parts([], '*/daily/*.parquet')
+        # Las particiones pueden traer categorías distintas: reaplicamos el esquema tras concatenar
+        return apply_schema(pd.concat(parts, ignore_index=True))
+
+
+# Versiones abiertas en este proceso, por nombre (todos los que leen la misma comparten el objeto)
+_live = weakref.WeakValueDictionary()
+_live_lock = threading.Lock()
+# Si la caché no se puede escribir (disco de solo lectura) servimos los datos desde memoria
+_memory = None
+
+
+def current_cache():
+    # Versión actual de la caché (la del manifiesto), sin comprobar los ficheros de origen
+    memory = _memory
+    if memory is not None:
+        return memory
+    with _live_lock:
+        while True:
+            manifest = _read_manifest()
+            name = manifest.get('apps_dir') if manifest else None
+            if name is None:
+                return CacheVersion()
+            version = _live.get(name)
+            if version is not None:
+                return version
+            try:
+                version = CacheVersion(CACHE_DIR / name, manifest.get('sources'))
+            except FileNotFoundError:
+                # Sustituida y borrada entre leer el manifiesto y abrirla: volvemos a leerlo
+                if _read_manifest() == manifest:
+                    return CacheVersion()
+                continue
+            _live[name] = version
+            return version
+
+
+#-------CATÁLOGO DE APPS
+
+CATALOG_COLUMNS = ['App_ID', 'App', 'Publisher', 'Revenue', 'Downloads']
+
+
+def build_catalog(df_month, df_day):
+    # Una fila por app (las que solo tienen datos diarios también), de más a menos revenue mensual
+    identity = (
+        pd.concat([df[['App_ID', 'App', 'Publisher']].astype(object) for df in (df_month, df_day)])
+        .dropna(subset=['App_ID'])
+        .drop_duplicates('App_ID')
+    )
+    totals = df_month.groupby('App_ID', observed=True)[['Revenue', 'Downloads']].sum()
+    totals.index = totals.index.astype(object)
+    catalog = identity.join(totals, on='App_ID')
+    catalog[['Revenue', 'Downloads']] = catalog[['Revenue', 'Downloads']].fillna(0)
+    catalog['Downloads'] = catalog['Downloads'].astype('int64')
+    return catalog.sort_values(['Revenue', 'App'], ascending=[False, True], ignore_index=True)[CATALOG_COLUMNS]
+
+
+def _write_catalog(root, catalog):
+    records = catalog.to_dict(orient='records')
+    _write_atomic(Path(root) / CATALOG_FILE,
+                  lambda tmp: tmp.write_text(json.dumps(records, indent=2), encoding='utf-8'))
+
+
+def update_catalog(root, catalog, df_month_added, df_day_added):
+    # Tras una ingesta: apps nuevas al catálogo y revenue/downloads mensuales sumados
+    added = build_catalog(df_month_added, df_day_added)
+    catalog = pd.concat([catalog, added], ignore_index=True)
+    catalog = catalog.groupby('App_ID', as_index=False, sort=False).agg(
+        App=('App', 'first'), Publisher=('Publisher', 'first'),
+        Revenue=('Revenue', 'sum'), Downloads=('Downloads', 'sum'))
+    _write_catalog(root, catalog.sort_values(['Revenue', 'App'], ascending=[False, True], ignore_index=True))
+
+
+def _select_apps(df, app_ids):
+    if app_ids is None:
+        return df
+    return df[df['App_ID'].isin(list(app_ids))].reset_index(drop=True)
+
+
+def _write_manifest(fingerprint, apps_dir):
+    manifest = {'version': CACHE_VERSION, 'apps_dir': apps_dir, 'sources': fingerprint}
+    _write_atomic(CACHE_MANIFEST, lambda tmp: tmp.write_text(json.dumps(manifest, indent=2), encoding='utf-8'))
+
+
+def _cache_is_valid(manifest, fingerprint):
+    if not manifest or manifest.get('version') != CACHE_VERSION or not manifest.get('apps_dir'):
+        return False
+    if not (CACHE_DIR / manifest['apps_dir'] / CATALOG_FILE).exists():
+        return False
+    return same_sources(manifest.get('sources', {}), fingerprint)
+
+
+def same_sources(cached, fingerprint):
+    # Comparamos solo el contenido: un cambio de mtime sin cambio de hash no invalida la caché
+    return cached.keys() == fingerprint.keys() and all(
+        cached[name].get('sha256') == fp['sha256'] and cached[name].get('size') == fp['size']
+        for name, fp in fingerprint.items())
+
+
+# Una sola reconstrucción a la vez: el resto de hilos esperan y encuentran la caché ya al día
+_refresh_lock = threading.Lock()
+
+
+def refresh_cache():
+    # Comprueba la caché y publica una versión nueva si han cambiado los ficheros de origen.
+    # Devuelve (df_month, df_day) si ha tenido que limpiar los datos de nuevo, None si la caché ya era válida.
+    with _refresh_lock:
+        return _refresh_cache()
+
+
+def _refresh_cache():
+    global _memory
+    manifest = _read_manifest()
+    fingerprint = source_fingerprint(manifest.get('sources') if manifest else None)
+
+    if _cache_is_valid(manifest, fingerprint):
+        _memory = None
+        if manifest['sources'] != fingerprint:
+            # Solo ha cambiado el mtime: actualizamos el manifiesto para no volver a calcular el hash
+            try:
+                _write_manifest(fingerprint, manifest['apps_dir'])
+            except OSError:
+                pass
+        return None
+    if _memory is not None and same_sources(_memory.sources, fingerprint):
+        return None
+
+    df_month, df_day = build_frames()
+    try:
+        _write_cache(df_month, df_day, fingerprint)
+        _memory = None
+    except OSError:
+        _memory = CacheVersion(sources=fingerprint, frames=(df_month, df_day))
+    return df_month, df_day
+
+
+def load_month(app_ids=None):
+    # df_month de las apps indicadas (None = todas), con la caché al día
+    frames = refresh_cache()
+    if frames is not None:
+        return _select_apps(frames[0], app_ids)
+    return current_cache().read_month(app_ids)
+
+
+def load_day(app_ids=None):
+    # df_day completo (todas las particiones) de las apps indicadas, con la caché al día
+    frames = refresh_cache()
+    if frames is not None:
+        return _select_apps(frames[1], app_ids)
+    return current_cache().read_day(app_ids)
+
+
+def load_frames(use_cache=True):
+    if not use_cache:
+        return build_frames()
+    frames = refresh_cache()
+    if frames is not None:
+        return frames
+    return load_month(), load_day()
+
+
+#DATOS LIMPIADOS; TENEMOS DOS DF DF_MONTH Y DF_DAY
+# Se sirven desde el almacén compartido (data_store) para no cargarlos de nuevo en cada import
+def __getattr__(name):
+    if name in ('df_month', 'df_day'):
+        from data_store import store
+        return store.get() if name == 'df_month' else store.get_day()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+if __name__ == '__main__':
+    for name, report in schema_report().items():
+        print(f"--- {name} (bytes)")
+        print(report.to_string(float_format='{:.1f}'.format))
@@ -0,0 +1,100 @@
+import pandas as pd
+
+from clean_data import SCHEMA
+from filter_index import FilterIndex
+
+#-------CUBO OLAP
+# Sumas de Revenue y Downloads por (periodo, país, plataforma, dispositivo), calculadas una vez al cargar.
+# Cada gráfico del dashboard se responde cortando (slice) el cubo y agregando (rollup) lo que queda,
+# así el coste por rerun depende del número de combinaciones y no del número de filas originales.
+
+DIMENSIONS = ['Period', 'Country', 'Platform', 'Device']
+# Atributos que dependen solo del periodo: no cambian la granularidad del cubo
+ATTRIBUTES = ['Date', 'Month_Name']
+MEASURES = ['Revenue', 'Downloads']
+
+
+class Cube:
+
+    def __init__(self, data, freq, indexed=False):
+        self.data = data
+        self.freq = freq
+        # Solo los cubos completos llevan índice; los cortes se agregan directamente
+        self.index = FilterIndex(data, DIMENSIONS + ['Date']) if indexed else None
+
+    @classmethod
+    def from_frame(cls, df, freq='M'):
+        period = df['Date'].dt.to_period(freq).rename('Period')
+        data = (
+            df.groupby([period, 'Country', 'Platform', 'Device'], observed=True)[MEASURES]
+            .sum()
+            .reset_index()
+        )
+        data['Date'] = data['Period'].dt.start_time
+        data['Month_Name'] = data['Date'].dt.month_name().astype(SCHEMA['Month_Name'])
+        return cls(data[DIMENSIONS + ATTRIBUTES + MEASURES], freq, indexed=True)
+
+    def extend(self, df):
+        # Cubo con las filas nuevas de df añadidas: solo se agregan las filas nuevas
+        # y las combinaciones que ya existían se suman
+        return Cube.combine([self, Cube.from_frame(df, self.freq)], indexed=self.index is not None)
+
+    @classmethod
+    def combine(cls, cubes, indexed=True):
+        # Suma de varios cubos de la misma frecuencia (p. ej. los de varias apps) en uno solo
+        cubes = list(cubes)
+        if len(cubes) == 1:
+            return cubes[0]
+        data = pd.concat([cube.data for cube in cubes], ignore_index=True)
+        data = (
+            data.groupby(DIMENSIONS, observed=True, sort=True)
+            .agg({**{col: 'first' for col in ATTRIBUTES}, **{m: 'sum' for m in MEASURES}})
+            .reset_index()
+        )
+        # Si las categorías no coincidían, concat las habrá convertido en texto
+        for col in ['Country', 'Platform', 'Device', 'Month_Name']:
+            data[col] = data[col].astype(SCHEMA[col])
+        return cls(data[DIMENSIONS + ATTRIBUTES + MEASURES], cubes[0].freq, indexed=indexed)
+
+    def __len__(self):
+        return len(self.data)
+
+    @property
+    def nbytes(self):
+        # Memoria de las celdas y del índice (para las cachés con presupuesto de bytes)
+        return int(self.data.memory_usage(deep=True).sum()) + (self.index.nbytes if self.index is not None else 0)
+
+    @property
+    def empty(self):
+        return self.data.empty
+
+    @property
+    def periods(self):
+        if self.index is not None:
+            return list(self.index.values('Period'))
+        return sorted(self.data['Period'].unique())
+
+    def slice(self, countries=None, platforms=None, periods=None, devices=None, span=None):
+        # None significa "sin filtrar" en esa dimensión.
+        # span es un periodo más grueso que el del cubo (p. ej. un mes en el cubo diario).
+        isin = {col: values for col, values in (('Country', countries), ('Platform', platforms),
+                                                ('Device', devices), ('Period', periods))
+                if values is not None}
+        between = {'Date': (span.start_time, span.end_time)} if span is not None else {}
+
+        if self.index is None:
+            mask = self.data['Date'].between(*between['Date']) if between else True
+            for col, values in isin.items():
+                mask = mask & self.data[col].isin(values)
+            return Cube(self.data[mask] if isin or between else self.data, self.freq)
+
+        rows = self.index.select(isin, between)
+        return Cube(self.data if rows is None else self.data.iloc[rows], self.freq)
+
+    def total(self):
+        # Diccionario y no Series para no convertir Downloads a float al mezclarlo con Revenue
+        return {measure: self.data[measure].sum() for measure in MEASURES}
+
+    def rollup(self, by):
+        # Agrega el cubo a las dimensiones/atributos indicados
+        return self.data.groupby(by, as_index=False, observed=True)[MEASURES].sum()
@@ -0,0 +1,294 @@
+import itertools
+import os
+import resource
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+import clean_data
+from caching import LRUCache, env_megabytes
+from cube import Cube
+from partitions import DailyPartitions
+from timeline import TimeIndex
+
+#-------ALMACÉN DE DATOS COMPARTIDO
+# Streamlit vuelve a ejecutar app.py en cada interacción y cada sesión corre en su propio hilo,
+# pero los módulos importados viven lo mismo que el proceso. Guardamos aquí una única copia de
+# df_month (y de lo que se construye a partir de él) para todas las sesiones y reruns.
+# Los datos diarios no se cargan enteros: se leen por meses desde DailyPartitions.
+# Con varias apps cada una tiene su propio almacén (AppStores) y solo se cargan las apps seleccionadas.
+# Los almacenes no se invalidan ni se recargan: para cargar datos nuevos refresh.py crea almacenes nuevos
+# (una instantánea) y los publica cuando están listos; los anteriores se liberan cuando nadie los usa.
+
+
+def enable_copy_on_write():
+    # Con copy-on-write las copias superficiales que entregamos comparten memoria con las originales,
+    # y cualquier escritura sobre ellas copia antes de modificar: nadie puede alterar los datos compartidos.
+    # Cambia el comportamiento de pandas en todo el proceso, así que lo activa el dashboard (app.py) al
+    # arrancar y no este módulo al importarlo. En pandas >= 3 ya es el comportamiento por defecto.
+    if int(pd.__version__.split('.')[0]) < 3:
+        pd.set_option('mode.copy_on_write', True)
+
+
+def process_rss_bytes():
+    # Memoria residente actual del proceso (Linux); si no hay /proc usamos el pico que da getrusage
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+# Versiones de los datos, únicas en todo el proceso
+_versions = itertools.count(1)
+
+
+class DataStore:
+
+    def __init__(self, cache=None, app_ids=None):
+        # cache: versión de la caché de la que se leen los datos (clean_data.CacheVersion); sin ella se pone
+        # la caché al día y se lee la actual. app_ids: apps del almacén (None = todas)
+        self.cache = cache
+        self.app_ids = app_ids
+        self._lock = threading.RLock()
+        self._df_month = None
+        self._df_day = None
+        self._builders = {}
+        self._updaters = {}
+        self._artifacts = {}
+        self.stats = {}
+        # Cambia con cada carga o ingesta: sirve para invalidar las cachés que dependen de los datos.
+        # Sale de un contador del proceso para que no se repita aunque se vuelva a crear el almacén.
+        self.version = 0
+
+    def get(self):
+        # Devuelve df_month de solo lectura; solo el primer hilo que llega hace la carga
+        df_month = self._df_month
+        if df_month is None:
+            with self._lock:
+                if self._df_month is None:
+                    self._load()
+                df_month = self._df_month
+        return df_month.copy(deep=False)
+
+    def get_day(self):
+        # df_day completo. Solo para código que lo necesite entero: el dashboard usa las particiones
+        df_day = self._df_day
+        if df_day is None:
+            with self._lock:
+                if self._df_day is None:
+                    self._df_day = self._read_day()
+                df_day = self._df_day
+        return df_day.copy(deep=False)
+
+    def register(self, name, builder, update=None):
+        # builder(df_month) construye un artefacto derivado (cubo, índice...) una vez por carga.
+        # update(artefacto, filas_nuevas) opcional: lo actualiza tras una ingesta sin reconstruirlo entero.
+        with self._lock:
+            self._builders[name] = builder
+            if update is not None:
+                self._updaters[name] = update
+            if self._df_month is not None:
+                self._artifacts = {**self._artifacts, name: builder(self._df_month.copy(deep=False))}
+
+    def artifact(self, name):
+        artifacts = self._artifacts
+        if name not in artifacts:
+            with self._lock:
+                if self._df_month is None:
+                    self._load()
+                artifacts = self._artifacts
+        return artifacts[name]
+
+    def apply_ingest(self, kind, df_added, cache):
+        # Incorpora en memoria las filas añadidas por ingest.py. cache: la versión de la caché que ya las
+        # incluye, de la que se lee a partir de ahora lo que aún no está en memoria
+        with self._lock:
+            self.cache = cache
+            if self._df_month is None or df_added.empty:
+                return
+            self._df_day = None
+            self.version = next(_versions)
+            if kind == 'daily':
+                self._artifacts['daily'].refresh(sorted(df_added['Date'].dt.to_period('M').unique()), cache)
+                return
+            df_month = clean_data.append_rows(self._df_month, df_added)
+            artifacts = dict(self._artifacts)
+            for name, builder in self._builders.items():
+                update = self._updaters.get(name)
+                artifacts[name] = update(artifacts[name], df_added) if update else builder(df_month.copy(deep=False))
+            self._artifacts = artifacts
+            self._df_month = df_month
+
+    def _read_month(self):
+        if self.cache is None:
+            return clean_data.load_month(self.app_ids)
+        return self.cache.read_month(self.app_ids)
+
+    def _read_day(self):
+        if self.cache is None:
+            return clean_data.load_day(self.app_ids)
+        return self.cache.read_day(self.app_ids)
+
+    def _load(self):
+        rss_before = process_rss_bytes()
+        start = time.perf_counter()
+        df_month = self._read_month()
+        elapsed = time.perf_counter() - start
+
+        start_derived = time.perf_counter()
+        artifacts = {name: builder(df_month.copy(deep=False)) for name, builder in self._builders.items()}
+        derived_elapsed = time.perf_counter() - start_derived
+        rss_after = process_rss_bytes()
+
+        # Publicamos datos y artefactos juntos
+        self._artifacts = artifacts
+        self._df_month = df_month
+        self._df_day = None
+        self.version = next(_versions)
+        self.stats = {
+            'load_seconds': elapsed,
+            'derived_seconds': derived_elapsed,
+            'loaded_at': time.time(),
+            'rows': len(df_month),
+            'frame_bytes': int(df_month.memory_usage(deep=True).sum()),
+            'rss_bytes': rss_after,
+            'rss_delta_bytes': rss_after - rss_before,
+        }
+
+    def memory_report(self):
+        report = dict(self.stats)
+        report['rss_bytes'] = process_rss_bytes()
+        return report
+
+
+def _register_artifacts(data_store):
+    # Agregados que se precalculan con cada carga: cubo mensual y particiones diarias (de las mismas apps y
+    # de la misma versión de la caché)
+    data_store.register('cube_month', lambda df_month: Cube.from_frame(df_month, 'M'),
+                        update=lambda cube, df_added: cube.extend(df_added))
+    data_store.register('daily', lambda df_month: DailyPartitions(data_store.app_ids, cache=data_store.cache),
+                        update=lambda daily, df_added: daily)
+    return data_store
+
+
+#-------UN ALMACÉN POR APP
+# Cada app tiene su DataStore (df_month, cubo mensual y particiones diarias propios) que se crea la primera
+# vez que alguien la selecciona. Se guardan los de las últimas apps usadas, así que añadir apps al
+# catálogo no aumenta la memoria ni el tiempo de la primera carga. Si se seleccionan varias apps,
+# sus cubos (e índices temporales) se suman y el resultado se guarda en una LRU por combinación de apps.
+# Todos los almacenes de un AppStores leen la misma versión de la caché (la actual la primera vez que se
+# usa), aunque después se publique otra: así una instantánea de refresh.py no mezcla datos de dos versiones.
+# Comprobar la caché contra dat/ y reconstruirla lo hace refresh.py (o warmup.py/ingest.py), nunca un rerun.
+
+DEFAULT_MAX_APPS = 8
+# Cubos sumados de selecciones de varias apps (DASHBOARD_CUBE_CACHE_MB)
+COMBINED_CACHE_ENTRIES = 16
+COMBINED_CACHE_BYTES = env_megabytes('DASHBOARD_CUBE_CACHE_MB', 256)
+
+
+class AppStores:
+
+    def __init__(self, cache=None, max_apps=DEFAULT_MAX_APPS):
+        self._cache = cache
+        self.max_apps = max_apps
+        self._stores = OrderedDict()
+        self._lock = threading.Lock()
+        self._catalog = None
+        self._combined = LRUCache(max_entries=COMBINED_CACHE_ENTRIES, max_bytes=COMBINED_CACHE_BYTES)
+
+    @property
+    def cache(self):
+        # Versión de la caché de estos almacenes (clean_data.CacheVersion)
+        cache = self._cache
+        if cache is None:
+            with self._lock:
+                if self._cache is None:
+                    self._cache = clean_data.current_cache()
+                cache = self._cache
+        return cache
+
+    def catalog(self):
+        # Apps disponibles (App_ID, App, Publisher, Revenue, Downloads), de más a menos revenue
+        catalog = self._catalog
+        if catalog is None:
+            catalog = self._catalog = self.cache.list_apps()
+        return catalog
+
+    def store(self, app_id):
+        cache = self.cache
+        with self._lock:
+            data_store = self._stores.get(app_id)
+            if data_store is None:
+                data_store = _register_artifacts(DataStore(cache, [app_id]))
+                self._stores[app_id] = data_store
+                while len(self._stores) > self.max_apps:
+                    self._stores.popitem(last=False)
+            self._stores.move_to_end(app_id)
+            return data_store
+
+    def loaded_apps(self):
+        # Apps con almacén en memoria, de la usada hace más tiempo a la más reciente
+        with self._lock:
+            return list(self._stores)
+
+    def version(self, app_ids):
+        # Versión de los datos de una selección de apps (carga los almacenes si hace falta)
+        return tuple(self._loaded(app_id).version for app_id in sorted(app_ids))
+
+    def _loaded(self, app_id):
+        data_store = self.store(app_id)
+        data_store.artifact('cube_month')
+        return data_store
+
+    def month_cube(self, app_ids):
+        return self._combine('month', app_ids, lambda data_store: data_store.artifact('cube_month'))
+
+    def daily_cube(self, app_ids, period):
+        return self._combine(('day', period), app_ids, lambda data_store: data_store.artifact('daily').cube(period))
+
+    def timeline(self, app_ids):
+        # Índice de sumas acumuladas diarias (timeline.TimeIndex) de la selección de apps
+        return self._combine('timeline', app_ids, lambda data_store: data_store.artifact('daily').timeline(),
+                             combine=TimeIndex.combine)
+
+    def _combine(self, kind, app_ids, cube_of, combine=Cube.combine):
+        app_ids = sorted(app_ids)
+        if len(app_ids) == 1:
+            return cube_of(self._loaded(app_ids[0]))
+        key = (kind, tuple(app_ids), self.version(app_ids))
+        return self._combined.get_or_build(key, lambda: combine(cube_of(self._loaded(a)) for a in app_ids))
+
+    def load_stats(self, app_ids):
+        # Estadísticas de carga de las apps indicadas que ya están en memoria
+        with self._lock:
+            return {app_id: self._stores[app_id].stats for app_id in app_ids
+                    if app_id in self._stores and self._stores[app_id].stats}
+
+    def apply_ingest(self, kind, df_added, cache):
+        # Reparte las filas ingeridas entre los almacenes de las apps que están en memoria.
+        # cache: la versión de la caché publicada por la ingesta, de la que se lee a partir de ahora
+        with self._lock:
+            loaded = dict(self._stores)
+            self._catalog = None
+            self._cache = cache
+        for app_id, part in df_added.groupby('App_ID', observed=True):
+            if app_id in loaded:
+                loaded[app_id].apply_ingest(kind, part.reset_index(drop=True), cache)
+        self._combined.clear()
+
+    def memory_report(self):
+        with self._lock:
+            return {
+                'apps_loaded': len(self._stores),
+                'rows': sum(data_store.stats.get('rows', 0) for data_store in self._stores.values()),
+                'rss_bytes': process_rss_bytes(),
+                'combined_cache': self._combined.stats(),
+            }
+
+
+# Todas las apps juntas, solo para el acceso antiguo clean_data.df_month / clean_data.df_day (scripts y
+# notebooks); el dashboard no lo usa. No se actualiza con refresh.py: es la caché que había al leerlo.
+store = DataStore()
@@ -0,0 +1,55 @@
+import numpy as np
+
+from cube import MEASURES
+
+#-------VARIACIONES RESPECTO AL PERIODO ANTERIOR
+# Un único corte del cubo con el periodo actual y el anterior, alineados por (país, plataforma, dispositivo).
+# Desde esa tabla base se saca actual / anterior / Δ% para cualquier agrupación sin volver a filtrar.
+
+KEYS = ['Country', 'Platform', 'Device']
+
+
+def pct_delta(curr, prev):
+    # Δ% vectorizado: NaN cuando no hay periodo anterior con el que comparar
+    curr = np.asarray(curr, dtype=float)
+    prev = np.asarray(prev, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(prev != 0, (curr - prev) / prev * 100, np.nan)
+
+
+class PeriodComparison:
+
+    def __init__(self, cube, period, **filters):
+        self.period = period
+        data = cube.slice(periods=[period - 1, period], **filters).data
+        is_curr = (data['Period'] == period).to_numpy()
+
+        curr = data.loc[is_curr, KEYS + MEASURES]
+        prev = data.loc[~is_curr, KEYS + MEASURES].rename(columns={m: f'{m}_prev' for m in MEASURES})
+        base = curr.merge(prev, on=KEYS, how='outer', indicator=True)
+        # Solo mostramos claves con datos en el periodo actual; las del anterior cuentan para las sumas de comparación
+        base['in_current'] = base.pop('_merge') != 'right_only'
+        for m in MEASURES:
+            base[m] = base[m].fillna(0).astype(curr[m].dtype)
+            base[f'{m}_prev'] = base[f'{m}_prev'].fillna(0)
+        self.base = base
+
+    def by(self, keys=None):
+        # keys: columna o lista de columnas (Country, Platform, Device); None para el total
+        keys = [keys] if isinstance(keys, str) else list(keys or [])
+        value_cols = MEASURES + [f'{m}_prev' for m in MEASURES]
+        if keys:
+            table = (
+                self.base.groupby(keys, as_index=False, observed=True)
+                .agg({**{col: 'sum' for col in value_cols}, 'in_current': 'any'})
+            )
+            table = table[table.pop('in_current')].reset_index(drop=True)
+        else:
+            table = self.base[value_cols].sum().to_frame().T
+            table = table.astype({m: self.base[m].dtype for m in MEASURES})
+        for m in MEASURES:
+            table[f'{m}_delta'] = pct_delta(table[m], table[f'{m}_prev'])
+        return table
+
+    def total(self):
+        return self.by().iloc[0]
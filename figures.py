@@ -0,0 +1,346 @@
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+
+from caching import LRUCache, env_count, env_kilobytes, env_megabytes, selection_key
+from timeline import AUTO_GRANULARITY, GRANULARITY_LABELS, lttb, pick_resolution
+
+#-------FIGURAS DEL DASHBOARD
+# Construcción de las figuras de Plotly a partir de los cortes del cubo. Como el resultado solo depende
+# del estado de los filtros (y de la versión de los datos), se guardan en una LRU compartida y al volver
+# a un estado ya visto no se reconstruye nada.
+
+# El límite real es el de memoria (DASHBOARD_FIGURE_CACHE_MB); el de entradas solo acota el caso de figuras muy pequeñas
+FIGURE_CACHE_ENTRIES = 256
+FIGURE_CACHE_BYTES = env_megabytes('DASHBOARD_FIGURE_CACHE_MB', 64)
+figure_cache = LRUCache(max_entries=FIGURE_CACHE_ENTRIES, max_bytes=FIGURE_CACHE_BYTES)
+
+# Treemaps por país: se dibujan los primeros países de cada medida y el resto se suma en un nodo "Otros",
+# que se puede desglosar (saltando los países ya vistos). Por defecto se dibujan los países que hacen
+# falta para cubrir el 99% de cada medida, así "Otros" se queda por debajo del 1%; también se puede
+# fijar el número. Además cada treemap tiene un presupuesto de tamaño (JSON de la figura que se envía al
+# navegador, DASHBOARD_FIGURE_PAYLOAD_KB): si no cabe se vuelve a construir con la mitad de países.
+# La cola de países pequeños ya no llena el envío ni la escala de color.
+TOP_N_COVERAGE = 'cobertura'
+COVERAGE_SHARE = 0.99
+DEFAULT_TOP_N = TOP_N_COVERAGE
+# Opciones del selector de app.py: etiqueta -> top_n (None = todos, siempre dentro del presupuesto)
+TOP_N_OPTIONS = {"99% de cada medida + Otros": TOP_N_COVERAGE, "Top 10 + Otros": 10, "Top 20 + Otros": 20,
+                 "Top 50 + Otros": 50, "Todos": None}
+MIN_TOP_N = 5
+TREEMAP_MEASURES = ['Revenue', 'Downloads']
+FIGURE_PAYLOAD_BYTES = env_kilobytes('DASHBOARD_FIGURE_PAYLOAD_KB', 16)
+OTHER_LABEL = "Otros"
+
+# Gráficos temporales: puntos máximos por traza (DASHBOARD_CHART_POINTS). Con rangos largos las barras se
+# suman a una granularidad más gruesa y las líneas se reducen con LTTB, así que el tiempo de construcción
+# y el tamaño de la figura no crecen con el rango. Por defecto cabe un año día a día.
+CHART_MAX_POINTS = env_count('DASHBOARD_CHART_POINTS', 366)
+
+# Paleta personalizada: asignamos colores fijos por plataforma
+PLATFORM_COLORS = {
+    "App Store": "#636EFA",   # azul (color por defecto de Plotly)
+    "Google Play": "#00CC96"  # verde
+}
+
+
+def cached_figure(kind, version, build, **selection):
+    # Devuelve la figura (o grupo de figuras) del estado de filtros indicado, construyéndola si hace falta
+    return figure_cache.get_or_build(selection_key(kind, version, **selection), build)
+
+
+def overview_figures(cube_month, version, apps, countries, platforms, months):
+    # Figuras de la vista general para un estado de filtros (las usan app.py y warmup.py con la misma clave)
+    def build():
+        periods = [p for p in cube_month.periods if p.strftime('%B') in months]
+        return build_overview(cube_month.slice(countries=countries, platforms=platforms, periods=periods))
+
+    return cached_figure('overview', version, build, apps=apps, countries=countries, platforms=platforms,
+                         months=months)
+
+
+def country_treemaps(cube_month, version, apps, countries, platforms, months, top_n=DEFAULT_TOP_N, skip=None):
+    # Treemaps por país de la vista general para un estado de filtros (None si no hay datos).
+    # skip: {medida: países ya vistos al desglosar "Otros"} (los primeros de esa medida)
+    skip = treemap_skips(skip)
+
+    def build():
+        periods = [p for p in cube_month.periods if p.strftime('%B') in months]
+        return build_country_treemaps(cube_month.slice(countries=countries, platforms=platforms, periods=periods),
+                                      top_n, skip)
+
+    return cached_figure('treemaps', version, build, apps=apps, countries=countries, platforms=platforms,
+                         months=months, top_n=top_n, skip=skip)
+
+
+def daily_figure(df_day_filtered, version, apps, countries, platforms, period):
+    # Gráfico diario del mes seleccionado (period: 'AAAA-MM') para un estado de filtros
+    return cached_figure('daily', version, lambda: build_daily(df_day_filtered), apps=apps, countries=countries,
+                         platforms=platforms, period=period)
+
+
+def timeline_figure(timeline, version, apps, countries, platforms, start, end, freq):
+    # Evolución entre start y end (incluidos) con la granularidad freq (o AUTO_GRANULARITY), respondida con
+    # el índice de sumas acumuladas; ver build_timeline
+    def build():
+        return build_timeline(timeline, start, end, freq, countries, platforms)
+
+    return cached_figure('timeline', version, build, apps=apps, countries=countries, platforms=platforms,
+                         start=str(pd.Timestamp(start).date()), end=str(pd.Timestamp(end).date()), freq=freq)
+
+
+def _gauge(total, title, color):
+    return go.Figure(go.Indicator(
+        mode="gauge+number",
+        value=total,
+        title={'text': title, 'font': {'size': 20}},
+        gauge={
+            'axis': {'range': [0, max(total*1.2, 1)]},  # rango dinámico
+            'bar': {'color': color},
+            'steps': [
+                {'range': [0, total*0.5], 'color': "lightgray"},
+                {'range': [total*0.5, total], 'color': "gray"}
+            ],
+        }
+    ))
+
+
+def _platform_pie(by_platform, measure, title):
+    fig = px.pie(
+        by_platform[['Platform', measure]],
+        names="Platform",
+        values=measure,
+        title=title,
+        color="Platform",
+        color_discrete_map=PLATFORM_COLORS
+    )
+    fig.update_layout(title_x=0.22)
+    return fig
+
+
+def _monthly_combined(df_monthly_summary):
+    # Crear gráfico combinado: barras para Revenue, línea para Installs
+    fig = go.Figure()
+
+    # Barras: Revenue
+    fig.add_trace(
+        go.Bar(
+            x=df_monthly_summary['Month_Name'],
+            y=df_monthly_summary['Revenue'],
+            name='Revenue',
+            marker_color='indianred',
+            yaxis='y1'
+        )
+    )
+
+    # Línea: Installs
+    fig.add_trace(
+        go.Scatter(
+            x=df_monthly_summary['Month_Name'],
+            y=df_monthly_summary['Downloads'],
+            name='Installs',
+            mode='lines+markers',
+            line=dict(color='royalblue', width=3),
+            yaxis='y2'
+        )
+    )
+
+    # Configurar ejes y layout
+    fig.update_layout(
+        title='Revenue y Installs Mensuales',
+        xaxis=dict(title='Mes'),
+        yaxis=dict(
+            title='Revenue ($)',
+            side='left'
+        ),
+        yaxis2=dict(
+            title='Installs',
+            overlaying='y',
+            side='right'
+        ),
+        legend=dict(x=0.1, y=1.1, orientation='h'),
+        margin=dict(l=40, r=40, t=80, b=40)
+    )
+    return fig
+
+
+def treemap_skips(skip=None):
+    # Países saltados de cada medida, siempre con las mismas claves y en el mismo orden (clave de la caché)
+    skip = skip or {}
+    return {measure: int(skip.get(measure, 0)) for measure in TREEMAP_MEASURES}
+
+
+def coverage_count(values, share=COVERAGE_SHARE, minimum=MIN_TOP_N):
+    # Cuántos de los valores, de mayor a menor, hacen falta para sumar share del total (al menos minimum)
+    values = np.sort(np.asarray(values, dtype=np.float64))[::-1]
+    total = values.sum()
+    if total <= 0:
+        return len(values)
+    needed = int(np.searchsorted(np.cumsum(values), share * total)) + 1
+    return min(max(needed, minimum), len(values))
+
+
+def top_n_other(df, label, measure, top_n, skip=0, count_label='Países'):
+    # Las top_n filas de df por measure (tras saltar las skip primeras) y una fila "Otros" con la suma de
+    # las que quedan detrás. count_label: columna con cuántas filas representa cada una (1, o las de "Otros").
+    # Devuelve (filas a dibujar, número de filas en "Otros", suma de "Otros").
+    ranked = df[[label, measure]].sort_values(measure, ascending=False, ignore_index=True)
+    shown = ranked.iloc[skip:skip + top_n].astype({label: str}).assign(**{count_label: 1})
+    rest = ranked.iloc[skip + top_n:]
+    if not rest.empty:
+        other = pd.DataFrame({label: [f"{OTHER_LABEL} ({len(rest)})"], measure: [rest[measure].sum()],
+                              count_label: [len(rest)]})
+        shown = pd.concat([shown, other], ignore_index=True)
+    return shown, len(rest), rest[measure].sum()
+
+
+def payload_bytes(fig):
+    # Tamaño del JSON que se envía al navegador por la figura
+    return len(fig.to_json())
+
+
+def _within_budget(build, top_n, max_bytes=None):
+    # build(top_n) -> figura. Mientras la figura pase del presupuesto se construye con la mitad de elementos.
+    # Devuelve (figura, top_n usado, bytes)
+    max_bytes = FIGURE_PAYLOAD_BYTES if max_bytes is None else max_bytes
+    fig = build(top_n)
+    size = payload_bytes(fig)
+    while size > max_bytes and top_n > MIN_TOP_N:
+        top_n = max(top_n // 2, MIN_TOP_N)
+        fig = build(top_n)
+        size = payload_bytes(fig)
+    return fig, top_n, size
+
+
+def _country_treemap(shown, measure, title):
+    return px.treemap(
+        shown,
+        path=['Country'],
+        values=measure,
+        title=title,
+        color=measure,
+        color_continuous_scale='Rainbow',
+        hover_data=['Países']
+    )
+
+
+def build_country_treemaps(df_filtered, top_n=DEFAULT_TOP_N, skip=None):
+    # Treemaps de Revenue e Installs por país (primeros países + "Otros"). top_n: número de países,
+    # TOP_N_COVERAGE (los que cubren COVERAGE_SHARE de lo que queda tras saltar skip) o None (todos, si
+    # caben en el presupuesto). skip: {medida: países saltados}. Devuelve None si no hay datos, o las
+    # figuras y, por medida: países saltados ('skip'), dibujados ('shown') y lo que queda en "Otros".
+    if df_filtered.empty:
+        return None
+    by_country = df_filtered.rollup('Country')
+    skip = treemap_skips(skip)
+    treemaps = {'skip': skip, 'shown': {}, 'payload_bytes': 0, 'others': {}}
+    for key, measure, title in (('treemap_revenue', 'Revenue', 'Revenue por País'),
+                                ('treemap_installs', 'Downloads', 'Installs por País')):
+        remaining = by_country[measure].sort_values(ascending=False).iloc[skip[measure]:]
+        if top_n == TOP_N_COVERAGE:
+            wanted = coverage_count(remaining)
+        else:
+            wanted = top_n or len(remaining)
+        fig, n, size = _within_budget(
+            lambda n: _country_treemap(top_n_other(by_country, 'Country', measure, n, skip[measure])[0],
+                                       measure, title),
+            max(wanted, 1)
+        )
+        shown, other_count, other_total = top_n_other(by_country, 'Country', measure, n, skip[measure])
+        total = by_country[measure].sum()
+        treemaps[key] = fig
+        treemaps['shown'][measure] = len(shown) - (other_count > 0)
+        treemaps['payload_bytes'] += size
+        treemaps['others'][measure] = {'countries': other_count,
+                                       'share': float(other_total / total) if total else 0.0}
+    return treemaps
+
+
+def build_overview(df_filtered):
+    # Figuras de la VISTA GENERAL a partir del corte del cubo mensual (los treemaps van aparte: build_country_treemaps)
+    totals = df_filtered.total()
+    by_platform = df_filtered.rollup('Platform')
+    # rollup por Month_Name ya sale en orden de calendario (categórica ordenada)
+    df_monthly_summary = df_filtered.rollup('Month_Name')
+
+    figures = {
+        'gauge_revenue': _gauge(totals['Revenue'], "💰 Revenue Total", "green"),
+        'gauge_installs': _gauge(totals['Downloads'], "📥 Installs Totales", "blue"),
+        'pie_revenue': _platform_pie(by_platform, 'Revenue', "Distribución de Revenue por Plataforma"),
+        'pie_installs': _platform_pie(by_platform, 'Downloads', "Distribución de Installs por Plataforma"),
+        'combined': _monthly_combined(df_monthly_summary),
+    }
+    return figures
+
+
+def _revenue_installs(summary, title, line=None):
+    # Revenue en barras e Installs en línea (eje secundario) de un resumen con Date, Revenue y Downloads.
+    # line: serie de Installs con otra resolución que las barras (por defecto, la del resumen)
+    line = summary if line is None else line
+    fig = go.Figure()
+    # Revenue en barras
+    fig.add_trace(go.Bar(
+        x=summary['Date'],
+        y=summary['Revenue'],
+        name='Revenue',
+        marker_color='green'
+    ))
+    # Installs en línea
+    fig.add_trace(go.Scatter(
+        x=line['Date'],
+        y=line['Downloads'],
+        mode='lines+markers',
+        name='Installs',
+        yaxis='y2',
+        line=dict(color='blue')
+    ))
+
+    # Configurar eje secundario
+    fig.update_layout(
+        title=dict(text=title, font=dict(size=25)),
+        yaxis=dict(title='Revenue ($)'),
+        yaxis2=dict(title='Installs', overlaying='y', side='right'),
+        legend=dict(x=0.1, y=1.1, orientation='h')
+    )
+    return fig
+
+
+def build_daily(df_day_filtered):
+    # Gráfico diario de la VISTA DETALLADA; None si no hay datos
+    if df_day_filtered.empty:
+        return None
+
+    # Agregamos por día
+    return _revenue_installs(df_day_filtered.rollup('Date'), "Revenue e Installs diarios")
+
+
+def build_timeline(timeline, start, end, freq, countries=None, platforms=None, max_points=None):
+    # Gráfico de la pestaña EVOLUCIÓN a partir de un TimeIndex, con max_points como máximo por traza
+    # (CHART_MAX_POINTS por defecto). Las barras de Revenue son sumas: si la granularidad pedida no cabe se
+    # suman a la más fina que cabe. La línea de Installs se queda en la pedida y se reduce con LTTB.
+    # Devuelve {'figure', 'bars', 'line', 'line_points', 'line_total'} o None si no hay datos.
+    max_points = max_points or CHART_MAX_POINTS
+    requested = pick_resolution(start, end, max_points) if freq == AUTO_GRANULARITY else freq
+    bars = pick_resolution(start, end, max_points, finest=requested)
+    df_bars = timeline.query(start, end, bars, countries=countries, platforms=platforms)
+    if df_bars.empty:
+        return None
+
+    df_line = df_bars if bars == requested else timeline.query(start, end, requested, countries=countries,
+                                                               platforms=platforms)
+    line_total = len(df_line)
+    df_line = df_line.iloc[lttb(df_line['Date'], df_line['Downloads'], max_points)]
+
+    if bars == requested:
+        title = f"Revenue e Installs por {GRANULARITY_LABELS[bars].lower()}"
+    else:
+        title = (f"Revenue por {GRANULARITY_LABELS[bars].lower()} e Installs por "
+                 f"{GRANULARITY_LABELS[requested].lower()}")
+    return {
+        'figure': _revenue_installs(df_bars, title, line=df_line),
+        'bars': bars,
+        'line': requested,
+        'line_points': len(df_line),
+        'line_total': line_total,
+    }
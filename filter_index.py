@@ -0,0 +1,96 @@
+import numpy as np
+import pandas as pd
+
+#-------ÍNDICE INVERTIDO PARA LOS FILTROS
+# Para cada columna indexada guardamos, por cada valor distinto, las posiciones (ordenadas) de sus filas.
+# Un filtro se resuelve sin recorrer la columna entera:
+#   1. se toma la dimensión más selectiva y se juntan sus listas de posiciones
+#   2. las demás dimensiones solo se comprueban sobre esas posiciones candidatas
+
+
+class _Postings:
+
+    def __init__(self, series):
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            codes = series.cat.codes.to_numpy()
+            values = series.cat.categories
+        else:
+            codes, values = pd.factorize(series, sort=True)
+        self.values = pd.Index(values)
+        self.codes = codes.astype(np.int32, copy=False)
+        # Filas agrupadas por código (orden estable: dentro de cada código siguen ordenadas)
+        self.order = np.argsort(self.codes, kind='stable').astype(np.int32, copy=False)
+        self.offsets = np.searchsorted(self.codes[self.order], np.arange(len(self.values) + 1))
+
+    @property
+    def nbytes(self):
+        return int(self.values.memory_usage(deep=True) + self.codes.nbytes + self.order.nbytes + self.offsets.nbytes)
+
+    def member_of(self, requested):
+        # Tabla código -> seleccionado
+        member = np.zeros(len(self.values), dtype=bool)
+        codes = self.values.get_indexer(pd.Index(list(requested)))
+        member[codes[codes >= 0]] = True
+        return member
+
+    def member_between(self, lo, hi):
+        # Solo para columnas ordenables (fechas, periodos): valores en [lo, hi]
+        member = np.zeros(len(self.values), dtype=bool)
+        start = self.values.searchsorted(lo, side='left')
+        stop = self.values.searchsorted(hi, side='right')
+        member[start:stop] = True
+        return member
+
+    def count(self, member):
+        sizes = np.diff(self.offsets)
+        return int(sizes[member].sum())
+
+    def rows(self, member):
+        chunks = [self.order[self.offsets[code]:self.offsets[code + 1]] for code in np.flatnonzero(member)]
+        if not chunks:
+            return np.empty(0, dtype=np.int32)
+        return np.sort(np.concatenate(chunks))
+
+    def keep(self, member, rows):
+        # Filtra posiciones candidatas; el código -1 (valor nulo) nunca está seleccionado
+        member = np.concatenate([[False], member])
+        return rows[member[self.codes[rows] + 1]]
+
+
+class FilterIndex:
+
+    def __init__(self, df, columns):
+        self.n_rows = len(df)
+        self.postings = {col: _Postings(df[col]) for col in columns}
+
+    @property
+    def nbytes(self):
+        # Memoria del índice (para las cachés con presupuesto de bytes)
+        return sum(postings.nbytes for postings in self.postings.values())
+
+    def values(self, column):
+        return self.postings[column].values
+
+    def select(self, isin=None, between=None):
+        # isin: {columna: valores permitidos}; between: {columna: (desde, hasta)}
+        # Devuelve las posiciones (ordenadas) de las filas que cumplen todo, o None si no hay filtro efectivo.
+        members = {}
+        for col, requested in (isin or {}).items():
+            members[col] = self.postings[col].member_of(requested)
+        for col, (lo, hi) in (between or {}).items():
+            member = self.postings[col].member_between(lo, hi)
+            members[col] = members[col] & member if col in members else member
+
+        # Una dimensión que deja pasar todas las filas no filtra nada
+        counts = {col: self.postings[col].count(member) for col, member in members.items()}
+        members = {col: member for col, member in members.items() if counts[col] < self.n_rows}
+        if not members:
+            return None
+
+        driver = min(members, key=counts.get)
+        rows = self.postings[driver].rows(members.pop(driver))
+        for col, member in members.items():
+            if rows.size == 0:
+                break
+            rows = self.postings[col].keep(member, rows)
+        return rows
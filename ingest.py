@@ -0,0 +1,99 @@
+import argparse
+import shutil
+import time
+from pathlib import Path
+
+import pandas as pd
+
+import clean_data
+
+#-------INGESTA INCREMENTAL DE EXPORTACIONES
+# Añade a la caché solo las filas nuevas de una exportación (diaria o mensual, ZIP o TSV en UTF-16),
+# deduplicando por (app, Date, Country / Region, Platform, Device). Solo se reescriben los meses que cambian.
+# La exportación se guarda en dat/drops/ para que una reconstrucción completa dé el mismo resultado.
+#
+#   python ingest.py nueva_exportacion.zip [otra.tsv ...]
+
+
+def _already_ingested(sha):
+    return any(f'_{sha[:12]}_' in path.name for path in clean_data.drop_files())
+
+
+def _archive(path, sha):
+    clean_data.DROPS_DIR.mkdir(parents=True, exist_ok=True)
+    target = clean_data.DROPS_DIR / f"{time.strftime('%Y%m%dT%H%M%S')}_{sha[:12]}_{Path(path).name}"
+    shutil.copy2(path, target)
+    return target
+
+
+def ingest(path, store=None):
+    # Devuelve un resumen de lo que se ha añadido. Si se pasan los almacenes del proceso
+    # (refresh.current_snapshot().apps) también se actualizan en memoria df_month, el cubo mensual y las
+    # particiones diarias de las apps afectadas.
+    path = Path(path)
+    sha = clean_data.file_sha256(path)
+    if _already_ingested(sha):
+        return {'file': path.name, 'skipped': 'already ingested', 'rows_read': 0, 'rows_added': 0}
+
+    # La caché tiene que estar al día antes de aplicar el delta encima
+    clean_data.refresh_cache()
+    base = clean_data.current_cache()
+
+    df_new = clean_data.load_export(path, clean_data.read_countries())
+    kind = 'daily' if clean_data.is_daily_export(df_new) else 'monthly'
+
+    # Guardamos la exportación antes de tocar la caché: si algo falla a medias, la huella de los ficheros
+    # de origen ya no coincide y la siguiente carga reconstruye todo incluyendo esta exportación.
+    _archive(path, sha)
+
+    # La ingesta escribe una versión nueva de la caché, copia de la actual (con hard links) en la que solo se
+    # reescriben los ficheros de las apps y meses afectados. Quien lee la actual no ve nada hasta publicarla.
+    root = clean_data.fork_cache(base)
+    added = []
+    try:
+        if kind == 'daily':
+            periods = df_new['Date'].dt.to_period('M')
+            for (app_id, period), part in df_new.groupby(['App_ID', periods], observed=True):
+                existing = base.load_day_partition(period, [app_id])
+                rows = clean_data.unseen_rows(part, existing)
+                if not rows.empty:
+                    clean_data.save_day_partition(root, app_id, period, clean_data.append_rows(existing, rows))
+                    added.append(rows)
+        else:
+            for app_id, part in df_new.groupby('App_ID', observed=True):
+                existing = base.read_month([app_id])
+                rows = clean_data.unseen_rows(part, existing)
+                if not rows.empty:
+                    clean_data.save_month(root, app_id, clean_data.append_rows(existing, rows))
+                    added.append(rows)
+
+        df_added = clean_data.apply_schema(pd.concat(added, ignore_index=True)) if added else df_new.iloc[:0]
+        empty = df_new.iloc[:0]
+        clean_data.update_catalog(root, base.list_apps(),
+                                  *((empty, df_added) if kind == 'daily' else (df_added, empty)))
+    except BaseException:
+        shutil.rmtree(root, ignore_errors=True)
+        raise
+    clean_data.publish_cache(root, clean_data.source_fingerprint(base.sources))
+
+    # Solo si esos almacenes leían la versión sobre la que se ha aplicado la ingesta (si no, refresh.py
+    # publicará los datos nuevos al detectar el cambio en los ficheros de origen)
+    if store is not None and store.cache is base:
+        store.apply_ingest(kind, df_added, clean_data.current_cache())
+
+    return {
+        'file': path.name,
+        'kind': kind,
+        'rows_read': len(df_new),
+        'rows_added': len(df_added),
+        'apps': sorted(df_added['App_ID'].astype(str).unique()),
+        'months': sorted({str(p) for p in df_added['Date'].dt.to_period('M')}),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Ingesta incremental de exportaciones diarias/mensuales")
+    parser.add_argument('files', nargs='+', help="ficheros .zip o .tsv/.csv en UTF-16 separados por tabuladores")
+    args = parser.parse_args()
+    for file in args.files:
+        print(ingest(file))
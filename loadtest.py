@@ -0,0 +1,281 @@
+import argparse
+import contextlib
+import json
+import logging
+import random
+import sys
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from data_store import process_rss_bytes
+from timeline import GRANULARITY_OPTIONS
+
+#-------PRUEBA DE CARGA CON VARIAS SESIONES
+# Simula N analistas usando el dashboard a la vez en este proceso, como las sesiones de un servidor de
+# Streamlit (un hilo por sesión, mismos módulos y cachés compartidas). Cada sesión es un AppTest de
+# app.py que repite un guion de interacciones realistas (quitar/poner todos los países, elegir países,
+# cambiar plataformas, el mes de la vista detallada o la granularidad de la evolución...) y se mide lo
+# que tarda cada rerun.
+# Para cada N se informa de la latencia p50/p95/p99, reruns por segundo y memoria del proceso.
+# No necesita red ni navegador:
+#
+#   python loadtest.py --sessions 1 2 4 8 --steps 20
+#   python loadtest.py --sessions 1 4 16 --think 0.5 --output carga.json
+
+APP_FILE = Path(__file__).resolve().parent / 'app.py'
+DEFAULT_SESSIONS = [1, 2, 4, 8]
+DEFAULT_STEPS = 20
+# Segundos entre interacciones de una sesión (tiempo de "pensar" del analista)
+DEFAULT_THINK = 0.0
+RSS_SAMPLE_SECONDS = 0.05
+
+
+def _widget(elements, label):
+    return next(element for element in elements if element.label == label)
+
+
+#-------INTERACCIONES
+# Cada una recibe el AppTest de la sesión y un random.Random; deja el widget cambiado y hace run()
+
+def toggle_all_countries(at, rng):
+    checkbox = _widget(at.sidebar.checkbox, "Seleccionar todos los países")
+    checkbox.set_value(not checkbox.value).run()
+
+
+def pick_countries(at, rng):
+    multiselect = _widget(at.sidebar.multiselect, "Selecciona país(es)")
+    options = list(multiselect.options)
+    multiselect.set_value(rng.sample(options, rng.randint(1, min(10, len(options))))).run()
+
+
+def change_platforms(at, rng):
+    multiselect = _widget(at.sidebar.multiselect, "Selecciona plataforma(s)")
+    options = list(multiselect.options)
+    multiselect.set_value(rng.sample(options, rng.randint(1, len(options)))).run()
+
+
+def change_months(at, rng):
+    multiselect = _widget(at.sidebar.multiselect, "Selecciona mes(es)")
+    options = list(multiselect.options)
+    multiselect.set_value(rng.sample(options, rng.randint(1, len(options)))).run()
+
+
+def change_detail_month(at, rng):
+    selectbox = _widget(at.selectbox, "Selecciona un mes (solo uno)")
+    selectbox.select_index(rng.randrange(len(selectbox.options))).run()
+
+
+def change_granularity(at, rng):
+    # Las opciones del radio son las etiquetas; el valor es el código de la granularidad
+    _widget(at.radio, "Granularidad").set_value(rng.choice(list(GRANULARITY_OPTIONS))).run()
+
+
+def drill_other(at, rng):
+    # Desglosa "Otros" en los treemaps, o vuelve atrás si ya no queda nada que desglosar
+    buttons = [_widget(at.button, label) for label in ("⬇️ Desglosar «Otros»", "⬆️ Volver")]
+    enabled = [button for button in buttons if not button.disabled]
+    if not enabled:
+        # Pocos países seleccionados: no hay "Otros"
+        return change_detail_month(at, rng)
+    enabled[0].click().run()
+
+
+def next_grid_page(at, rng):
+    pages = [element for element in at.number_input if element.label.startswith("Página")]
+    if not pages:
+        return change_detail_month(at, rng)
+    page = rng.choice(pages)
+    # El máximo no se expone como atributo en AppTest; está en el proto del widget
+    page.set_value(page.value % int(page.proto.max) + 1).run()
+
+
+# Peso de cada interacción en el guion (lo más habitual: cambiar el mes de la vista detallada y plataformas)
+INTERACTIONS = {
+    'todos_paises': (toggle_all_countries, 2),
+    'paises': (pick_countries, 2),
+    'plataformas': (change_platforms, 3),
+    'meses': (change_months, 1),
+    'mes_detalle': (change_detail_month, 4),
+    'pagina_grid': (next_grid_page, 1),
+    'granularidad': (change_granularity, 2),
+    'otros': (drill_other, 1),
+}
+
+
+@contextlib.contextmanager
+def share_test_runtime():
+    # AppTest está pensado para una sesión por proceso: cada run() instala un Runtime simulado global y
+    # lo borra al terminar, y el de una sesión que acaba rompe el rerun de las demás. Mientras dura la
+    # prueba, si no hay Runtime se devuelve el último que se instaló.
+    # Lo mismo con la configuración: cada run() la parchea y la restaura, así que se deja fijada para
+    # toda la prueba. Además cada AppTest compila app.py por su cuenta (un servidor real lo compila una
+    # vez) y compilar a la vez desde varios hilos no es seguro en CPython 3.11: se compila de uno en uno.
+    # Al salir del with se restaura todo lo parcheado.
+    from streamlit import config
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+    from streamlit.testing.v1 import app_test
+    from streamlit.testing.v1.util import build_mock_config_get_option
+    last = {}
+
+    def instance(cls):
+        runtime = cls._instance or last.get('runtime')
+        if runtime is None:
+            raise RuntimeError("Runtime hasn't been created!")
+        last['runtime'] = runtime
+        return runtime
+
+    compile_lock = threading.Lock()
+    get_bytecode = ScriptCache.get_bytecode
+
+    def locked_get_bytecode(self, script_path):
+        with compile_lock:
+            return get_bytecode(self, script_path)
+
+    patches = [
+        (Runtime, 'instance', classmethod(instance)),
+        (Runtime, 'exists', classmethod(lambda cls: (cls._instance or last.get('runtime')) is not None)),
+        (config, 'get_option', build_mock_config_get_option({'global.appTest': True})),
+        (app_test, 'patch_config_options', lambda overrides: contextlib.nullcontext()),
+        (ScriptCache, 'get_bytecode', locked_get_bytecode),
+    ]
+    # Los originales se guardan tal cual están en cada objeto (los de las clases, sin desenvolver)
+    originals = [(target, name, vars(target)[name]) for target, name, _ in patches]
+    for target, name, value in patches:
+        setattr(target, name, value)
+    try:
+        yield
+    finally:
+        for target, name, value in originals:
+            setattr(target, name, value)
+
+
+def session_script(rng, steps):
+    names = list(INTERACTIONS)
+    weights = [INTERACTIONS[name][1] for name in names]
+    return rng.choices(names, weights=weights, k=steps)
+
+
+def run_session(session, steps, think, seed, records, start_barrier):
+    # Una sesión: carga inicial + guion; cada rerun se guarda en records
+    from streamlit.testing.v1 import AppTest
+
+    rng = random.Random(seed * 1000 + session)
+    script = session_script(rng, steps)
+    start_barrier.wait()
+
+    def timed(step, action):
+        start = time.perf_counter()
+        error = None
+        try:
+            action()
+        except Exception as exc:  # una interacción fallida no para la prueba; se cuenta
+            error = f'{type(exc).__name__}: {exc}'
+        seconds = time.perf_counter() - start
+        if error is None and len(at.exception):
+            error = at.exception[0].message
+        records.append({'session': session, 'step': step, 'seconds': seconds, 'finished': time.perf_counter(),
+                        'error': error})
+
+    at = AppTest.from_file(str(APP_FILE), default_timeout=600)
+    timed('inicio', at.run)
+    for step in script:
+        if think:
+            time.sleep(rng.uniform(0.5, 1.5) * think)
+        timed(step, lambda: INTERACTIONS[step][0](at, rng))
+
+
+def run_level(sessions, steps, think, seed):
+    # N sesiones a la vez; devuelve los reruns y la memoria del proceso (inicial y pico) durante la prueba
+    records = []
+    barrier = threading.Barrier(sessions + 1)
+    threads = [threading.Thread(target=run_session, args=(i, steps, think, seed, records, barrier), daemon=True)
+               for i in range(sessions)]
+    for thread in threads:
+        thread.start()
+
+    rss = {'start': process_rss_bytes(), 'peak': 0}
+    done = threading.Event()
+
+    def sample_rss():
+        while not done.is_set():
+            rss['peak'] = max(rss['peak'], process_rss_bytes())
+            done.wait(RSS_SAMPLE_SECONDS)
+
+    sampler = threading.Thread(target=sample_rss, daemon=True)
+    sampler.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+    done.set()
+    sampler.join()
+    rss['end'] = process_rss_bytes()
+    return records, wall, rss
+
+
+def summarize(sessions, records, wall, rss):
+    seconds = np.array([r['seconds'] for r in records])
+    return {
+        'sessions': sessions,
+        'reruns': len(records),
+        'errors': sum(r['error'] is not None for r in records),
+        'p50_ms': float(np.percentile(seconds, 50) * 1000),
+        'p95_ms': float(np.percentile(seconds, 95) * 1000),
+        'p99_ms': float(np.percentile(seconds, 99) * 1000),
+        'max_ms': float(seconds.max() * 1000),
+        'reruns_per_second': len(records) / wall,
+        'wall_seconds': wall,
+        'rss_start_mb': rss['start'] / 1e6,
+        'rss_peak_mb': rss['peak'] / 1e6,
+        'rss_end_mb': rss['end'] / 1e6,
+    }
+
+
+def run(levels=DEFAULT_SESSIONS, steps=DEFAULT_STEPS, think=DEFAULT_THINK, seed=0, warm=True, log=print):
+    # Devuelve {'summary': [una fila por N], 'reruns': [cada rerun], 'meta': {...}}
+    if warm:
+        # Sin esto la primera sesión de la primera N paga la carga y el resto de niveles no
+        from warmup import warm_up
+        log("precalentando cachés")
+        warm_up(variants=False, log=lambda msg: None)
+    summary, reruns = [], []
+    with share_test_runtime():
+        for sessions in levels:
+            log(f"[{sessions} sesiones] {steps} interacciones por sesión")
+            records, wall, rss = run_level(sessions, steps, think, seed)
+            row = summarize(sessions, records, wall, rss)
+            log(f"[{sessions} sesiones] p50 {row['p50_ms']:.0f} ms · p95 {row['p95_ms']:.0f} ms · "
+                f"p99 {row['p99_ms']:.0f} ms · {row['reruns_per_second']:.1f} reruns/s · "
+                f"pico {row['rss_peak_mb']:.0f} MB · {row['errors']} errores")
+            summary.append(row)
+            reruns.extend({'level': sessions, **r} for r in records)
+    meta = {'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'), 'steps': steps, 'think': think, 'seed': seed,
+            'warm': warm}
+    return {'meta': meta, 'summary': summary, 'reruns': reruns}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Prueba de carga de app.py con varias sesiones simultáneas")
+    parser.add_argument('--sessions', type=int, nargs='+', default=DEFAULT_SESSIONS,
+                        help="números de sesiones simultáneas a probar")
+    parser.add_argument('--steps', type=int, default=DEFAULT_STEPS, help="interacciones por sesión")
+    parser.add_argument('--think', type=float, default=DEFAULT_THINK,
+                        help="segundos medios entre interacciones de una sesión")
+    parser.add_argument('--seed', type=int, default=0, help="semilla de los guiones")
+    parser.add_argument('--cold', action='store_true', help="no precalentar las cachés antes de medir")
+    parser.add_argument('--output', help="fichero JSON con el resumen y cada rerun")
+    args = parser.parse_args()
+
+    # Los avisos de Streamlit se repetirían en cada rerun de cada sesión
+    logging.getLogger('streamlit').setLevel(logging.ERROR)
+    report = run(args.sessions, args.steps, args.think, args.seed, warm=not args.cold,
+                 log=lambda msg: print(msg, file=sys.stderr))
+    print(pd.DataFrame(report['summary']).to_string(index=False, float_format='{:.1f}'.format))
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2), encoding='utf-8')
@@ -0,0 +1,81 @@
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+import clean_data
+from cube import Cube
+from timeline import TimeIndex
+
+#-------PARTICIONES MENSUALES DE LOS DATOS DIARIOS
+# La vista detallada solo enseña un mes de datos diarios, así que no cargamos el histórico entero:
+# cada mes se lee de su fichero cuando se pide y se guarda (ya convertido en cubo diario indexado)
+# en una LRU con los últimos meses usados. La memoria no crece con los años de histórico.
+# Para consultas por rango de fechas se guarda además el índice de sumas acumuladas de todo el
+# histórico (timeline.TimeIndex), construido mes a mes la primera vez que se pide.
+
+DEFAULT_MAX_MONTHS = 6
+
+
+class DailyPartitions:
+
+    def __init__(self, app_ids=None, max_months=DEFAULT_MAX_MONTHS, cache=None):
+        # app_ids: apps cuyos datos diarios se leen (None = todas)
+        # cache: versión de la caché de la que se leen (clean_data.CacheVersion; por defecto la actual)
+        self.app_ids = app_ids
+        self.max_months = max_months
+        self.cache = cache or clean_data.current_cache()
+        self.periods = self.cache.day_partitions(app_ids)
+        self._cubes = OrderedDict()
+        self._timeline = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def cube(self, period):
+        # Cubo diario del mes indicado (pd.Period mensual)
+        with self._lock:
+            if period in self._cubes:
+                self._cubes.move_to_end(period)
+                self.hits += 1
+                return self._cubes[period]
+        # Leemos fuera del lock: otras sesiones pueden seguir usando meses ya cargados
+        cube = Cube.from_frame(self.cache.load_day_partition(period, self.app_ids), 'D')
+        with self._lock:
+            self.misses += 1
+            self._cubes[period] = cube
+            self._cubes.move_to_end(period)
+            while len(self._cubes) > self.max_months:
+                self._cubes.popitem(last=False)
+        return cube
+
+    def timeline(self):
+        # Índice de sumas acumuladas por (país, plataforma) de todos los meses. Cada partición se reduce
+        # a (día, país, plataforma) al leerla, así que nunca está el histórico diario entero en memoria.
+        timeline = self._timeline
+        if timeline is None:
+            parts = [TimeIndex.daily_totals(self.cache.load_day_partition(period, self.app_ids))
+                     for period in self.periods]
+            timeline = TimeIndex.from_frame(pd.concat(parts, ignore_index=True)) if parts else TimeIndex.empty()
+            with self._lock:
+                self._timeline = timeline
+        return timeline
+
+    def refresh(self, periods, cache):
+        # Tras una ingesta: olvidamos los meses que han cambiado y añadimos los meses nuevos, que se leen
+        # de la versión de la caché que ya los incluye
+        with self._lock:
+            self.cache = cache
+            for period in periods:
+                self._cubes.pop(period, None)
+            self._timeline = None
+            self.periods = sorted(set(self.periods) | set(periods))
+
+    def stats(self):
+        with self._lock:
+            return {
+                'cached_months': [str(period) for period in self._cubes],
+                'bytes': sum(int(c.data.memory_usage(deep=True).sum()) for c in self._cubes.values()),
+                'hits': self.hits,
+                'misses': self.misses,
+            }
@@ -0,0 +1,133 @@
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+import pandas as pd
+
+from data_store import process_rss_bytes
+
+#-------PERFIL DE CADA RERUN
+# Mide las secciones de app.py (tiempo, filas de entrada/salida y variación de memoria del proceso).
+# Se activa con la variable de entorno DASHBOARD_PROFILE=1 o con ?profile=1 en la URL. Los resultados
+# se ven en un panel plegable de la barra lateral y se añaden como líneas JSON a PROFILE_LOG:
+#
+#   DASHBOARD_PROFILE=1 streamlit run app.py
+#   pd.read_json('logs/profile.jsonl', lines=True).groupby('section')['seconds'].describe()
+
+PROFILE_ENV = 'DASHBOARD_PROFILE'
+PROFILE_PARAM = 'profile'
+PROFILE_LOG = Path(os.environ.get('DASHBOARD_PROFILE_LOG') or Path(__file__).resolve().parent / 'logs' / 'profile.jsonl')
+
+# Varias sesiones escriben en el mismo fichero
+_log_lock = threading.Lock()
+
+
+def _is_on(value):
+    return str(value).strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+class Profiler:
+
+    def __init__(self, enabled, session=None, rerun=0, scope='app'):
+        self.enabled = enabled
+        self.session = session
+        self.rerun = rerun
+        # 'app' en un rerun completo; el nombre del fragmento cuando Streamlit solo vuelve a ejecutar ese fragmento
+        self.scope = scope
+        self.closed = False
+        self.records = []
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+
+    @contextmanager
+    def section(self, name, rows_in=None):
+        # Dentro del bloque se puede indicar el tamaño de la salida: span['rows_out'] = len(resultado)
+        span = {'rows_in': rows_in, 'rows_out': None}
+        if not self.enabled:
+            yield span
+            return
+        rss_before = process_rss_bytes()
+        start = time.perf_counter()
+        try:
+            yield span
+        finally:
+            self.records.append({
+                'section': name,
+                'seconds': time.perf_counter() - start,
+                'rows_in': span['rows_in'],
+                'rows_out': span['rows_out'],
+                'rss_delta_bytes': process_rss_bytes() - rss_before,
+            })
+
+    def add(self, name, seconds, rows_in=None, rows_out=None, rss_delta_bytes=None):
+        # Registro medido por otro código (p. ej. las estadísticas de carga de data_store)
+        if self.enabled:
+            self.records.append({'section': name, 'seconds': seconds, 'rows_in': rows_in,
+                                 'rows_out': rows_out, 'rss_delta_bytes': rss_delta_bytes})
+
+    def table(self):
+        return pd.DataFrame(self.records, columns=['section', 'seconds', 'rows_in', 'rows_out', 'rss_delta_bytes'])
+
+    def render(self, container, extra=None):
+        # Panel plegable con las secciones del rerun actual; extra: {etiqueta: valor} que se añade debajo
+        if not self.enabled:
+            return
+        table = self.table()
+        # Tiempo total del rerun hasta aquí (los desgloses de una sección no se suman dos veces)
+        elapsed = time.perf_counter() - self._start
+        panel = container.expander(f"⏱️ Perfil del rerun ({elapsed * 1000:,.0f} ms)")
+        panel.dataframe(
+            table.assign(seconds=table['seconds'] * 1000, rss_delta_bytes=table['rss_delta_bytes'] / 1e6)
+            .rename(columns={'seconds': 'ms', 'rss_delta_bytes': 'Δ RSS (MB)'}),
+            hide_index=True,
+            use_container_width=True
+        )
+        for label, value in (extra or {}).items():
+            panel.caption(f"{label}: {value}")
+
+    def flush(self, path=PROFILE_LOG):
+        # Una línea JSON por sección, con la sesión, el número de rerun y el ámbito para poder agruparlas después
+        self.closed = True
+        if not self.enabled or not self.records:
+            return
+        timestamp = time.strftime('%Y-%m-%dT%H:%M:%S')
+        lines = [json.dumps({'timestamp': timestamp, 'session': self.session, 'rerun': self.rerun,
+                             'scope': self.scope, **record})
+                 for record in self.records]
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with _log_lock, open(path, 'a', encoding='utf-8') as f:
+                f.write('\n'.join(lines) + '\n')
+        except OSError:
+            pass
+
+
+def rerun_profiler(st, scope='app'):
+    # Profiler del rerun actual: activo si lo pide el entorno o la URL; cuenta los reruns de la sesión
+    enabled = _is_on(os.environ.get(PROFILE_ENV, '')) or _is_on(st.query_params.get(PROFILE_PARAM, ''))
+    if not enabled:
+        return Profiler(False, scope=scope)
+    state = st.session_state
+    if '_profile_session' not in state:
+        state['_profile_session'] = uuid.uuid4().hex[:12]
+        state['_profile_rerun'] = 0
+    state['_profile_rerun'] += 1
+    return Profiler(True, state['_profile_session'], state['_profile_rerun'], scope)
+
+
+@contextmanager
+def fragment_profiler(st, profiler, name):
+    # Profiler para el cuerpo de un fragmento (st.fragment). En un rerun completo es el del script.
+    # Si Streamlit solo vuelve a ejecutar el fragmento, el del script ya se cerró en el rerun anterior:
+    # se abre uno propio que se muestra al final del fragmento (no puede escribir en la barra lateral).
+    if not profiler.closed:
+        yield profiler
+        return
+    own = rerun_profiler(st, scope=name)
+    yield own
+    own.render(st)
+    own.flush()
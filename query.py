@@ -0,0 +1,414 @@
+import argparse
+import os
+import sys
+import threading
+
+import pandas as pd
+
+import clean_data
+from clean_data import SCHEMA
+from cube import DIMENSIONS, MEASURES
+from deltas import PeriodComparison
+from timeline import KEYS, TimeIndex, default_range
+
+#-------BACKENDS DE CONSULTA
+# El dashboard hace siempre las mismas consultas: cortar por país/plataforma/periodo y agregar.
+# Un backend da el catálogo de apps y, para una selección de apps, el cubo mensual y el cubo diario
+# de un mes con la interfaz de cube.Cube (periods, slice, total, rollup, data, empty), y el índice de
+# sumas acumuladas del histórico diario (timeline.TimeIndex), así app.py, figures.py, tables.py y
+# deltas.py no saben quién responde:
+#   - pandas: los cubos en memoria de data_store.apps (implementación de referencia)
+#   - duckdb: SQL directamente sobre los Parquet de la caché, sin cargarlos en memoria. Los filtros
+#     de país/plataforma/fecha se empujan a la lectura del Parquet y la agregación usa varios hilos.
+#     Es opcional (pip install duckdb); si no está instalado se usa pandas.
+#
+#   DASHBOARD_BACKEND=duckdb streamlit run app.py
+#   python query.py --parity      # compara las respuestas de los dos backends
+
+BACKEND_ENV = 'DASHBOARD_BACKEND'
+DEFAULT_BACKEND = 'pandas'
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+
+class PandasBackend:
+    name = 'pandas'
+
+    def __init__(self, apps=None):
+        if apps is None:
+            from data_store import AppStores
+            apps = AppStores()
+        self.apps = apps
+
+    @property
+    def cache(self):
+        return self.apps.cache
+
+    def catalog(self):
+        return self.apps.catalog()
+
+    def version(self, app_ids):
+        return self.apps.version(app_ids)
+
+    def month_cube(self, app_ids):
+        return self.apps.month_cube(app_ids)
+
+    def daily_cube(self, app_ids, period):
+        return self.apps.daily_cube(app_ids, period)
+
+    def timeline(self, app_ids):
+        return self.apps.timeline(app_ids)
+
+
+#-------DUCKDB
+
+# Como el cubo de pandas (groupby descarta las claves vacías), las filas sin país/plataforma/dispositivo no cuentan
+BASE_WHERE = ['"Country" IS NOT NULL', '"Platform" IS NOT NULL', '"Device" IS NOT NULL']
+
+
+def _sql_path(path):
+    return "'" + str(path).replace("'", "''") + "'"
+
+
+def _sql_paths(paths):
+    return '[' + ', '.join(_sql_path(path) for path in paths) + ']'
+
+
+class SqlCube:
+    # Cubo "perezoso" sobre una relación SQL: slice() solo añade condiciones al WHERE
+    # y cada total()/rollup() es una consulta agregada sobre los ficheros
+
+    def __init__(self, backend, source, freq, where=(), params=()):
+        self.backend = backend
+        self.source = source
+        self.freq = freq
+        self.where = list(where)
+        self.params = list(params)
+        self._data = None
+        self._len = None
+
+    # Expresión SQL de cada dimensión/atributo del cubo
+    def _expr(self, col):
+        period = "date_trunc('month', Date)" if self.freq == 'M' else 'CAST(Date AS DATE)'
+        return {
+            'Period': period,
+            'Date': f'CAST({period} AS TIMESTAMP)',
+            'Month_Name': 'monthname(Date)',
+        }.get(col, f'"{col}"')
+
+    @property
+    def nbytes(self):
+        # Solo ocupa memoria el resultado ya leído (data); la relación se queda en los Parquet
+        return int(self._data.memory_usage(deep=True).sum()) if self._data is not None else 0
+
+    def _where_sql(self):
+        return ' AND '.join(self.where) if self.where else 'TRUE'
+
+    def _query(self, select, group_by=None):
+        sql = f'SELECT {select} FROM {self.source} WHERE {self._where_sql()}'
+        if group_by:
+            sql += f' GROUP BY {group_by}'
+        return self.backend.execute(sql, self.params)
+
+    def _measures_sql(self):
+        return 'SUM(Revenue) AS Revenue, CAST(SUM(Downloads) AS BIGINT) AS Downloads'
+
+    def _typed(self, df):
+        # Mismos tipos que devuelve el cubo de pandas
+        for col in df.columns:
+            if col == 'Period':
+                df[col] = pd.to_datetime(df[col]).dt.to_period(self.freq)
+            elif col == 'Date':
+                df[col] = pd.to_datetime(df[col])
+            elif col in SCHEMA and col not in MEASURES:
+                df[col] = df[col].astype(SCHEMA[col])
+        if 'Downloads' in df.columns:
+            df['Downloads'] = df['Downloads'].fillna(0).astype('int64')
+        return df
+
+    def slice(self, countries=None, platforms=None, periods=None, devices=None, span=None):
+        where, params = list(self.where), list(self.params)
+        for col, values in (('Country', countries), ('Platform', platforms), ('Device', devices)):
+            if values is None:
+                continue
+            values = list(values)
+            where.append(f'"{col}" IN ({", ".join("?" * len(values))})' if values else 'FALSE')
+            params.extend(str(v) for v in values)
+        if periods is not None:
+            periods = list(periods)
+            if not periods:
+                where.append('FALSE')
+            else:
+                # Rango de fechas (se empuja al Parquet) + lista exacta de periodos
+                where.append('Date >= ? AND Date < ?')
+                params.extend([min(periods).start_time.to_pydatetime(), (max(periods) + 1).start_time.to_pydatetime()])
+                where.append(f"{self._expr('Period')} IN ({', '.join('?' * len(periods))})")
+                params.extend(p.start_time.date() for p in periods)
+        if span is not None:
+            where.append('Date >= ? AND Date < ?')
+            params.extend([span.start_time.to_pydatetime(), (span + 1).start_time.to_pydatetime()])
+        return SqlCube(self.backend, self.source, self.freq, where, params)
+
+    @property
+    def data(self):
+        # Celdas del cubo (periodo, país, plataforma, dispositivo) que quedan tras el corte
+        if self._data is None:
+            self._data = self.rollup(DIMENSIONS)
+        return self._data
+
+    def __len__(self):
+        if self._len is None:
+            dims = ', '.join(self._expr(col) for col in DIMENSIONS)
+            self._len = int(self.backend.execute(
+                f'SELECT COUNT(*) FROM (SELECT 1 FROM {self.source} WHERE {self._where_sql()} GROUP BY {dims})',
+                self.params).iloc[0, 0])
+        return self._len
+
+    @property
+    def empty(self):
+        if self._data is not None:
+            return self._data.empty
+        return self.backend.execute(
+            f'SELECT 1 FROM {self.source} WHERE {self._where_sql()} LIMIT 1', self.params).empty
+
+    @property
+    def periods(self):
+        df = self._query(f"DISTINCT {self._expr('Period')} AS Period")
+        return sorted(pd.to_datetime(df['Period']).dt.to_period(self.freq))
+
+    def total(self):
+        row = self._query(self._measures_sql()).iloc[0]
+        return {
+            'Revenue': float(row['Revenue']) if pd.notna(row['Revenue']) else 0.0,
+            'Downloads': int(row['Downloads']) if pd.notna(row['Downloads']) else 0,
+        }
+
+    def rollup(self, by):
+        by = [by] if isinstance(by, str) else list(by)
+        select = ', '.join(f'{self._expr(col)} AS "{col}"' for col in by)
+        group_by = ', '.join(str(i + 1) for i in range(len(by)))
+        df = self._typed(self._query(f'{select}, {self._measures_sql()}', group_by))
+        return df.sort_values(by, ignore_index=True)
+
+
+class DuckDBBackend:
+    name = 'duckdb'
+
+    def __init__(self, cache=None):
+        # cache: versión de la caché que se consulta (clean_data.CacheVersion; la actual la primera vez que se usa)
+        if duckdb is None:
+            raise ImportError("el backend duckdb necesita 'pip install duckdb'")
+        self._cache = cache
+        self._con = duckdb.connect()
+        self._lock = threading.Lock()
+        self._months = {}
+        self._timelines = {}
+
+    @property
+    def cache(self):
+        # Como los almacenes de pandas, el backend no cambia de versión: refresh.py crea otro para la nueva
+        cache = self._cache
+        if cache is None:
+            with self._lock:
+                if self._cache is None:
+                    self._cache = clean_data.current_cache()
+                cache = self._cache
+        return cache
+
+    def catalog(self):
+        return self.cache.list_apps()
+
+    def version(self, app_ids=None):
+        # Los ficheros de una versión de la caché no cambian nunca
+        return self.cache.id
+
+    def execute(self, sql, params=()):
+        # Un cursor por consulta: cada sesión de Streamlit corre en su hilo
+        with self._lock:
+            cursor = self._con.cursor()
+        try:
+            return cursor.execute(sql, params).df()
+        finally:
+            cursor.close()
+
+    def _source(self, name, paths, frame, app_ids):
+        # Si la caché no se pudo escribir (disco de solo lectura) consultamos los dataframes en memoria
+        if frame is not None:
+            with self._lock:
+                # Se copian a una tabla: lo registrado con register() solo lo ve esta conexión, no los cursores
+                # con los que se consulta (execute). La versión de la caché no cambia, así que basta una vez.
+                if not self._con.execute('SELECT 1 FROM duckdb_tables() WHERE table_name = ?', [name]).fetchall():
+                    self._con.register('frame', frame)
+                    self._con.execute(f'CREATE TABLE {name} AS SELECT * FROM frame')
+                    self._con.unregister('frame')
+            return name, ['"App_ID" IN (' + ', '.join('?' * len(app_ids)) + ')'], list(app_ids)
+        # Las apps pueden tener columnas categóricas con categorías distintas: se unen por nombre
+        return f'read_parquet({_sql_paths(paths)}, union_by_name = true)', [], []
+
+    def _empty(self, freq):
+        # Selección sin ficheros: un corte vacío de cualquier Parquet de la caché
+        path = next(self.cache.path.glob('*/daily/*.parquet'), None) or next(self.cache.path.glob('*/*.parquet'))
+        return SqlCube(self, f'read_parquet({_sql_path(path)})', freq, ['FALSE'])
+
+    def month_cube(self, app_ids):
+        app_ids = tuple(sorted(app_ids))
+        cube = self._months.get(app_ids)
+        if cube is None:
+            cache = self.cache
+            uncached = cache.frames[0] if cache.frames is not None else None
+            paths = [path for path in map(cache.month_path, app_ids) if path.exists()] if uncached is None else []
+            if uncached is None and not paths:
+                return self._empty('M')
+            source, where, params = self._source('df_month', paths, uncached, app_ids)
+            cube = self._months[app_ids] = SqlCube(self, source, 'M', BASE_WHERE + where, params)
+        return cube
+
+    def daily_cube(self, app_ids, period):
+        cache = self.cache
+        uncached = cache.frames[1] if cache.frames is not None else None
+        paths = [path for path in (cache.partition_path(a, period) for a in app_ids) if path.exists()] \
+            if uncached is None else []
+        if uncached is None and not paths:
+            # Mes sin datos diarios
+            return self._empty('D')
+        source, where, params = self._source('df_day', paths, uncached, app_ids)
+        cube = SqlCube(self, source, 'D', BASE_WHERE + where, params)
+        return cube.slice(span=period) if uncached is not None else cube
+
+    def timeline(self, app_ids):
+        # Una consulta agrupada por (día, país, plataforma) sobre todas las particiones diarias; las
+        # consultas por rango y granularidad se responden después con el índice, sin volver a los Parquet
+        app_ids = tuple(sorted(app_ids))
+        timeline = self._timelines.get(app_ids)
+        if timeline is None:
+            cache = self.cache
+            uncached = cache.frames[1] if cache.frames is not None else None
+            paths = [cache.partition_path(app_id, period) for app_id in app_ids
+                     for period in cache.day_partitions([app_id])] if uncached is None else []
+            if uncached is None and not paths:
+                timeline = TimeIndex.empty()
+            else:
+                source, where, params = self._source('df_day', paths, uncached, app_ids)
+                timeline = TimeIndex.from_frame(SqlCube(self, source, 'D', BASE_WHERE + where, params)
+                                                .rollup(['Date', *KEYS]))
+            self._timelines[app_ids] = timeline
+        return timeline
+
+
+BACKENDS = {'pandas': PandasBackend, 'duckdb': DuckDBBackend}
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def get_backend(name=None):
+    # Backend compartido por el proceso; el nombre sale de DASHBOARD_BACKEND si no se indica
+    name = (name or os.environ.get(BACKEND_ENV) or DEFAULT_BACKEND).lower()
+    if name not in BACKENDS:
+        raise ValueError(f"backend desconocido: {name!r} (opciones: {', '.join(BACKENDS)})")
+    if name == 'duckdb' and duckdb is None:
+        name = DEFAULT_BACKEND
+    with _backends_lock:
+        if name not in _backends:
+            _backends[name] = BACKENDS[name]()
+        return _backends[name]
+
+
+def set_backend(backend):
+    # Sustituye el backend compartido de su tipo (refresh.py, al publicar una instantánea con otro backend)
+    with _backends_lock:
+        _backends[backend.name] = backend
+
+
+#-------PARIDAD ENTRE BACKENDS
+
+def dashboard_queries(backend, apps, countries=None, platforms=None, months=None, period=None):
+    # Las consultas que hace app.py para una selección de apps y un estado de filtros, con los resultados en dataframes
+    cube_month = backend.month_cube(apps)
+    periods = cube_month.periods
+    period = period or next((p for p in periods if p.month == 12), periods[0])
+    selected = [p for p in periods if months is None or p.strftime('%B') in months]
+    overview = cube_month.slice(countries=countries, platforms=platforms, periods=selected)
+    comparison = PeriodComparison(cube_month, period, countries=countries, platforms=platforms)
+    day = backend.daily_cube(apps, period).slice(countries=countries, platforms=platforms)
+    timeline = backend.timeline(apps)
+    last_90_days = default_range(timeline)
+    return {
+        'periods': pd.DataFrame({'Period': periods}),
+        'overview.total': pd.DataFrame([overview.total()]),
+        'overview.platform': overview.rollup('Platform'),
+        'overview.month': overview.rollup('Month_Name'),
+        'overview.country': overview.rollup('Country'),
+        'comparison.total': comparison.by(),
+        'comparison.platform': comparison.by('Platform'),
+        'comparison.country': comparison.by('Country').sort_values('Country', ignore_index=True),
+        'daily.date': day.rollup('Date'),
+        'daily.date_platform': day.rollup(['Date', 'Platform']),
+        'timeline.week': timeline.query(*last_90_days, 'W', countries=countries, platforms=platforms),
+        'timeline.quarter_platform': timeline.query(freq='Q', countries=countries, platforms=platforms,
+                                                    by='Platform'),
+    }
+
+
+def _comparable(df):
+    # Las categóricas de cada backend tienen categorías distintas: comparamos los valores
+    df = df.reset_index(drop=True)
+    for col in df.columns:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype(str)
+        elif pd.api.types.is_numeric_dtype(df[col]) and not pd.api.types.is_bool_dtype(df[col]):
+            df[col] = df[col].astype('float64')
+    return df
+
+
+def check_parity(reference='pandas', candidate='duckdb', scenarios=None, apps=None, rtol=1e-9):
+    # Ejecuta las consultas del dashboard en los dos backends y devuelve las diferencias encontradas
+    # (lista vacía = mismos resultados). Las sumas en coma flotante pueden diferir en el orden de suma.
+    # apps: selección de apps (por defecto la de más revenue, como el dashboard)
+    # Se ejecuta en un proceso aparte (python query.py --parity): primero, la caché al día
+    clean_data.refresh_cache()
+    ref, cand = get_backend(reference), get_backend(candidate)
+    if ref.name == cand.name:
+        raise RuntimeError(f"el backend {candidate!r} no está disponible")
+    if apps is None:
+        apps = list(ref.catalog()['App_ID'][:1])
+    if scenarios is None:
+        cube = ref.month_cube(apps)
+        periods = cube.periods
+        countries = sorted(cube.data['Country'].dropna().unique())
+        scenarios = {
+            'todo': {},
+            'app_store': {'platforms': ['App Store']},
+            'paises': {'countries': countries[:5]},
+            'sin_paises': {'countries': []},
+            'meses': {'months': ['January', 'June', 'December']},
+            'primer_mes': {'period': periods[0]},
+        }
+    problems = []
+    for scenario, filters in scenarios.items():
+        expected = dashboard_queries(ref, apps, **filters)
+        actual = dashboard_queries(cand, apps, **filters)
+        for name, df in expected.items():
+            try:
+                pd.testing.assert_frame_equal(_comparable(df), _comparable(actual[name]),
+                                              check_dtype=False, rtol=rtol)
+            except AssertionError as error:
+                problems.append(f"{scenario} / {name}: {str(error).splitlines()[0]}")
+    return problems
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Backends de consulta del dashboard")
+    parser.add_argument('--parity', action='store_true', help="compara pandas y duckdb con las consultas del dashboard")
+    parser.add_argument('--candidate', default='duckdb', choices=list(BACKENDS))
+    parser.add_argument('--apps', nargs='+', metavar='APP_ID', help="apps a comparar (por defecto la de más revenue)")
+    args = parser.parse_args()
+    if args.parity:
+        problems = check_parity(candidate=args.candidate, apps=args.apps)
+        for problem in problems:
+            print(problem)
+        print("paridad OK" if not problems else f"{len(problems)} diferencias")
+        sys.exit(1 if problems else 0)
+    parser.print_help()
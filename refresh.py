@@ -0,0 +1,185 @@
+import argparse
+import itertools
+import sys
+import threading
+import time
+
+import clean_data
+from caching import env_count
+from data_store import AppStores
+from query import BACKENDS, PandasBackend, get_backend, set_backend
+from warmup import DEFAULT_TOP_APPS, warm_state
+
+#-------ACTUALIZACIÓN DE DATOS EN SEGUNDO PLANO
+# El dashboard sirve una instantánea de los datos: el backend de consultas con sus almacenes por app
+# (df_month, cubos, particiones diarias, índices temporales y cubos combinados). Para cargar datos nuevos
+# de dat/ no hace falta reiniciar el proceso: en un hilo aparte se reconstruye la caché de Parquet, se crea
+# una instantánea nueva y se precalienta (las apps que había en memoria, con su estado por defecto en las
+# cachés de figuras y tablas). Solo entonces se publica, cambiando una referencia: los reruns que ya habían
+# empezado terminan con la anterior y los siguientes usan la nueva, sin pagar ninguna carga en frío.
+# Cada instantánea tiene un id (1, 2, ...) y la hora a la que se publicó.
+#
+# Cada instantánea guarda la huella de los ficheros de origen (con las exportaciones de drops/) con la que
+# se construyó. Un hilo la compara con los ficheros cada DASHBOARD_REFRESH_SECONDS segundos (60 por
+# defecto, 0 lo desactiva) y actualiza si han cambiado, también tras una ingesta hecha desde otro proceso
+# (ingest.py deja la caché al día, pero no los datos en memoria). Desde código: refresh_async().
+# Los reruns nunca comprueban ni reconstruyen la caché: solo leen la de la instantánea publicada.
+# Cada instantánea está ligada a su versión de la caché (clean_data.CacheVersion, un directorio apps.<n>
+# que no cambia): lo que aún no había leído (meses diarios, apps sin cargar, y todo con duckdb, que consulta
+# los Parquet directamente) lo lee de esa versión, no de la nueva. Mientras dura el cambio conviven las dos;
+# el directorio de la anterior se borra (clean_data.prune_cache) cuando ya no la usa ningún rerun.
+#
+#   DASHBOARD_REFRESH_SECONDS=30 streamlit run app.py
+#   python refresh.py --force      # mide lo que tarda una actualización completa
+
+REFRESH_ENV = 'DASHBOARD_REFRESH_SECONDS'
+DEFAULT_REFRESH_SECONDS = 60
+
+
+class Snapshot:
+
+    def __init__(self, backend):
+        self.backend = backend
+        # Almacenes por app del backend de pandas (con duckdb están vacíos, solo para las estadísticas)
+        self.apps = getattr(backend, 'apps', None) or AppStores(backend.cache)
+        # Se asignan al publicarla
+        self.id = None
+        self.refreshed_at = None
+
+    @property
+    def cache(self):
+        return self.backend.cache
+
+    @property
+    def sources(self):
+        # Huella de los ficheros de origen con los que se construyó su versión de la caché
+        return self.cache.sources
+
+
+_ids = itertools.count(1)
+_current = None
+_lock = threading.Lock()
+# Solo una actualización a la vez; si ya hay una en marcha las demás peticiones no hacen nada
+_refreshing = threading.Lock()
+_watcher = None
+_status = {'last_check': None, 'last_seconds': None, 'last_error': None}
+
+
+def current_snapshot():
+    # Instantánea publicada; la primera es la del backend del proceso (query.get_backend), la que
+    # precalienta warmup.py --serve. Al crearla se pone la caché al día (solo ese primer rerun la espera).
+    snapshot = _current
+    if snapshot is None:
+        with _lock:
+            if _current is None:
+                clean_data.refresh_cache()
+                _publish(Snapshot(get_backend()))
+            snapshot = _current
+    return snapshot
+
+
+def _publish(snapshot):
+    global _current
+    snapshot.id = next(_ids)
+    snapshot.refreshed_at = time.time()
+    _current = snapshot
+
+
+def _new_snapshot(previous, cache):
+    # Backend del mismo tipo que el de la instantánea anterior, con almacenes y cachés vacíos,
+    # sobre la versión de la caché indicada
+    if previous.backend.name == PandasBackend.name:
+        return Snapshot(PandasBackend(AppStores(cache, previous.apps.max_apps)))
+    return Snapshot(BACKENDS[previous.backend.name](cache))
+
+
+def refresh(force=True, log=print):
+    # Construye, precalienta y publica una instantánea nueva. Devuelve la instantánea publicada, o None si
+    # ya había una actualización en marcha o si force=False y los ficheros de origen son los de la
+    # instantánea publicada.
+    if not _refreshing.acquire(blocking=False):
+        return None
+    try:
+        previous = current_snapshot()
+        # Solo se vuelven a leer (hash) los ficheros con otro tamaño o mtime
+        if not force and clean_data.same_sources(previous.sources, clean_data.source_fingerprint(previous.sources)):
+            return None
+        start = time.perf_counter()
+        clean_data.refresh_cache()
+        snapshot = _new_snapshot(previous, clean_data.current_cache())
+        catalog = snapshot.backend.catalog()
+        # Las apps que tenía en memoria la instantánea anterior (de la usada hace más tiempo a la más
+        # reciente, así quedan igual en las LRU); si no había ninguna, las de más revenue
+        available = set(catalog['App_ID'])
+        app_ids = [app_id for app_id in previous.apps.loaded_apps() if app_id in available] or \
+            list(catalog['App_ID'][:DEFAULT_TOP_APPS])
+        for app_id in app_ids:
+            warm_state(snapshot.backend, [app_id])
+
+        with _lock:
+            _publish(snapshot)
+        # El backend compartido del proceso (query.get_backend) también pasa a ser el nuevo
+        set_backend(snapshot.backend)
+        _status.update(last_seconds=time.perf_counter() - start, last_error=None)
+        log(f"datos v{snapshot.id} publicados ({len(app_ids)} app(s) precalentadas en "
+            f"{_status['last_seconds']:.2f}s)")
+        return snapshot
+    finally:
+        _refreshing.release()
+
+
+def _refresh_in_background(force):
+    try:
+        refresh(force, log=lambda msg: print(msg, file=sys.stderr))
+        # Versiones de la caché que ya no usa nadie (p. ej. la de la instantánea anterior, tras sus últimos reruns)
+        clean_data.prune_cache()
+    except Exception as exc:  # los datos nuevos no se pudieron cargar: se sigue sirviendo la instantánea actual
+        _status['last_error'] = f'{type(exc).__name__}: {exc}'
+        print(f"actualización de datos fallida: {_status['last_error']}", file=sys.stderr)
+
+
+def refresh_async(force=True):
+    # Lanza refresh() en un hilo y vuelve enseguida
+    thread = threading.Thread(target=_refresh_in_background, args=(force,), name='refresh', daemon=True)
+    thread.start()
+    return thread
+
+
+def refresh_interval():
+    return env_count(REFRESH_ENV, DEFAULT_REFRESH_SECONDS)
+
+
+def start_watcher(interval=None):
+    # Arranca, una vez por proceso, el hilo que vigila los ficheros de origen. Devuelve el intervalo (0 = desactivado)
+    global _watcher
+    interval = refresh_interval() if interval is None else interval
+    with _lock:
+        if _watcher is None and interval > 0:
+            _watcher = threading.Thread(target=_watch, args=(interval,), name='refresh-watcher', daemon=True)
+            _watcher.start()
+    return interval
+
+
+def _watch(interval):
+    while True:
+        time.sleep(interval)
+        _status['last_check'] = time.time()
+        _refresh_in_background(force=False)
+
+
+def status():
+    # Id y hora de publicación de la instantánea actual, si hay una actualización en marcha y cómo fue la última
+    snapshot = current_snapshot()
+    return {'id': snapshot.id, 'refreshed_at': snapshot.refreshed_at, 'refreshing': _refreshing.locked(),
+            **_status}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Actualiza los datos (caché de Parquet e instantánea en memoria)")
+    parser.add_argument('--force', action='store_true',
+                        help="actualizar aunque los ficheros de origen no hayan cambiado")
+    args = parser.parse_args()
+
+    if refresh(args.force, log=lambda msg: print(msg, file=sys.stderr)) is None:
+        print("los ficheros de origen no han cambiado (usa --force para actualizar igualmente)", file=sys.stderr)
+    print(status())
@@ -0,0 +1,249 @@
+import argparse
+import hashlib
+import io
+import shutil
+import zipfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import clean_data
+
+#-------GENERADOR DE DATOS SINTÉTICOS
+# Escribe exportaciones con el mismo formato que las de dat/ (TSV en UTF-16 con las mismas columnas;
+# la diaria dentro de un ZIP como daily_stats.zip) pero del tamaño que se quiera: número de apps,
+# de países, mezcla de plataformas/dispositivos, rango de fechas y filas por día.
+# Las distribuciones salen de los ficheros reales: reparto de descargas por país y dispositivo,
+# dispersión diaria, RPD, ARPDAU (y cuántas veces viene vacío) y estacionalidad por día de la semana.
+# El directorio generado tiene la misma estructura que dat/, así que se puede usar para el dashboard:
+#
+#   python synthetic.py /tmp/datos_grandes --apps 200 --countries 150 --start 2022-01-01 --end 2024-12-31
+#   DASHBOARD_DATA_DIR=/tmp/datos_grandes streamlit run app.py
+
+EXPORT_COLUMNS = ['Unified Name', 'Unified ID', 'Unified Publisher Name', 'Unified Publisher ID',
+                  'Publisher Name', 'Publisher ID', 'App Name', 'App ID', 'Date', 'Country / Region',
+                  'Platform', 'Device', 'Downloads', 'Revenue ($)', 'RPD ($)', 'ARPDAU ($)']
+DEVICES = [('App Store', 'iPhone'), ('App Store', 'iPad'), ('Google Play', 'Android')]
+# Mínimo de observaciones para usar la distribución propia de una combinación (si no, la de su dispositivo)
+MIN_OBSERVATIONS = 30
+
+
+def _lognormal_params(values):
+    logs = np.log(values[values > 0])
+    if len(logs) < 2:
+        return np.nan, np.nan
+    return logs.mean(), logs.std()
+
+
+def fit_profile(path=clean_data.DAILY_FILE):
+    # Parámetros por (país, plataforma, dispositivo) a partir de una exportación diaria real
+    df = clean_data.read_export(path).rename(columns=clean_data.RENAME_COLUMNS)
+    df['Weekday'] = pd.to_datetime(df['Date']).dt.dayofweek
+
+    def params(group):
+        rpd_mu, rpd_sigma = _lognormal_params(group['RPD'].to_numpy())
+        arpdau_mu, arpdau_sigma = _lognormal_params(group['ARPDAU'].to_numpy())
+        return pd.Series({
+            'rows': len(group),
+            'downloads': group['Downloads'].sum(),
+            'log_dl_mean': np.log1p(group['Downloads']).mean(),
+            'log_dl_std': np.log1p(group['Downloads']).std(),
+            'rpd_mu': rpd_mu, 'rpd_sigma': rpd_sigma,
+            'arpdau_mu': arpdau_mu, 'arpdau_sigma': arpdau_sigma,
+            'arpdau_missing': group['ARPDAU'].isna().mean(),
+        })
+
+    combos = df.groupby(['Country_ISO', 'Platform', 'Device']).apply(params, include_groups=False)
+    by_device = df.groupby(['Platform', 'Device']).apply(params, include_groups=False)
+    # Combinaciones con pocos datos: usamos los parámetros del dispositivo para lo que no sea volumen
+    sparse = combos['rows'] < MIN_OBSERVATIONS
+    for col in ['log_dl_std', 'rpd_mu', 'rpd_sigma', 'arpdau_mu', 'arpdau_sigma', 'arpdau_missing']:
+        fallback = by_device[col].reindex(combos.index.droplevel('Country_ISO')).to_numpy()
+        combos[col] = np.where(sparse | combos[col].isna(), fallback, combos[col])
+
+    weekday = df.groupby('Weekday')['Downloads'].mean() / df['Downloads'].mean()
+    return {'combos': combos.reset_index(), 'weekday': weekday.reindex(range(7), fill_value=1.0).to_numpy()}
+
+
+def _select_combos(profile, countries, mix):
+    # Países con más descargas primero. Si se piden más países que los que hay en la exportación real,
+    # los que faltan (de country_iso.csv) usan la media de los países más pequeños.
+    combos = profile['combos']
+    combos = combos[[(p, d) in mix for p, d in zip(combos['Platform'], combos['Device'])]]
+    volume = combos.groupby('Country_ISO')['downloads'].sum().sort_values(ascending=False)
+    chosen = list(volume.index[:countries])
+    selected = combos[combos['Country_ISO'].isin(chosen)]
+
+    missing = countries - len(chosen)
+    if missing > 0:
+        known = set(combos['Country_ISO'])
+        extra = [code for code in clean_data.read_countries()['Code'].str.strip() if code not in known][:missing]
+        small = volume.index[-max(1, len(volume) // 10):]
+        tail = (combos[combos['Country_ISO'].isin(small)]
+                .groupby(['Platform', 'Device'], as_index=False).mean(numeric_only=True))
+        selected = pd.concat([selected] + [tail.assign(Country_ISO=code) for code in extra], ignore_index=True)
+
+    # Peso de cada dispositivo según la mezcla pedida (1 = como en los datos reales)
+    weight = np.array([mix[(p, d)] for p, d in zip(selected['Platform'], selected['Device'])], dtype=float)
+    selected = selected.assign(log_dl_mean=selected['log_dl_mean'] + np.log(weight))
+    return selected.reset_index(drop=True)
+
+
+def _identity(app, publisher):
+    # Nombres e IDs con la misma forma que los de Sensor Tower, deterministas para cada app
+    def hex_id(text):
+        return hashlib.sha1(text.encode('utf-8')).hexdigest()[:24]
+    name = f'Synthetic App {app:04d}'
+    publisher_name = f'Synthetic Publisher {publisher:03d}'
+    ios_id = str(100_000_000 + int(hex_id(name)[:8], 16) % 900_000_000)
+    return {
+        'Unified Name': name,
+        'Unified ID': hex_id(name),
+        'Unified Publisher Name': publisher_name,
+        'Unified Publisher ID': hex_id(publisher_name),
+        'App Store': {'Publisher Name': publisher_name, 'Publisher ID': str(int(ios_id) + 23),
+                      'App Name': name, 'App ID': ios_id},
+        'Google Play': {'Publisher Name': publisher_name, 'Publisher ID': publisher_name.replace(' ', ''),
+                        'App Name': name, 'App ID': f'com.synthetic.app{app:04d}'},
+    }
+
+
+def _app_rows(rng, combos, dates, weekday, rows_per_day, scale, identity):
+    # Filas diarias de una app: días × combinaciones (o una muestra por día si se limita rows_per_day)
+    n_days, n_combos = len(dates), len(combos)
+    day_idx = np.repeat(np.arange(n_days), n_combos)
+    combo_idx = np.tile(np.arange(n_combos), n_days)
+    if rows_per_day and rows_per_day < n_combos:
+        # Muestra ponderada sin reemplazo por día (Gumbel top-k): los países grandes salen casi siempre
+        keys = np.log(combos['downloads'].to_numpy() + 1) + rng.gumbel(size=(n_days, n_combos))
+        keep = np.argpartition(-keys, rows_per_day - 1, axis=1)[:, :rows_per_day]
+        keep.sort(axis=1)
+        day_idx = np.repeat(np.arange(n_days), rows_per_day)
+        combo_idx = keep.ravel()
+
+    c = combos.iloc[combo_idx]
+    n = len(c)
+    log_dl = rng.normal(c['log_dl_mean'].to_numpy(), c['log_dl_std'].fillna(0).to_numpy())
+    season = weekday[dates.dayofweek.to_numpy()[day_idx]]
+    downloads = np.maximum(np.rint(np.expm1(log_dl) * season * scale), 0).astype(np.int64)
+
+    rpd = np.exp(rng.normal(c['rpd_mu'].to_numpy(), c['rpd_sigma'].to_numpy()))
+    revenue = np.round(downloads * rpd, 2)
+    arpdau = np.exp(rng.normal(c['arpdau_mu'].to_numpy(), c['arpdau_sigma'].to_numpy()))
+    arpdau[rng.random(n) < c['arpdau_missing'].to_numpy()] = np.nan
+
+    platforms = c['Platform'].to_numpy()
+    df = pd.DataFrame({
+        'Unified Name': identity['Unified Name'],
+        'Unified ID': identity['Unified ID'],
+        'Unified Publisher Name': identity['Unified Publisher Name'],
+        'Unified Publisher ID': identity['Unified Publisher ID'],
+        'Date': dates.strftime('%Y-%m-%d').to_numpy()[day_idx],
+        'Country / Region': c['Country_ISO'].to_numpy(),
+        'Platform': platforms,
+        'Device': c['Device'].to_numpy(),
+        'Downloads': downloads,
+        'Revenue ($)': revenue,
+        'RPD ($)': np.where(downloads > 0, np.round(revenue / np.maximum(downloads, 1), 6), np.nan),
+        'ARPDAU ($)': np.round(arpdau, 6),
+    })
+    for col in ['Publisher Name', 'Publisher ID', 'App Name', 'App ID']:
+        df[col] = np.where(platforms == 'App Store', identity['App Store'][col], identity['Google Play'][col])
+    return df[EXPORT_COLUMNS]
+
+
+def _monthly_rows(df_day):
+    # Exportación mensual de la misma app: sumas por mes con la fecha del día 1 y RPD recalculado
+    month = df_day['Date'].str[:7] + '-01'
+    keys = EXPORT_COLUMNS[:8] + ['Country / Region', 'Platform', 'Device']
+    df = (df_day.assign(Date=month)
+          .groupby(keys + ['Date'], sort=False, as_index=False)[['Downloads', 'Revenue ($)']].sum())
+    df['Revenue ($)'] = df['Revenue ($)'].round(2)
+    df['RPD ($)'] = np.where(df['Downloads'] > 0, (df['Revenue ($)'] / df['Downloads'].clip(lower=1)).round(6), np.nan)
+    return df[EXPORT_COLUMNS[:-1]]
+
+
+def _write_part(stream, df, header):
+    df.to_csv(stream, sep='\t', index=False, header=header, lineterminator='\n')
+
+
+def generate(out_dir, apps=1, countries=None, mix=None, start='2024-01-01', end='2024-12-31',
+             rows_per_day=None, publishers=None, seed=0, profile=None):
+    # Escribe monthly_stats.csv, daily_stats.zip y country_iso.csv en out_dir. Devuelve un resumen.
+    # countries: número de países (por defecto los de la exportación real)
+    # mix: {(plataforma, dispositivo): peso} con los dispositivos a generar (1 = volumen real)
+    # rows_per_day: filas por app y día (por defecto todas las combinaciones país × dispositivo)
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    profile = profile or fit_profile()
+    mix = mix or {device: 1.0 for device in DEVICES}
+    countries = countries or profile['combos']['Country_ISO'].nunique()
+    combos = _select_combos(profile, countries, mix)
+    dates = pd.date_range(start, end, freq='D')
+    publishers = publishers or max(1, apps // 4)
+
+    shutil.copyfile(clean_data.COUNTRIES_FILE, out_dir / clean_data.COUNTRIES_FILE.name)
+    daily_path = out_dir / clean_data.DAILY_FILE.name
+    monthly_path = out_dir / clean_data.MONTHLY_FILE.name
+    rows_daily = rows_monthly = 0
+    # Se escribe app a app para que la memoria no dependa del tamaño total
+    with zipfile.ZipFile(daily_path, 'w', compression=zipfile.ZIP_DEFLATED) as archive, \
+            archive.open(daily_path.with_suffix('.csv').name, 'w', force_zip64=True) as raw_daily, \
+            io.TextIOWrapper(raw_daily, encoding='utf-16-le', newline='') as daily, \
+            open(monthly_path, 'w', encoding='utf-16-le', newline='') as monthly:
+        # BOM a mano: dentro del ZIP el codificador utf-16 no lo escribe (el flujo no dice su posición)
+        for stream in (daily, monthly):
+            stream.write('\ufeff')
+        for app in range(apps):
+            # Tamaño de las apps con cola larga (Zipf): la primera tiene el volumen de los datos reales
+            scale = 1.0 / (app + 1)
+            identity = _identity(app + 1, app % publishers + 1)
+            df_day = _app_rows(rng, combos, dates, profile['weekday'], rows_per_day, scale, identity)
+            df_month = _monthly_rows(df_day)
+            _write_part(daily, df_day, header=app == 0)
+            _write_part(monthly, df_month, header=app == 0)
+            rows_daily += len(df_day)
+            rows_monthly += len(df_month)
+
+    return {
+        'dir': str(out_dir),
+        'apps': apps,
+        'countries': combos['Country_ISO'].nunique(),
+        'devices': len(mix),
+        'days': len(dates),
+        'rows_daily': rows_daily,
+        'rows_monthly': rows_monthly,
+        'bytes_daily': daily_path.stat().st_size,
+        'bytes_monthly': monthly_path.stat().st_size,
+    }
+
+
+def parse_mix(text):
+    # "App Store/iPhone=1,App Store/iPad=0.5,Google Play/Android=2"
+    mix = {}
+    for item in text.split(','):
+        device, _, weight = item.partition('=')
+        platform_name, _, device_name = device.strip().partition('/')
+        if (platform_name, device_name) not in DEVICES:
+            raise argparse.ArgumentTypeError(f"dispositivo desconocido: {device.strip()!r}")
+        mix[(platform_name, device_name)] = float(weight or 1)
+    return mix
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Genera exportaciones sintéticas con el formato de dat/")
+    parser.add_argument('out_dir', help="directorio de salida (misma estructura que dat/)")
+    parser.add_argument('--apps', type=int, default=1)
+    parser.add_argument('--publishers', type=int, help="por defecto una por cada 4 apps")
+    parser.add_argument('--countries', type=int, help="por defecto los de la exportación real")
+    parser.add_argument('--mix', type=parse_mix,
+                        help="dispositivos y peso de cada uno, p. ej. 'App Store/iPhone=1,Google Play/Android=2'")
+    parser.add_argument('--start', default='2024-01-01')
+    parser.add_argument('--end', default='2024-12-31')
+    parser.add_argument('--rows-per-day', type=int, help="filas por app y día (por defecto todas)")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    print(generate(args.out_dir, apps=args.apps, countries=args.countries, mix=args.mix, start=args.start,
+                   end=args.end, rows_per_day=args.rows_per_day, publishers=args.publishers, seed=args.seed))
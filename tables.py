@@ -0,0 +1,173 @@
+import numpy as np
+import pandas as pd
+
+from caching import LRUCache, env_megabytes, selection_key
+
+#-------TABLAS DE LA VISTA DETALLADA
+# Preparación de los grids (por país y diario por plataforma) a partir de los cortes del cubo.
+# Los grids se envían con columnas numéricas (Arrow): el navegador formatea cada columna según
+# los formatos de aquí (printf de st.column_config.NumberColumn, se aplican en app.py) y las
+# columnas se ordenan por su valor, no como texto. No se formatea nada celda a celda en Python.
+# La coma de separador de miles en los formatos printf (y el placeholder de las celdas vacías en app.py)
+# necesitan streamlit >= 1.55 (requirements.txt).
+
+CURRENCY_FORMAT = '$%,.0f'
+COUNT_FORMAT = '%,d'
+DELTA_FORMAT = '%+.1f%%'
+
+COUNTRY_SUMMARY_FORMATS = {
+    'Revenue ($)': CURRENCY_FORMAT,
+    'Installs': COUNT_FORMAT,
+    'Revenue Δ%': DELTA_FORMAT,
+    'Installs Δ%': DELTA_FORMAT,
+}
+
+
+def country_summary(comparison):
+    # --- Preparar dataframe por país (actual, anterior y Δ% en la misma pasada) ---
+    df_country_summary = comparison.by('Country')[
+        ['Country', 'Revenue', 'Downloads', 'Revenue_delta', 'Downloads_delta']
+    ]
+
+    # Renombrar columnas
+    df_country_summary = df_country_summary.rename(columns={
+        'Revenue': 'Revenue ($)',
+        'Downloads': 'Installs',
+        'Revenue_delta': 'Revenue Δ%',
+        'Downloads_delta': 'Installs Δ%'
+    })
+
+    # Orden inicial por Revenue descendente
+    return df_country_summary.sort_values(by='Revenue ($)', ascending=False)
+
+
+def style_country_summary(df_country_summary):
+    # --- Color de los Δ% según el signo: verde si crece, rojo si cae (por columna, sin recorrer celdas) ---
+    def delta_colors(values):
+        return np.select([values >= 0, values < 0], ['color: green', 'color: red'], 'color: black')
+
+    return df_country_summary.style.apply(delta_colors, subset=['Revenue Δ%', 'Installs Δ%'])
+
+
+def daily_pivot(df_day_filtered):
+    # --- Agrupamos por día y plataforma (mismo corte del cubo diario que el gráfico) ---
+    df_daily_summary = df_day_filtered.rollup(['Date', 'Platform'])
+    if df_daily_summary.empty:
+        # Sin países o plataformas seleccionados no hay días: el pivot no tendría columnas
+        return pd.DataFrame()
+
+    # --- Creamos tabla pivote con columnas para App Store, Play Store y Totales ---
+    df_pivot = df_daily_summary.pivot_table(
+        index='Date',
+        columns='Platform',
+        values=['Revenue', 'Downloads'],
+        aggfunc='sum',
+        observed=True
+    ).fillna(0)
+
+    # --- Agregamos totales ---
+    if 'App Store' in df_pivot['Revenue'].columns and 'Google Play' in df_pivot['Revenue'].columns:
+        df_pivot[('Revenue', 'Total')] = (
+            df_pivot[('Revenue', 'App Store')] + df_pivot[('Revenue', 'Google Play')]
+        )
+        df_pivot[('Downloads', 'Total')] = (
+            df_pivot[('Downloads', 'App Store')] + df_pivot[('Downloads', 'Google Play')]
+        )
+    else:
+        # Si falta alguna plataforma (por ejemplo, solo hay una en los datos filtrados)
+        df_pivot[('Revenue', 'Total')] = df_pivot['Revenue'].sum(axis=1)
+        df_pivot[('Downloads', 'Total')] = df_pivot['Downloads'].sum(axis=1)
+
+    # --- Orden de columnas personalizado ---
+    df_pivot = df_pivot.reindex(columns=pd.MultiIndex.from_product([
+        ['Revenue', 'Downloads'],
+        ['App Store', 'Google Play', 'Total']
+    ]), fill_value=0)
+
+    # --- Las descargas son enteras (el pivot las deja en float al rellenar con 0) ---
+    df_pivot['Downloads'] = df_pivot['Downloads'].astype('int64')
+
+    # --- Aplanamos columnas para mostrar bien los encabezados ---
+    df_pivot.columns = [f"{col1} ({col2})" for col1, col2 in df_pivot.columns]
+    df_pivot = df_pivot.reset_index()
+
+    # --- La fecha se queda como datetime (se formatea en el navegador) ---
+    df_pivot["Date"] = pd.to_datetime(df_pivot["Date"])
+    return df_pivot
+
+
+def daily_pivot_formats(df_pivot):
+    # Formato de cada columna del grid diario: revenue en dólares, descargas con separador de miles
+    return {col: CURRENCY_FORMAT if "Revenue" in col else COUNT_FORMAT
+            for col in df_pivot.columns if col != "Date"}
+
+
+#-------PAGINACIÓN EN EL SERVIDOR
+# Con varias apps o muchos meses los grids pueden tener decenas de miles de filas. No se envían enteros:
+# el servidor ordena y busca sobre los datos tipados, guarda el resultado en una LRU compartida
+# (por estado de filtros, orden y búsqueda) y el navegador solo recibe la página visible.
+# El tamaño de lo que se envía depende del tamaño de página, no de los datos.
+
+PAGE_SIZES = [50, 100, 250, 500]
+DEFAULT_PAGE_SIZE = 100
+# Acotada por memoria (DASHBOARD_TABLE_CACHE_MB): con varias apps un grid puede ocupar varios MB
+TABLE_CACHE_ENTRIES = 512
+TABLE_CACHE_BYTES = env_megabytes('DASHBOARD_TABLE_CACHE_MB', 128)
+table_cache = LRUCache(max_entries=TABLE_CACHE_ENTRIES, max_bytes=TABLE_CACHE_BYTES)
+
+# Orden inicial de cada grid: (columna, descendente)
+GRID_SORT = {
+    'grid_pais': ('Revenue ($)', True),
+    'grid_diario': ('Date', False),
+}
+
+
+def cached_table(kind, version, build, **selection):
+    # Igual que figures.cached_figure, para los dataframes de los grids
+    return table_cache.get_or_build(selection_key(kind, version, **selection), build)
+
+
+def grid_view(key, version, build, search='', sort=None, descending=None, **selection):
+    # (grid completo, vista buscada y ordenada) de un estado de filtros; los dos quedan en table_cache
+    default_sort, default_descending = GRID_SORT[key]
+    sort = sort or default_sort
+    descending = default_descending if descending is None else descending
+    df_full = cached_table(key, version, build, **selection)
+    df_view = cached_table(
+        f'{key}.vista', version, lambda: sort_rows(search_rows(df_full, search), sort, not descending),
+        search=search, sort=sort, descending=descending, **selection
+    )
+    return df_full, df_view
+
+
+def search_rows(df, text):
+    # Filas en las que alguna columna de texto (o la fecha como AAAA-MM-DD) contiene el texto buscado,
+    # sin distinguir mayúsculas. En las categóricas se busca en las categorías, no fila a fila.
+    text = (text or '').strip().lower()
+    if not text:
+        return df
+    mask = np.zeros(len(df), dtype=bool)
+    for col in df.columns:
+        values = df[col]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            categories = values.cat.categories
+            matches = categories[categories.astype(str).str.lower().str.contains(text, regex=False)]
+            mask |= values.isin(matches).to_numpy()
+        elif pd.api.types.is_datetime64_any_dtype(values):
+            mask |= values.dt.strftime('%Y-%m-%d').str.contains(text, regex=False).fillna(False).to_numpy()
+        elif pd.api.types.is_object_dtype(values) or pd.api.types.is_string_dtype(values):
+            mask |= values.astype(str).str.lower().str.contains(text, regex=False).to_numpy()
+    return df[mask]
+
+
+def sort_rows(df, by, ascending=True):
+    # Orden estable sobre los valores (no sobre el texto mostrado); los vacíos al final
+    return df.sort_values(by, ascending=ascending, kind='stable', na_position='last', ignore_index=True)
+
+
+def table_page(df, page, page_size=DEFAULT_PAGE_SIZE):
+    # (filas de la página, página efectiva, número de páginas); la página se ajusta al rango válido
+    pages = max(1, -(-len(df) // page_size))
+    page = min(max(int(page), 1), pages)
+    start = (page - 1) * page_size
+    return df.iloc[start:start + page_size], page, pages
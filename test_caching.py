@@ -0,0 +1,23 @@
+from caching import LRUCache
+
+
+def test_put_too_large_drops_previous_value():
+    cache = LRUCache(max_bytes=10, sizeof=len)
+    cache.put('a', 'viejo')
+    cache.put('a', 'demasiado grande')
+    assert cache.get('a') is None
+    assert cache.get_or_build('a', lambda: 'nuevo') == 'nuevo'
+    stats = cache.stats()
+    assert stats['rejected'] == 1
+    assert stats['entries'] == 1
+    assert stats['resident_bytes'] == len('nuevo')
+
+
+def test_lfu_keeps_new_entry():
+    cache = LRUCache(max_entries=2, policy='lfu')
+    cache.put('a', 1)
+    cache.put('b', 2)
+    cache.get('a')
+    cache.put('c', 3)
+    assert cache.get('c') == 3
+    assert cache.get('b') is None
@@ -0,0 +1,237 @@
+import numpy as np
+import pandas as pd
+
+from clean_data import SCHEMA
+from cube import DIMENSIONS, MEASURES
+
+#-------ÍNDICE TEMPORAL DE SUMAS ACUMULADAS
+# Para cada clave (país, plataforma) guardamos la suma acumulada de Revenue y Downloads día a día sobre
+# un eje de días continuo (los días sin datos suman 0). La suma de cualquier rango de fechas es una resta,
+# acumulado[fin] - acumulado[inicio], así que "últimos 90 días por semana" o "todo por trimestre" cuestan
+# una resta por clave e intervalo, sin volver a recorrer ni agrupar los datos diarios en cada rerun.
+# Ocupa claves × días × 16 bytes (las dos medidas): ~1.3 MB con los datos de dat/, ~15 MB con 10 años
+# de histórico y 250 claves.
+#
+#   index = TimeIndex.from_frame(df_day)
+#   index.query('2024-10-01', '2024-12-31', 'W', platforms=['App Store'])
+
+KEYS = ['Country', 'Platform']
+# Granularidades: frecuencia de pandas de cada una (la semana es la ISO, de lunes a domingo)
+GRANULARITIES = {'D': 'D', 'W': 'W-SUN', 'M': 'M', 'Q': 'Q-DEC', 'Y': 'Y-DEC'}
+GRANULARITY_LABELS = {'D': 'Día', 'W': 'Semana', 'M': 'Mes', 'Q': 'Trimestre', 'Y': 'Año'}
+# Granularidad elegida según el rango y el número máximo de puntos del gráfico (pick_resolution)
+AUTO_GRANULARITY = 'auto'
+GRANULARITY_OPTIONS = {AUTO_GRANULARITY: 'Automática', **GRANULARITY_LABELS}
+# Estado por defecto de la pestaña EVOLUCIÓN: los últimos 90 días con datos, por semana
+DEFAULT_RANGE_DAYS = 90
+DEFAULT_GRANULARITY = 'W'
+
+
+class TimeIndex:
+
+    def __init__(self, keys, start, sums):
+        # keys: dataframe (Country, Platform) con una fila por clave, en el orden de las filas de sums
+        # start: primer día del eje; sums: {medida: array (claves, días + 1)} con la columna 0 a cero
+        self.keys = keys
+        self.start = start
+        self.sums = sums
+        self.n_days = sums['Revenue'].shape[1] - 1
+
+    @staticmethod
+    def daily_totals(df):
+        # Sumas por (día, país, plataforma) de filas diarias a cualquier nivel de detalle. Cuentan las
+        # mismas filas que en el cubo (groupby descarta las que no tienen país/plataforma/dispositivo).
+        df = df.dropna(subset=[col for col in DIMENSIONS[1:] if col in df.columns])
+        return (
+            df.groupby([df['Date'].dt.normalize().rename('Date'), *KEYS], observed=True)[MEASURES]
+            .sum()
+            .reset_index()
+        )
+
+    @classmethod
+    def from_frame(cls, df):
+        # df: filas diarias con Date, Country, Platform y las medidas (se suman las que repiten día y clave)
+        daily = cls.daily_totals(df)
+        if daily.empty:
+            return cls.empty()
+
+        by_key = daily.groupby(KEYS, observed=True, sort=True)
+        codes = by_key.ngroup().to_numpy()
+        # Las particiones pueden traer categorías distintas (concat las deja en texto): mismo esquema siempre
+        keys = by_key.size().index.to_frame(index=False)[KEYS].astype({col: SCHEMA[col] for col in KEYS})
+        start = daily['Date'].min()
+        days = (daily['Date'] - start).dt.days.to_numpy()
+        n_days = int(days.max()) + 1
+
+        sums = {}
+        for measure in MEASURES:
+            values = daily[measure].to_numpy()
+            # Downloads se acumula en enteros: las restas son exactas
+            grid = np.zeros((len(keys), n_days + 1), dtype=np.int64 if measure == 'Downloads' else np.float64)
+            grid[codes, days + 1] = values
+            sums[measure] = np.cumsum(grid, axis=1, out=grid)
+        return cls(keys, start, sums)
+
+    @classmethod
+    def empty(cls):
+        keys = pd.DataFrame({col: pd.Series([], dtype=SCHEMA[col]) for col in KEYS})
+        sums = {measure: np.zeros((0, 1), dtype=np.int64 if measure == 'Downloads' else np.float64)
+                for measure in MEASURES}
+        return cls(keys, pd.NaT, sums)
+
+    @classmethod
+    def combine(cls, indexes):
+        # Suma de varios índices (p. ej. los de varias apps): se alinean claves y días y se suman los diarios
+        indexes = [index for index in indexes if index.n_days]
+        if not indexes:
+            return cls.empty()
+        if len(indexes) == 1:
+            return indexes[0]
+        keys = (
+            pd.concat([index.keys for index in indexes], ignore_index=True)
+            .astype({col: str for col in KEYS})
+            .drop_duplicates()
+            .sort_values(KEYS, ignore_index=True)
+        )
+        key_index = pd.MultiIndex.from_frame(keys)
+        start = min(index.start for index in indexes)
+        n_days = max((index.start - start).days + index.n_days for index in indexes)
+
+        sums = {measure: np.zeros((len(keys), n_days + 1), dtype=indexes[0].sums[measure].dtype)
+                for measure in MEASURES}
+        for index in indexes:
+            rows = key_index.get_indexer(pd.MultiIndex.from_frame(index.keys.astype({col: str for col in KEYS})))
+            offset = (index.start - start).days + 1
+            for measure in MEASURES:
+                sums[measure][rows, offset:offset + index.n_days] += np.diff(index.sums[measure], axis=1)
+        for measure in MEASURES:
+            np.cumsum(sums[measure], axis=1, out=sums[measure])
+        for col in KEYS:
+            keys[col] = keys[col].astype(SCHEMA[col])
+        return cls(keys, start, sums)
+
+    @property
+    def nbytes(self):
+        # Memoria de los acumulados y de las claves (para las cachés con presupuesto de bytes)
+        return int(sum(array.nbytes for array in self.sums.values()) + self.keys.memory_usage(deep=True).sum())
+
+    @property
+    def first_day(self):
+        return self.start
+
+    @property
+    def last_day(self):
+        return self.start + pd.Timedelta(days=self.n_days - 1) if self.n_days else pd.NaT
+
+    def _rows(self, countries, platforms):
+        mask = np.ones(len(self.keys), dtype=bool)
+        for col, values in (('Country', countries), ('Platform', platforms)):
+            if values is not None:
+                mask &= self.keys[col].isin(list(values)).to_numpy()
+        return np.flatnonzero(mask)
+
+    def query(self, start=None, end=None, freq='D', countries=None, platforms=None, by=None):
+        # Revenue y Downloads por intervalo de la granularidad freq (D, W, M, Q, Y) entre start y end,
+        # ambos incluidos (None = desde el primer día / hasta el último). Los intervalos de los extremos
+        # solo suman los días que caen dentro del rango. countries/platforms: None = sin filtrar.
+        # by: 'Country' o 'Platform' para desglosar cada intervalo.
+        if not self.n_days:
+            return _empty_result(freq, by)
+        start = max(pd.Timestamp(start).normalize(), self.first_day) if start is not None else self.first_day
+        end = min(pd.Timestamp(end).normalize(), self.last_day) if end is not None else self.last_day
+        rows = self._rows(countries, platforms)
+        if start > end or rows.size == 0:
+            return _empty_result(freq, by)
+
+        periods = pd.period_range(start, end, freq=GRANULARITIES[freq])
+        # Límites de cada intervalo en el eje de días (el primero recortado al inicio del rango)
+        edges = np.append(np.maximum((periods.start_time - self.start).days, (start - self.start).days),
+                          (end - self.start).days + 1)
+
+        # Solo se leen las columnas de los límites: (claves seleccionadas, intervalos + 1)
+        totals = {measure: np.diff(self.sums[measure][np.ix_(rows, edges)], axis=1) for measure in MEASURES}
+        if by is None:
+            result = pd.DataFrame({measure: totals[measure].sum(axis=0) for measure in MEASURES})
+            result.insert(0, 'Period', periods)
+            result.insert(1, 'Date', periods.start_time)
+            return result
+
+        # Desglose: se suman las claves de cada valor de by; filas ordenadas por intervalo y valor
+        codes, values = pd.factorize(self.keys[by].iloc[rows], sort=True)
+        result = pd.DataFrame({
+            'Period': periods.repeat(len(values)),
+            'Date': periods.start_time.repeat(len(values)),
+            by: pd.Series(values.take(np.tile(np.arange(len(values)), len(periods)))).astype(SCHEMA[by]),
+        })
+        for measure in MEASURES:
+            grouped = np.zeros((len(values), len(periods)), dtype=totals[measure].dtype)
+            np.add.at(grouped, codes, totals[measure])
+            result[measure] = grouped.T.ravel()
+        return result
+
+
+#-------RESOLUCIÓN Y REDUCCIÓN DE PUNTOS
+# El índice hace de pirámide de resoluciones (día → semana → mes → trimestre → año): cualquier nivel se
+# calcula con una resta por intervalo, así que no hace falta guardar cada nivel agregado. Para que un
+# gráfico no crezca con el rango se elige el nivel más fino que cabe en un número máximo de puntos, y las
+# líneas que se quieren ver a más resolución se reducen con LTTB (Largest-Triangle-Three-Buckets), que
+# conserva los picos y valles de la serie.
+
+def bucket_count(start, end, freq):
+    # Intervalos de la granularidad freq que toca el rango [start, end]
+    return len(pd.period_range(pd.Timestamp(start), pd.Timestamp(end), freq=GRANULARITIES[freq]))
+
+
+def pick_resolution(start, end, max_points, finest='D'):
+    # La granularidad más fina (desde finest) con la que el rango no pasa de max_points intervalos
+    resolutions = list(GRANULARITIES)
+    for freq in resolutions[resolutions.index(finest):]:
+        if bucket_count(start, end, freq) <= max_points:
+            return freq
+    return resolutions[-1]
+
+
+def lttb(x, y, n_out):
+    # Posiciones de los n_out puntos de la serie (x, y) que conserva LTTB; siempre el primero y el último.
+    # x: números o fechas (ordenados). Si la serie ya cabe devuelve todas las posiciones.
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = pd.to_numeric(pd.Series(x)).to_numpy(dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    # n_out - 2 cubos entre el primer y el último punto
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    keep = np.empty(n_out, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    chosen = 0
+    for i in range(n_out - 2):
+        start, stop = edges[i], edges[i + 1]
+        # Tercer vértice: la media del cubo siguiente (el último punto para el último cubo)
+        following = slice(edges[i + 1], edges[i + 2]) if i + 2 < len(edges) else slice(n - 1, n)
+        next_x, next_y = x[following].mean(), y[following].mean()
+        # Punto del cubo que forma el triángulo de más área con el elegido antes y la media del siguiente
+        area = np.abs((x[chosen] - next_x) * (y[start:stop] - y[chosen])
+                      - (x[chosen] - x[start:stop]) * (next_y - y[chosen]))
+        chosen = start + int(area.argmax())
+        keep[i + 1] = chosen
+    return keep
+
+
+def _empty_result(freq, by=None):
+    # Resultado sin filas con los mismos tipos que uno con datos
+    columns = {
+        'Period': pd.Series([], dtype=pd.PeriodDtype(GRANULARITIES[freq])),
+        'Date': pd.Series([], dtype='datetime64[ns]'),
+        **({by: pd.Series([], dtype=SCHEMA[by])} if by else {}),
+        'Revenue': pd.Series([], dtype='float64'),
+        'Downloads': pd.Series([], dtype='int64'),
+    }
+    return pd.DataFrame(columns)
+
+
+def default_range(index, days=DEFAULT_RANGE_DAYS):
+    # (inicio, fin) de los últimos días con datos; lo usan app.py y warmup.py. Sin datos, (None, None)
+    if not index.n_days:
+        return None, None
+    end = index.last_day
+    return max(end - pd.Timedelta(days=days - 1), index.first_day), end
@@ -0,0 +1,152 @@
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+import pandas as pd
+
+import clean_data
+from deltas import PeriodComparison
+from figures import DEFAULT_TOP_N, country_treemaps, daily_figure, overview_figures, timeline_figure
+from query import BACKEND_ENV, get_backend
+from tables import cached_table, country_summary, daily_pivot, grid_view
+from timeline import DEFAULT_GRANULARITY, default_range
+
+#-------PRECALENTAMIENTO DE CACHÉS
+# El primer usuario tras un despliegue o reinicio paga la limpieza de las exportaciones (si la caché
+# de Parquet no está al día), la carga de los datos y los agregados del estado inicial. Este módulo lo
+# hace antes: reconstruye la caché si hace falta, carga las apps, construye cubos e índices (también el
+# temporal de sumas acumuladas) y calcula en las cachés compartidas (figuras y tablas) los estados de
+# filtros más pedidos, con las mismas claves que usa app.py. Al final informa de lo que ha tardado cada paso.
+#
+#   python warmup.py                       # caché de Parquet + estados por defecto (mide el arranque en frío)
+#   python warmup.py --serve               # precalienta este proceso y arranca el dashboard en él
+#   python warmup.py --serve -- --server.port 8080
+#   python warmup.py --states estados.json # además, los estados del fichero
+#
+# estados.json es una lista de estados: {"apps": [...], "countries": [...], "platforms": [...],
+# "months": [...], "period": "AAAA-MM"}; lo que falte toma el valor por defecto del dashboard.
+
+APP_FILE = Path(__file__).resolve().parent / 'app.py'
+# Apps (de más a menos revenue) cuyo estado por defecto se precalcula
+DEFAULT_TOP_APPS = 1
+
+
+def default_period(periods):
+    # El mismo mes que selecciona app.py por defecto: el primer diciembre disponible
+    return next((p for p in periods if p.month == 12), periods[0])
+
+
+def warm_state(backend, apps, countries=None, platforms=None, months=None, period=None):
+    # Calcula lo mismo que un rerun completo de app.py para ese estado (None = todo seleccionado).
+    # Devuelve el estado ya completado.
+    cube_month = backend.month_cube(apps)
+    version = backend.version(apps)
+    if countries is None:
+        countries = cube_month.rollup('Country')['Country'].tolist()
+    if platforms is None:
+        platforms = cube_month.rollup('Platform')['Platform'].tolist()
+    if months is None:
+        months = cube_month.rollup('Month_Name')['Month_Name'].tolist()
+    period = str(period or default_period(cube_month.periods))
+
+    # Vista general
+    overview_figures(cube_month, version, apps, countries, platforms, months)
+    country_treemaps(cube_month, version, apps, countries, platforms, months, DEFAULT_TOP_N)
+
+    # Vista detallada: KPIs, gráfico diario y grids del mes
+    comparison = PeriodComparison(cube_month, pd.Period(period, freq='M'), countries=countries, platforms=platforms)
+    comparison.total()
+    comparison.by('Platform')
+    df_day_filtered = backend.daily_cube(apps, pd.Period(period, freq='M')).slice(countries=countries,
+                                                                                 platforms=platforms)
+    daily_figure(df_day_filtered, version, apps, countries, platforms, period)
+    selection = dict(apps=apps, countries=countries, platforms=platforms, period=period)
+    grid_view('grid_pais', version, lambda: country_summary(comparison), **selection)
+    df_pivot = cached_table('grid_diario', version, lambda: daily_pivot(df_day_filtered), **selection)
+    if not df_pivot.empty:
+        grid_view('grid_diario', version, lambda: df_pivot, **selection)
+
+    # Evolución: índice de sumas acumuladas y gráfico del rango por defecto
+    timeline = backend.timeline(apps)
+    if timeline.n_days:
+        timeline_figure(timeline, version, apps, countries, platforms, *default_range(timeline), DEFAULT_GRANULARITY)
+    return {'apps': list(apps), 'countries': countries, 'platforms': platforms, 'months': months, 'period': period}
+
+
+def common_states(backend, apps):
+    # Estados más pedidos: cada plataforma por separado, el resto de meses de la vista detallada y el inicial.
+    # El inicial va el último para que sea el más reciente en las LRU si no caben todos.
+    cube_month = backend.month_cube(apps)
+    periods = cube_month.periods
+    states = {}
+    for platform in cube_month.rollup('Platform')['Platform']:
+        states[f'plataforma={platform}'] = {'platforms': [platform]}
+    for period in periods:
+        if period != default_period(periods):
+            states[f'mes={period}'] = {'period': str(period)}
+    states['defecto'] = {}
+    return states
+
+
+def warm_up(backend=None, top_apps=DEFAULT_TOP_APPS, states=(), variants=True, log=print):
+    # Devuelve [{'step', 'seconds'}] con el tiempo de cada paso; el último es el total
+    backend = backend or get_backend()
+    steps = []
+
+    def timed(step, fn):
+        start = time.perf_counter()
+        result = fn()
+        steps.append({'step': step, 'seconds': time.perf_counter() - start})
+        log(f"{step}: {steps[-1]['seconds']:.2f}s")
+        return result
+
+    start = time.perf_counter()
+    timed('cache_parquet', clean_data.refresh_cache)
+    catalog = timed('catalogo', backend.catalog)
+    for app_id in list(catalog['App_ID'][:top_apps]):
+        timed(f'datos[{app_id}]', lambda: (backend.month_cube([app_id]), backend.version([app_id])))
+        app_states = common_states(backend, [app_id]) if variants else {'defecto': {}}
+        for name, state in app_states.items():
+            timed(f'estado[{app_id}:{name}]', lambda: warm_state(backend, [app_id], **state))
+    for i, state in enumerate(states):
+        state = dict(state)
+        state_apps = state.pop('apps', None) or list(catalog['App_ID'][:1])
+        timed(f'estado[fichero:{i}]', lambda: warm_state(backend, state_apps, **state))
+    steps.append({'step': 'total', 'seconds': time.perf_counter() - start})
+    log(f"precalentamiento completo en {steps[-1]['seconds']:.2f}s")
+    return steps
+
+
+def serve(streamlit_args=()):
+    # Arranca el dashboard en este mismo proceso: app.py importa los módulos ya cargados
+    # (data_store, figures, tables), así que encuentra las cachés llenas
+    from streamlit.web import cli as stcli
+    sys.argv = ['streamlit', 'run', str(APP_FILE), *streamlit_args]
+    return stcli.main()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Precalienta las cachés del dashboard")
+    parser.add_argument('--backend', help="backend de consultas (por defecto DASHBOARD_BACKEND o pandas)")
+    parser.add_argument('--apps', type=int, default=DEFAULT_TOP_APPS,
+                        help="número de apps (las de más revenue) cuyo estado por defecto se precalcula")
+    parser.add_argument('--states', help="fichero JSON con más estados de filtros que precalcular")
+    parser.add_argument('--only-default', action='store_true',
+                        help="solo el estado inicial de cada app (sin variantes por plataforma y mes)")
+    parser.add_argument('--output', help="fichero JSON con los tiempos de cada paso")
+    parser.add_argument('--serve', action='store_true', help="al terminar, arranca el dashboard en este proceso")
+    args, streamlit_args = parser.parse_known_args()
+
+    if args.serve and args.backend:
+        # app.py usa el backend de DASHBOARD_BACKEND (refresh.current_snapshot): que sea el que se precalienta
+        os.environ[BACKEND_ENV] = args.backend
+    states = json.loads(Path(args.states).read_text(encoding='utf-8')) if args.states else []
+    report = warm_up(get_backend(args.backend), args.apps, states, variants=not args.only_default,
+                     log=lambda msg: print(msg, file=sys.stderr))
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2), encoding='utf-8')
+    if args.serve:
+        sys.exit(serve([arg for arg in streamlit_args if arg != '--']))